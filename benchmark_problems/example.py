@@ -1,17 +1,23 @@
 import os
-from multiprocessing import Pool, cpu_count
-from itertools import repeat
+import glob
+from multiprocessing import cpu_count
 import pandas as pd
 
-from solvers.solvers import SOLVER_MAP
-from problem_classes.random_qp import RandomQPExample
-from problem_classes.eq_qp import EqQPExample
-from problem_classes.portfolio import PortfolioExample
-from problem_classes.lasso import LassoExample
-from problem_classes.svm import SVMExample
-from problem_classes.huber import HuberExample
-from problem_classes.control import ControlExample
-from utils.general import make_sure_path_exists
+from solvers.solvers import SOLVER_MAP, time_limit as solver_time_limit
+from solvers.osqp import workspace_group
+from problem_classes.random_qp import RandomQPExample, RandomQPLargeExample
+from problem_classes.eq_qp import EqQPExample, EqQPLargeExample
+from problem_classes.portfolio import PortfolioExample, \
+    PortfolioLargeExample
+from problem_classes.lasso import LassoExample, LassoLargeExample
+from problem_classes.svm import SVMExample, SVMLargeExample
+from problem_classes.huber import HuberExample, HuberLargeExample
+from problem_classes.control import ControlExample, ControlLargeExample
+from utils.scheduler import run_tasks, physical_memory
+from utils.cache import generate_example, load_example
+from utils.store import ResultsStore, STORE_FOLDER
+from utils.journal import TaskJournal
+from utils.general import MemoryTracker
 
 examples = [RandomQPExample,
             EqQPExample,
@@ -19,10 +25,29 @@ examples = [RandomQPExample,
             LassoExample,
             SVMExample,
             HuberExample,
-            ControlExample]
+            ControlExample,
+            RandomQPLargeExample,
+            EqQPLargeExample,
+            PortfolioLargeExample,
+            LassoLargeExample,
+            SVMLargeExample,
+            HuberLargeExample,
+            ControlLargeExample]
 
 EXAMPLES_MAP = {example.name(): example for example in examples}
 
+# NB. ECOS and qpOASES crash if the problem sizes are too large and they
+# run in parallel
+SERIAL_SOLVERS = ['ECOS', 'ECOS_high', 'qpOASES']
+
+# In sandbox mode, the SERIAL_SOLVERS run in parallel on the problems with
+# less than this number of nonzeros
+SANDBOX_PARALLEL_MAX_NNZ = 1e06
+
+# Wall-clock limit of each task in sandbox mode (problem generation
+# included)
+SANDBOX_TIME_LIMIT = 2 * solver_time_limit
+
 
 class Example(object):
     '''
@@ -33,105 +58,72 @@ class Example(object):
                  solvers,
                  settings,
                  output_folder,
-                 n_instances=10):
+                 n_instances=10,
+                 trace_memory=False):
         self.name = name
         self.dims = dims
         self.n_instances = n_instances
         self.solvers = solvers
         self.settings = settings
         self.output_folder = output_folder
+        self.trace_memory = trace_memory
 
-    def solve(self, parallel=True):
+    def solve(self, parallel=True, sandbox=False):
         '''
         Solve problems of type example
 
-        The results are stored as
+        The results are appended to the results store
 
-            ./results/{self.output_folder}/{solver}/{class}/n{dimension}.csv
+            ./results/{self.output_folder}/store/
 
-        using a pandas table with fields
+        as soon as all the instances of a dimension are solved, using a
+        pandas table with fields
             - 'class': example class
             - 'solver': solver name
+            - 'instance': instance number
             - 'status': solver status
             - 'run_time': execution time
             - 'iter': number of iterations
             - 'obj_val': objective value
             - 'n': leading dimension
             - 'N': nnz dimension (nnz(P) + nnz(A))
+            - '{phase}_wall_time': wall-clock time of each phase of the
+              solve (conversion, build, solve, extraction, check)
+            - 'peak_rss_delta': peak resident memory of the solve in bytes
+              (above the one before the solve)
+            - 'peak_tracemalloc': peak Python allocations of the solve in
+              bytes (NaN without trace_memory, since tracing biases the
+              timings)
+            - 'fresh_process': the solve is the first one measured in its
+              process (only those peak memories are comparable)
         '''
+        solve_examples([self], parallel=parallel, sandbox=sandbox)
 
-        print("Solving %s" % self.name)
-        print("-----------------")
-
-        if parallel:
-            pool = Pool(processes=min(self.n_instances, cpu_count()))
-
-        # Iterate over all solvers
+    def tasks(self):
+        '''
+        List of (example, dimension, instance, solver, settings) tasks
+        that do not have stored results yet
+        '''
+        store = ResultsStore(self.output_folder)
+        tasks = []
         for solver in self.solvers:
-            settings = self.settings[solver]
-
-            # Initialize solver results
-            results_solver = []
-
-            # Solution directory
-            path = os.path.join('.', 'results', self.output_folder,
-                                solver,
-                                self.name
-                                )
-
-            # Create directory for the results
-            make_sure_path_exists(path)
-
-            # Get solver file name
-            solver_file_name = os.path.join(path, 'full.csv')
-
+            # Dimensions already solved
+            solved_dims = set()
+            if store.has_results(solver, self.name):
+                solved_dims = set(store.read(solver, columns=['n'],
+                                             classes=[self.name])['n'])
             for n in self.dims:
+                if n not in solved_dims:
+                    for instance in range(self.n_instances):
+                        tasks.append((self, n, instance,
+                                      solver, self.settings[solver]))
+        return tasks
 
-                # Check if solution already exists
-                n_file_name = os.path.join(path, 'n%i.csv' % n)
-
-                if not os.path.isfile(n_file_name):
-
-                    if parallel and solver not in ['ECOS', 'ECOS_high', 'qpOASES']:
-                        # NB. ECOS and qpOASES crahs if the problem sizes are too large
-                        instances_list = list(range(self.n_instances))
-                        n_results = pool.starmap(self.solve_single_example,
-                                                 zip(repeat(n),
-                                                     instances_list,
-                                                     repeat(solver),
-                                                     repeat(settings)))
-                    else:
-                        n_results = []
-                        for instance in range(self.n_instances):
-                            n_results.append(
-                                self.solve_single_example(n,
-                                                          instance,
-                                                          solver,
-                                                          settings)
-                                )
-
-                    # Combine n_results
-                    df = pd.concat(n_results)
-
-                    # Store n_results
-                    df.to_csv(n_file_name, index=False)
-
-                else:
-                    # Load from file
-                    df = pd.read_csv(n_file_name)
-
-                # Combine list of dataframes
-                results_solver.append(df)
-
-            # Create total dataframe for the solver from list
-            df_solver = pd.concat(results_solver)
-
-            # Store dataframe
-            df_solver.to_csv(solver_file_name, index=False)
-
-        if parallel:
-            pool.close()  # Not accepting any more jobs on this pool
-            pool.join()   # Wait for all processes to finish
+    def journal_key(self, dimension, instance_number, solver):
+        '''
+        Key of the task in the journal of the completed tasks
+        '''
+        return (self.name, solver, int(dimension), int(instance_number))
 
     def solve_single_example(self,
                              dimension, instance_number,
@@ -147,16 +139,20 @@ class Example(object):
 
         '''
 
-        # Create example instance
-        example_instance = EXAMPLES_MAP[self.name](dimension,
-                                                   instance_number)
+        # Load example instance (generated once and shared by all solvers)
+        example_instance = load_example(EXAMPLES_MAP[self.name],
+                                        dimension,
+                                        instance_number)
 
         print(" - Solving %s with n = %i, instance = %i with solver %s" %
               (self.name, dimension, instance_number, solver))
 
         # Solve problem
         s = SOLVER_MAP[solver](settings)
+        memory = MemoryTracker(trace_python=self.trace_memory)
+        memory.start()
         results = s.solve(example_instance)
+        peak_memory = memory.stop()
 
         # Create solution as pandas table
         P = example_instance.qp_problem['P']
@@ -164,6 +160,7 @@ class Example(object):
         N = P.nnz + A.nnz
         solution_dict = {'class': [self.name],
                          'solver': [solver],
+                         'instance': [instance_number],
                          'status': [results.status],
                          'run_time': [results.run_time],
                          'iter': [results.niter],
@@ -171,6 +168,12 @@ class Example(object):
                          'n': [dimension],
                          'N': [N]}
 
+        # Add wall-clock time of the solve phases
+        solution_dict.update(results.wall_times())
+
+        # Add peak memory of the solve
+        solution_dict.update(peak_memory)
+
         # Add status polish if OSQP
         if solver[:4] == 'OSQP':
             solution_dict['status_polish'] = results.status_polish
@@ -178,6 +181,213 @@ class Example(object):
             solution_dict['solve_time'] = results.solve_time
             solution_dict['update_time'] = results.update_time
             solution_dict['rho_updates'] = results.rho_updates
+            solution_dict['workspace_reused'] = results.workspace_reused
 
         # Return solution
         return pd.DataFrame(solution_dict)
+
+    def failed_example(self,
+                       dimension, instance_number,
+                       solver, settings, status):
+        '''
+        Results of 'example' when the task solving it with 'solver' crashed
+        or exceeded the time limit in sandbox mode
+
+        Args:
+            dimension: problem leading dimension
+            instance_number: number of the instance
+            solver: solver name
+            settings: settings dictionary for the solver
+            status: failure status
+        '''
+        print(" - Failed %s with n = %i, instance = %i with solver %s (%s)" %
+              (self.name, dimension, instance_number, solver, status))
+
+        solution_dict = {'class': [self.name],
+                         'solver': [solver],
+                         'instance': [instance_number],
+                         'status': [status],
+                         'run_time': [None],
+                         'iter': [None],
+                         'obj_val': [None],
+                         'n': [dimension],
+                         'N': [None]}
+
+        return pd.DataFrame(solution_dict)
+
+
+def failed_generation(example_class, dimension, seed, status):
+    '''
+    Result of the generation of an instance that crashed, ran out of
+    memory or exceeded the time limit in sandbox mode
+    '''
+    print(" - Failed to generate %s with n = %i, instance = %i (%s)" %
+          (example_class.name(), dimension, seed, status))
+
+
+def previous_nnz():
+    '''
+    Get the average number of nonzeros of every (class, dimension) pair
+    from the results of previous runs
+    '''
+    nnz = {}
+    folders = glob.glob(os.path.join('.', 'results', '*', STORE_FOLDER))
+    for folder in folders:
+        store = ResultsStore(os.path.basename(os.path.dirname(folder)))
+        try:
+            df = store.read(columns=['N'], classes=list(EXAMPLES_MAP))
+        except (KeyError, ValueError):
+            continue   # Not a benchmark problems store
+        for (name, n), N in df.groupby(['class', 'n'])['N'].mean().items():
+            nnz.setdefault((name, int(n)), N)
+    return nnz
+
+
+def estimate_costs(tasks):
+    '''
+    Estimate the cost of each task as the number of nonzeros of its
+    problem in previous runs. If the problem has never been solved, use
+    the squared leading dimension as a rough proxy.
+    '''
+    nnz = previous_nnz()
+    return [nnz.get((example.name, n), float(n) ** 2)
+            for (example, n, _, _, _) in tasks]
+
+
+def solve_examples(examples, parallel=True, cores=None,
+                   sandbox=False, memory_limit=None):
+    '''
+    Solve all the examples with all their solvers
+
+    Every (solver, class, dimension, instance) combination is a separate
+    task and all the tasks share the same queue sorted by estimated cost.
+    In this way the workers stay busy until the whole sweep is done
+    without waiting for each dimension to finish.
+    The tasks of the SERIAL_SOLVERS are solved serially at the end.
+
+    The result of every task is recorded in the TaskJournal of the
+    output folder as soon as the task returns. If the run is interrupted,
+    the next run solves only the tasks missing from the journal.
+
+    In sandbox mode, each task runs in its own process with limited memory
+    and wall-clock time (SANDBOX_TIME_LIMIT). Tasks that crash are stored
+    with status SOLVER_ERROR and tasks that exceed the time are stored with
+    status TIME_LIMIT. The SERIAL_SOLVERS then run in parallel on the
+    problems with less than SANDBOX_PARALLEL_MAX_NNZ nonzeros.
+
+    Args:
+        examples: list of Example objects
+        parallel: solve the tasks in parallel
+        cores: number of worker processes (default all the cores)
+        sandbox: run each task in an isolated process
+        memory_limit: resident memory limit of each task in bytes in sandbox
+                      mode (default physical memory divided by the number of
+                      parallel tasks)
+    '''
+    for example in examples:
+        print("Solving %s" % example.name)
+    print("-----------------")
+
+    if cores is None:
+        cores = cpu_count()
+
+    tasks = [task for example in examples for task in example.tasks()]
+    journals = {example.output_folder: TaskJournal(example.output_folder)
+                for example in examples}
+
+    # Results of each (class, solver, dimension) indexed by instance
+    groups = {}
+    for (example, n, instance, solver, _) in tasks:
+        groups.setdefault((example.name, solver, n),
+                          [None] * example.n_instances)
+
+    def add_result(task, df):
+        (example, n, instance, solver, _) = task
+        n_results = groups[(example.name, solver, n)]
+        n_results[instance] = df
+
+        if all(r is not None for r in n_results):
+            # Store n_results as soon as all the instances are solved
+            ResultsStore(example.output_folder).append(pd.concat(n_results))
+            journals[example.output_folder].remove(
+                [example.journal_key(n, i, solver)
+                 for i in range(example.n_instances)])
+
+    # Recover the results of the tasks completed in previous runs
+    remaining_tasks = []
+    for task in tasks:
+        (example, n, instance, solver, _) = task
+        df = journals[example.output_folder].get(
+            example.journal_key(n, instance, solver))
+        if df is None:
+            remaining_tasks.append(task)
+        else:
+            add_result(task, df)
+    tasks = remaining_tasks
+    costs = estimate_costs(tasks)
+
+    def run_in_parallel(i):
+        if not parallel:
+            return False
+        if tasks[i][3] not in SERIAL_SOLVERS:
+            return True
+        return sandbox and costs[i] < SANDBOX_PARALLEL_MAX_NNZ
+
+    # Generate each problem instance once for all the solvers. In sandbox
+    # mode the generators run with the same limits as the parallel tasks
+    # and an instance that fails is generated again (and fails) inside
+    # the sandbox of its tasks.
+    instances = sorted(set((EXAMPLES_MAP[example.name], n, instance)
+                           for (example, n, instance, _, _) in tasks),
+                       key=lambda t: (t[0].name(), t[1], t[2]))
+    generation_memory_limit = memory_limit
+    if sandbox and memory_limit is None:
+        generation_memory_limit = physical_memory()
+        if parallel:
+            generation_memory_limit /= max(1, min(cores, len(instances)))
+    for _ in run_tasks(generate_example, instances,
+                       costs=[float(n) ** 2 for (_, n, _) in instances],
+                       parallel=parallel, cores=cores,
+                       sandbox=sandbox,
+                       memory_limit=generation_memory_limit,
+                       time_limit=SANDBOX_TIME_LIMIT,
+                       failure=failed_generation):
+        pass
+
+    parallel_idx = [i for i in range(len(tasks)) if run_in_parallel(i)]
+    serial_idx = [i for i in range(len(tasks)) if not run_in_parallel(i)]
+
+    for batch, batch_parallel in [(parallel_idx, True), (serial_idx, False)]:
+
+        # Split the memory among the tasks running at the same time
+        batch_memory_limit = memory_limit
+        if sandbox and memory_limit is None:
+            batch_memory_limit = physical_memory()
+            if batch_parallel:
+                batch_memory_limit /= max(1, min(cores, len(batch)))
+
+        # Solve the OSQP variants of an instance in the same worker to
+        # reuse the OSQP setup until they are all solved (not in sandbox
+        # mode)
+        groups = [(tasks[i][0].name, tasks[i][1], tasks[i][2])
+                  if tasks[i][3][:4] == 'OSQP' else None for i in batch]
+
+        for index, df in run_tasks(Example.solve_single_example,
+                                   [tasks[i] for i in batch],
+                                   costs=[costs[i] for i in batch],
+                                   groups=groups,
+                                   group_context=workspace_group,
+                                   parallel=batch_parallel,
+                                   cores=cores,
+                                   sandbox=sandbox,
+                                   memory_limit=batch_memory_limit,
+                                   time_limit=SANDBOX_TIME_LIMIT,
+                                   failure=Example.failed_example):
+            task = tasks[batch[index]]
+            (example, n, instance, solver, _) = task
+            journals[example.output_folder].add(
+                example.journal_key(n, instance, solver), df)
+            add_result(task, df)
+
+    for journal in journals.values():
+        journal.close()
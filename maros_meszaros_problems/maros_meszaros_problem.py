@@ -1,11 +1,14 @@
 import os
-from multiprocessing import Pool, cpu_count
-from itertools import repeat
+from multiprocessing import cpu_count
 import pandas as pd
 
 from solvers.solvers import SOLVER_MAP
+from solvers.osqp import workspace_group
 from problem_classes.maros_meszaros import MarosMeszaros
-from utils.general import make_sure_path_exists
+from utils.store import ResultsStore
+from utils.journal import TaskJournal
+from utils.scheduler import run_tasks
+from utils.general import MemoryTracker
 from utils.maros_meszaros import OPT_COST_MAP
 
 import numpy as np
@@ -20,10 +23,12 @@ class MarosMeszarosRunner(object):
     def __init__(self,
                  solvers,
                  settings,
-                 output_folder):
+                 output_folder,
+                 trace_memory=False):
         self.solvers = solvers
         self.settings = settings
         self.output_folder = output_folder
+        self.trace_memory = trace_memory
 
         # Get maros problems list
         problems_dir = os.path.join(".", "problem_classes", PROBLEMS_FOLDER)
@@ -36,11 +41,15 @@ class MarosMeszarosRunner(object):
         '''
         Solve problems of type example
 
-        The results are stored as
+        The results are appended to the results store
 
-            ./results/{self.output_folder}/{solver}/results.csv
+            ./results/{self.output_folder}/store/
 
-        using a pandas table with fields
+        as soon as all the problems are solved by a solver. The result of
+        each problem is also recorded in the journal of the completed
+        tasks so that an interrupted run restarts from the missing ones.
+        The results are stored using a pandas table with fields
+            - 'class': problem class
             - 'name': Maros problem name
             - 'solver': solver name
             - 'status': solver status
@@ -50,61 +59,79 @@ class MarosMeszarosRunner(object):
             - 'obj_opt': optimal objective value
             - 'n': leading dimension
             - 'N': nnz dimension (nnz(P) + nnz(A))
+            - '{phase}_wall_time': wall-clock time of each phase of the
+              solve (conversion, build, solve, extraction, check)
+            - 'peak_rss_delta': peak resident memory of the solve in bytes
+              (above the one before the solve)
+            - 'peak_tracemalloc': peak Python allocations of the solve in
+              bytes (NaN without trace_memory, since tracing biases the
+              timings)
+            - 'fresh_process': the solve is the first one measured in its
+              process (only those peak memories are comparable)
         '''
 
         print("Solving Maros Meszaros problems")
         print("-------------------------------")
 
-        if parallel:
-            pool = Pool(processes=min(cores, cpu_count()))
+        store = ResultsStore(self.output_folder)
+        journal = TaskJournal(self.output_folder)
 
-        # Iterate over all solvers
-        for solver in self.solvers:
-            settings = self.settings[solver]
+        # Results of each solver indexed by problem
+        results = {}
 
-            #  # Initialize solver results
-            #  results_solver = []
+        def add_result(problem, solver, df):
+            results[solver][problem] = df
 
-            # Solution directory
-            path = os.path.join('.', 'results', self.output_folder,
-                                solver)
+            if len(results[solver]) == len(self.problems):
+                # Store results as soon as all the problems are solved
+                store.append(pd.concat([results[solver][p]
+                                        for p in self.problems]))
+                journal.remove([(solver, p) for p in self.problems])
 
-            # Create directory for the results
-            make_sure_path_exists(path)
+        # Tasks without results in the store or in the journal of the
+        # completed tasks (e.g. from an interrupted run)
+        tasks = []
+        for solver in self.solvers:
+            if store.has_results(solver, MarosMeszaros.name()):
+                continue
+            results[solver] = {}
+            for problem in self.problems:
+                df = journal.get((solver, problem))
+                if df is None:
+                    tasks.append((problem, solver, self.settings[solver]))
+                else:
+                    add_result(problem, solver, df)
 
-            # Get solver file name
-            results_file_name = os.path.join(path, 'results.csv')
+        problems_dir = os.path.join(".", "problem_classes", PROBLEMS_FOLDER)
 
-            # Check if file name already exists
-            if not os.path.isfile(results_file_name):
-                # Solve Maros Meszaros problems
-                if parallel:
-                    results = pool.starmap(self.solve_single_example,
-                                           zip(self.problems,
-                                               repeat(solver),
-                                               repeat(settings)))
-                else:
-                    results = []
-                    for problem in self.problems:
-                        results.append(self.solve_single_example(problem,
-                                                                 solver,
-                                                                 settings))
-                # Create dataframe
-                df = pd.concat(results)
-
-                # Store results
-                df.to_csv(results_file_name, index=False)
-
-            #  else:
-            #      # Load from file
-            #      df = pd.read_csv(results_file_name)
-            #
-            #      # Combine list of dataframes
-            #      results_solver.append(df)
-
-        if parallel:
-            pool.close()  # Not accepting any more jobs on this pool
-            pool.join()   # Wait for all processes to finish
+        # Load the problems from the packed store (packed on first use)
+        if tasks:
+            MarosMeszaros.pack({problem: os.path.join(problems_dir,
+                                                      '%s.mat' % problem)
+                                for problem in self.problems})
+
+        # Use the file sizes to solve the largest problems first
+        costs = [os.path.getsize(os.path.join(problems_dir,
+                                              '%s.mat' % problem))
+                 for (problem, _, _) in tasks]
+
+        # Solve the OSQP variants of a problem in the same worker to
+        # reuse the OSQP setup until they are all solved
+        groups = [problem if solver[:4] == 'OSQP' else None
+                  for (problem, solver, _) in tasks]
+
+        # Record every result in the journal as soon as it is available
+        for index, df in run_tasks(self.solve_single_example, tasks,
+                                   costs=costs,
+                                   parallel=parallel,
+                                   cores=min(cores, cpu_count()),
+                                   groups=groups,
+                                   group_context=workspace_group):
+            problem, solver, _ = tasks[index]
+            journal.add((solver, problem), df)
+            add_result(problem, solver, df)
+
+        journal.close()
 
     def solve_single_example(self,
                              problem,
@@ -128,7 +155,10 @@ class MarosMeszarosRunner(object):
 
         # Solve problem
         s = SOLVER_MAP[solver](settings)
+        memory = MemoryTracker(trace_python=self.trace_memory)
+        memory.start()
         results = s.solve(instance)
+        peak_memory = memory.stop()
 
         # Create solution as pandas table
         P = instance.qp_problem['P']
@@ -153,7 +183,8 @@ class MarosMeszarosRunner(object):
         #  else:
         #      obj_dist = np.inf
 
-        solution_dict = {'name': [problem],
+        solution_dict = {'class': [MarosMeszaros.name()],
+                         'name': [problem],
                          'solver': [solver],
                          'status': [results.status],
                          'run_time': [results.run_time],
@@ -165,6 +196,12 @@ class MarosMeszarosRunner(object):
                          'm': [instance.qp_problem["m"]],
                          'N': [N]}
 
+        # Add wall-clock time of the solve phases
+        solution_dict.update(results.wall_times())
+
+        # Add peak memory of the solve
+        solution_dict.update(peak_memory)
+
         # Add status polish if OSQP
         if solver[:4] == 'OSQP':
             solution_dict['status_polish'] = results.status_polish
@@ -172,6 +209,7 @@ class MarosMeszarosRunner(object):
             solution_dict['solve_time'] = results.solve_time
             solution_dict['update_time'] = results.update_time
             solution_dict['rho_updates'] = results.rho_updates
+            solution_dict['workspace_reused'] = results.workspace_reused
 
         print(" - Solved %s with solver %s" % (problem, solver))
 
@@ -2,11 +2,12 @@
 Solve Lasso problem as parametric QP by updating iteratively lambda
 """
 import numpy as np
-import pandas as pd
 import os
 from solvers.solvers import SOLVER_MAP  # AVOID CIRCULAR DEPENDENCY
 from problem_classes.lasso import LassoExample
 from utils.general import make_sure_path_exists
+from utils.parametric import ParametricSweep, SolveRecorder, \
+    parametric_results_file
 # import osqppurepy as osqp
 import osqp
 
@@ -16,7 +17,8 @@ class LassoParametric(object):
                  osqp_settings,
                  dimension,
                  minimum_lambda_over_max=0.01,
-                 n_problems=100):
+                 n_problems=100,
+                 seed=1):
         """
         Generate Parametric Lasso object
 
@@ -25,92 +27,124 @@ class LassoParametric(object):
             dimension: leading dimension for the problem
             minimum_lambda_over_max: min ratio between lambda and lambda_max
             n_problem: number of lasso problems to solve
+            seed: random seed of the problem data
         """
         self.osqp_settings = osqp_settings
         self.dimension = dimension
         self.minimum_lambda_over_max = minimum_lambda_over_max
         self.n_problems = n_problems
+        self.seed = seed
 
-    def solve(self):
+    @staticmethod
+    def name():
+        return 'Lasso'
+
+    def example(self):
+        """
+        Generate the Lasso instance (the same in every pass)
+        """
+        return LassoExample(self.dimension, seed=self.seed)
+
+    def estimated_nnz(self):
+        """
+        Expected number of nonzeros of P and A of the instance computed
+        from its dimensions (without generating it)
+        """
+        n = self.dimension
+        m = 100 * n                     # Data points
+        nnz_P = m                       # 2 * I on the residuals
+        nnz_A = .15 * m * n + m + 4 * n
+        return int(nnz_P + nnz_A)
+
+    def results_file(self, warm_start):
+        return parametric_results_file(self.name(), self.dimension,
+                                       warm_start)
+
+    def solve(self, warm_start=None):
         """
         Solve Lasso problem
+
+        Args:
+            warm_start: solve only the pass with (True) or without (False)
+                        warm start (default both)
         """
 
         print("Solve Lasso problem for dimension %i" % self.dimension)
 
-        # Create example instance
-        instance = LassoExample(self.dimension)
-        qp = instance.qp_problem
+        if warm_start is None or not warm_start:
+            self.solve_no_ws()
+        if warm_start is None or warm_start:
+            self.solve_ws()
 
-        # Create lambda array
-        lambda_array = np.logspace(np.log10(self.minimum_lambda_over_max *
-                                            instance.lambda_max),
-                                   np.log10(instance.lambda_max),
-                                   self.n_problems)[::-1]   # From max to min
+    def lambda_array(self, instance):
+        """
+        Lambda values of the sweep from max to min
+        """
+        return np.logspace(np.log10(self.minimum_lambda_over_max *
+                                    instance.lambda_max),
+                           np.log10(instance.lambda_max),
+                           self.n_problems)[::-1]
 
-        '''
+    def solve_no_ws(self):
+        """
         Solve problem without warm start
-        '''
+        """
         #  print("Solving without warm start")
-        # Solution directory
-        no_ws_path = os.path.join('.', 'results', 'parametric_problems',
-                                  'OSQP no warmstart',
-                                  'Lasso',
-                                  )
-
-        # Create directory for the results
-        make_sure_path_exists(no_ws_path)
 
         # Check if solution already exists
-        n_file_name = os.path.join(no_ws_path, 'n%i.csv' % self.dimension)
-
-        if not os.path.isfile(n_file_name):
+        n_file_name = self.results_file(False)
+        if os.path.isfile(n_file_name):
+            return
 
-            res_list_no_ws = []  # Initialize results
-            for lambda_val in lambda_array:
-                # Update lambda
-                instance.update_lambda(lambda_val)
+        # Create directory for the results
+        make_sure_path_exists(os.path.dirname(n_file_name))
 
-                # Solve problem
-                m = osqp.OSQP()
-                m.setup(qp['P'], qp['q'], qp['A'], qp['l'], qp['u'],
-                        **self.osqp_settings)
-                r = m.solve()
+        # Create example instance
+        instance = self.example()
+        qp = instance.qp_problem
+        lambda_array = self.lambda_array(instance)
 
-                # DEBUG
-                #  print("Lambda = %.4e,\t niter = %d" % (lambda_val, r.info.iter))
+        recorder = SolveRecorder(len(lambda_array))  # Initialize results
+        sweep = ParametricSweep.from_problem(qp, len(lambda_array))
+        for lambda_val in lambda_array:
+            # Update lambda
+            instance.update_lambda(lambda_val)
 
-                if r.info.status != "solved":
-                    print("OSQP no warmstart did not solve the problem")
+            # Solve problem
+            m = osqp.OSQP()
+            m.setup(qp['P'], qp['q'], qp['A'], qp['l'], qp['u'],
+                    **self.osqp_settings)
+            r = m.solve()
 
-                solution_dict = {'status': [r.info.status],
-                                 'run_time': [r.info.run_time],
-                                 'iter': [r.info.iter]}
+            # DEBUG
+            #  print("Lambda = %.4e,\t niter = %d" % (lambda_val, r.info.iter))
 
-                res_list_no_ws.append(pd.DataFrame(solution_dict))
+            if r.info.status != "solved":
+                print("OSQP no warmstart did not solve the problem")
 
-            # Get full warm-start
-            res_no_ws = pd.concat(res_list_no_ws)
+            recorder.add(r.info)
+            sweep.add(r.x, r.y, qp['q'], qp['l'], qp['u'])
 
-            # Store file
-            res_no_ws.to_csv(n_file_name, index=False)
+        # Store file with the KKT check of all the solutions at once
+        recorder.save(n_file_name, sweep)
 
-        '''
+    def solve_ws(self):
+        """
         Solve problem with warm start
-        '''
-
+        """
         #  print("Solving with warm start")
-        # Solution directory
-        ws_path = os.path.join('.', 'results', 'parametric_problems',
-                               'OSQP warmstart',
-                               'Lasso',
-                               )
+
+        # Check if solution already exists
+        n_file_name = self.results_file(True)
+        if os.path.isfile(n_file_name):
+            return
 
         # Create directory for the results
-        make_sure_path_exists(ws_path)
+        make_sure_path_exists(os.path.dirname(n_file_name))
 
-        # Check if solution already exists
-        n_file_name = os.path.join(ws_path, 'n%i.csv' % self.dimension)
+        # Create example instance
+        instance = self.example()
+        lambda_array = self.lambda_array(instance)
 
         # Reset problem to first instance
         instance.update_lambda(lambda_array[0])
@@ -121,36 +155,25 @@ class LassoParametric(object):
         m.setup(qp['P'], qp['q'], qp['A'], qp['l'], qp['u'],
                 **self.osqp_settings)
 
-        if not os.path.isfile(n_file_name):
-
-            res_list_ws = []  # Initialize results
-            for lambda_val in lambda_array:
-
-                # Update lambda
-                instance.update_lambda(lambda_val)
-                m.update(q=qp['q'])
-
-                # Solve problem
-                r = m.solve()
-
-                # DEBUG
-                #  print("Lambda = %.4e,\t niter = %d" % (lambda_val, r.info.iter))
+        recorder = SolveRecorder(len(lambda_array))  # Initialize results
+        sweep = ParametricSweep.from_problem(qp, len(lambda_array))
+        for lambda_val in lambda_array:
 
-                if r.info.status != "solved":
-                    print("OSQP warmstart did not solve the problem")
+            # Update lambda
+            instance.update_lambda(lambda_val)
+            m.update(q=qp['q'])
 
-                # Get results
-                solution_dict = {'status': [r.info.status],
-                                 'run_time': [r.info.run_time],
-                                 'iter': [r.info.iter]}
+            # Solve problem
+            r = m.solve()
 
-                res_list_ws.append(pd.DataFrame(solution_dict))
+            # DEBUG
+            #  print("Lambda = %.4e,\t niter = %d" % (lambda_val, r.info.iter))
 
-            # Get full warm-start
-            res_ws = pd.concat(res_list_ws)
+            if r.info.status != "solved":
+                print("OSQP warmstart did not solve the problem")
 
-            # Store file
-            res_ws.to_csv(n_file_name, index=False)
+            recorder.add(r.info)
+            sweep.add(r.x, r.y, qp['q'], qp['l'], qp['u'])
 
-        else:
-            res_ws = pd.read_csv(n_file_name)
+        # Store file with the KKT check of all the solutions at once
+        recorder.save(n_file_name, sweep)
@@ -0,0 +1,213 @@
+"""
+Solve the Lasso regularization path with a single OSQP setup
+"""
+import os
+import time
+import numpy as np
+from problem_classes.lasso import LassoExample
+from utils.general import make_sure_path_exists
+from utils.parametric import ParametricSweep, SolveRecorder
+# import osqppurepy as osqp
+import osqp
+
+
+def lasso_path_results_file(dimension):
+    """
+    File with the solves of the Lasso path
+
+        ./results/parametric_problems/lasso_path/n{dim}.csv
+    """
+    return os.path.join('.', 'results', 'parametric_problems', 'lasso_path',
+                        'n%i.csv' % dimension)
+
+
+class LassoPath(object):
+    def __init__(self,
+                 osqp_settings,
+                 dimension,
+                 minimum_lambda_over_max=0.01,
+                 n_lambdas=100,
+                 adaptive=False,
+                 max_refinements=3,
+                 active_tol=1e-03,
+                 seed=1):
+        """
+        Generate Lasso path object
+
+        Args:
+            osqp_settings: osqp solver settings
+            dimension: leading dimension for the problem
+            minimum_lambda_over_max: min ratio between lambda and lambda_max
+            n_lambdas: number of lambdas of the initial grid
+            adaptive: refine the grid where the active set changes
+            max_refinements: maximum number of refinements of the grid
+            active_tol: coefficients larger than active_tol * ||x||_inf
+                        are active
+            seed: random seed of the problem data
+        """
+        self.osqp_settings = osqp_settings
+        self.dimension = dimension
+        self.minimum_lambda_over_max = minimum_lambda_over_max
+        self.n_lambdas = n_lambdas
+        self.adaptive = adaptive
+        self.max_refinements = max_refinements
+        self.active_tol = active_tol
+        self.seed = seed
+
+    @staticmethod
+    def q_matrix(instance, lambdas):
+        """
+        Linear costs of all the lambdas as a (n_vars x k) matrix
+        """
+        Q = np.zeros((instance.qp_problem['n'], len(lambdas)))
+        Q[instance.m + instance.n:, :] = lambdas
+        return Q
+
+    def active_set(self, x, n):
+        """
+        Active coefficients of the Lasso solution x (first n entries)
+        """
+        coef = np.abs(x[:n])
+        return coef > self.active_tol * max(coef.max(), 1e-20)
+
+    def solve(self):
+        """
+        Solve the Lasso path from lambda_max to the minimum lambda
+
+        All the problems share the OSQP setup of the first one. Every
+        solve is warm started from the solution of the closest larger
+        lambda (homotopy order). With the adaptive grid, a new lambda is
+        added between two consecutive lambdas whose active sets differ in
+        more than one coefficient, up to max_refinements times.
+
+        Returns:
+            dictionary with the path statistics
+                - 'lambdas': number of lambdas solved
+                - 'path_time': wall-clock time of the whole path
+                - 'solves_per_second': lambdas over path_time
+                - 'run_time': total OSQP run time
+        """
+        print("Solve Lasso path for dimension %i" % self.dimension)
+
+        instance = LassoExample(self.dimension, seed=self.seed)
+        qp = instance.qp_problem
+        n = instance.n
+        lambdas = np.logspace(np.log10(self.minimum_lambda_over_max *
+                                       instance.lambda_max),
+                              np.log10(instance.lambda_max),
+                              self.n_lambdas)[::-1]   # From max to min
+
+        # Bound on the number of solves
+        max_lambdas = self.n_lambdas
+        if self.adaptive:
+            max_lambdas *= 2 ** self.max_refinements
+
+        recorder = SolveRecorder(max_lambdas)
+        sweep = ParametricSweep.from_problem(qp, max_lambdas)
+        solved_lambdas = []
+        X = np.empty((qp['n'], max_lambdas))
+        Y = np.empty((qp['m'], max_lambdas))
+
+        start = time.perf_counter()
+
+        # Setup solver once for the whole path
+        Q = self.q_matrix(instance, lambdas)
+        m = osqp.OSQP()
+        m.setup(qp['P'], Q[:, 0], qp['A'], qp['l'], qp['u'],
+                **self.osqp_settings)
+
+        def solve_lambda(q, x_ws=None, y_ws=None):
+            k = recorder.k
+            m.update(q=q)
+            if x_ws is not None:
+                m.warm_start(x=x_ws, y=y_ws)
+            r = m.solve()
+            if r.info.status != "solved":
+                print("OSQP did not solve the problem")
+            recorder.add(r.info)
+            sweep.add(r.x, r.y, q, qp['l'], qp['u'])
+            X[:, k] = r.x
+            Y[:, k] = r.y
+            return k
+
+        # Solve the grid (homotopy order)
+        path = []   # Solve index of each lambda in decreasing order
+        for j, lambda_val in enumerate(lambdas):
+            solved_lambdas.append(lambda_val)
+            path.append(solve_lambda(Q[:, j]))
+
+        # Refine where the active set changes
+        for _ in range(self.max_refinements if self.adaptive else 0):
+            active = [self.active_set(X[:, k], n) for k in path]
+            new_path = [path[0]]
+            for j in range(1, len(path)):
+                if np.sum(active[j] != active[j - 1]) > 1:
+                    # Geometric midpoint warm started from larger lambda
+                    k_prev = path[j - 1]
+                    lambda_val = np.sqrt(solved_lambdas[k_prev] *
+                                         solved_lambdas[path[j]])
+                    solved_lambdas.append(lambda_val)
+                    q = self.q_matrix(instance, [lambda_val])[:, 0]
+                    new_path.append(solve_lambda(q, X[:, k_prev],
+                                                 Y[:, k_prev]))
+                new_path.append(path[j])
+            if len(new_path) == len(path):
+                break
+            path = new_path
+
+        path_time = time.perf_counter() - start
+
+        # Store file with the lambdas in decreasing order
+        n_file_name = lasso_path_results_file(self.dimension)
+        make_sure_path_exists(os.path.dirname(n_file_name))
+        df = sweep.add_residuals(recorder.frame())
+        df.insert(0, 'lambda', solved_lambdas)
+        df.insert(1, 'active', [self.active_set(X[:, k], n).sum()
+                                for k in range(recorder.k)])
+        df.iloc[path].to_csv(n_file_name, index=False)
+
+        self.lambdas = np.array(solved_lambdas)[path]
+        self.coef = X[:n, path]
+
+        stats = {'dimension': self.dimension,
+                 'lambdas': recorder.k,
+                 'path_time': path_time,
+                 'solves_per_second': recorder.k / path_time,
+                 'run_time': df['run_time'].sum(),
+                 'mean_iter': df['iter'].mean()}
+        print(" - %i lambdas in %.4e sec (%.0f solves/second)" %
+              (recorder.k, path_time, stats['solves_per_second']))
+        return stats
+
+    def compare_sklearn(self):
+        """
+        Solve the same path with the coordinate descent path solver of
+        scikit-learn (solve must be called first)
+
+        The Lasso objective of scikit-learn is
+            1 / (2 m) ||b - A x||^2 + alpha ||x||_1
+        so that alpha = lambda / (2 m).
+
+        Returns:
+            dictionary with the path time of scikit-learn and the maximum
+            distance between the coefficients of the two paths (empty if
+            scikit-learn is not installed)
+        """
+        try:
+            from sklearn.linear_model import lasso_path
+        except ImportError:
+            print("scikit-learn not installed: skipping comparison")
+            return {}
+
+        instance = LassoExample(self.dimension, seed=self.seed)
+        alphas = self.lambdas / (2 * instance.m)
+
+        start = time.perf_counter()
+        _, coef, _ = lasso_path(instance.Ad.tocsc(), instance.bd,
+                                alphas=alphas)
+        sklearn_time = time.perf_counter() - start
+
+        return {'sklearn_path_time': sklearn_time,
+                'sklearn_solves_per_second': len(alphas) / sklearn_time,
+                'sklearn_coef_dist': np.abs(coef - self.coef).max()}
+
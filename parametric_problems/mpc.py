@@ -2,10 +2,12 @@
 Solve Lasso problem as parametric QP by updating iteratively lambda
 """
 import numpy as np
-import pandas as pd
 import os
+import time
 from problem_classes.control import ControlExample
-from utils.general import make_sure_path_exists
+from utils.general import make_sure_path_exists, realtime_process
+from utils.parametric import ParametricSweep, SolveRecorder, \
+    parametric_results_file, latency_results_file
 # import osqppurepy as osqp
 import osqp
 
@@ -14,7 +16,8 @@ class MPCParametric(object):
     def __init__(self,
                  osqp_settings,
                  dimension,
-                 n_simulation=100):
+                 n_simulation=100,
+                 seed=1):
         """
         Generate MPC problem as parametric QP
 
@@ -23,160 +26,255 @@ class MPCParametric(object):
             dimension: leading dimension for the problem
             minimum_lambda_over_max: min ratio between lambda and lambda_max
             n_simulation: number of MPC problems to solve
+            seed: random seed of the problem data
         """
         self.osqp_settings = osqp_settings
         self.dimension = dimension
         self.n_simulation = n_simulation
+        self.n_problems = n_simulation
+        self.seed = seed
 
-    def solve(self):
+    @staticmethod
+    def name():
+        return 'MPC'
+
+    def example(self):
+        """
+        Generate the MPC instance (the same in every pass)
+        """
+        return ControlExample(self.dimension, seed=self.seed)
+
+    def estimated_nnz(self):
+        """
+        Expected number of nonzeros of P and A of the instance computed
+        from its dimensions (without generating it)
+        """
+        nx, nu = int(self.dimension), int(self.dimension / 2)
+        T = 10                                # Horizon
+        nnz_P = .7 * T * nx + nx ** 2 + T * nu  # Q, dense QN and R
+        nnz_A = (T + 1) * nx + T * nx ** 2 + T * nx * nu + \
+            (T + 1) * nx + T * nu             # Dynamics and bounds
+        return int(nnz_P + nnz_A)
+
+    def results_file(self, warm_start):
+        return parametric_results_file(self.name(), self.dimension,
+                                       warm_start)
+
+    def solve(self, warm_start=None):
         """
         Solve MPC problem
+
+        Args:
+            warm_start: solve only the pass with (True) or without (False)
+                        warm start (default both)
         """
 
         print("Solve MPC problem for dimension %i" % self.dimension)
 
-        # Create example instance
-        instance = ControlExample(self.dimension)
-        qp = instance.qp_problem
-        x0 = np.copy(instance.x0)
+        if warm_start is None or not warm_start:
+            self.solve_no_ws()
+        if warm_start is None or warm_start:
+            self.solve_ws()
 
-        '''
+    def solve_no_ws(self):
+        """
         Solve problem without warm start
-        '''
-        # Solution directory
-        no_ws_path = os.path.join('.', 'results', 'parametric_problems',
-                                  'OSQP no warmstart',
-                                  'MPC',
-                                  )
-
-        # Create directory for the results
-        make_sure_path_exists(no_ws_path)
+        """
 
         # Check if solution already exists
-        n_file_name = os.path.join(no_ws_path, 'n%i.csv' % self.dimension)
+        n_file_name = self.results_file(False)
+        if os.path.isfile(n_file_name):
+            return
 
-        if not os.path.isfile(n_file_name):
-            # Initialize states and inputs for the whole simulation
-            X_no_ws = np.zeros((instance.nx, self.n_simulation + 1))
-            U_no_ws = np.zeros((instance.nu, self.n_simulation))
-            X_no_ws[:, 0] = x0
+        # Create directory for the results
+        make_sure_path_exists(os.path.dirname(n_file_name))
 
-            res_list_no_ws = []  # Initialize results
-            for i in range(self.n_simulation):
+        # Create example instance
+        instance = self.example()
+        qp = instance.qp_problem
+        x0 = np.copy(instance.x0)
 
-                # Solve problem
-                m = osqp.OSQP()
-                m.setup(qp['P'], qp['q'], qp['A'], qp['l'], qp['u'],
-                        **self.osqp_settings)
-                r = m.solve()
+        # Initialize states and inputs for the whole simulation
+        X_no_ws = np.zeros((instance.nx, self.n_simulation + 1))
+        U_no_ws = np.zeros((instance.nu, self.n_simulation))
+        X_no_ws[:, 0] = x0
 
-                solution_dict = {'status': [r.info.status],
-                                 'run_time': [r.info.run_time],
-                                 'iter': [r.info.iter]}
+        recorder = SolveRecorder(self.n_simulation)  # Initialize results
+        sweep = ParametricSweep.from_problem(qp, self.n_simulation)
+        for i in range(self.n_simulation):
 
-                if r.info.status != "solved":
-                    print("OSQP no warmstart did not solve the problem")
+            # Solve problem
+            m = osqp.OSQP()
+            m.setup(qp['P'], qp['q'], qp['A'], qp['l'], qp['u'],
+                    **self.osqp_settings)
+            r = m.solve()
 
-                res_list_no_ws.append(pd.DataFrame(solution_dict))
+            if r.info.status != "solved":
+                print("OSQP no warmstart did not solve the problem")
 
-                # Get input
-                U_no_ws[:, i] = r.x[instance.nx * (instance.T + 1):
-                                    instance.nx * (instance.T + 1)+instance.nu]
+            recorder.add(r.info)
+            sweep.add(r.x, r.y, qp['q'], qp['l'], qp['u'])
 
-                # Propagate state
-                X_no_ws[:, i + 1] = instance.A.dot(X_no_ws[:, i]) + \
-                    instance.B.dot(U_no_ws[:, i])
+            # Get input
+            U_no_ws[:, i] = r.x[instance.nx * (instance.T + 1):
+                                instance.nx * (instance.T + 1)+instance.nu]
 
-                # Update initial state
-                instance.update_x0(X_no_ws[:, i + 1])
+            # Propagate state
+            X_no_ws[:, i + 1] = instance.A.dot(X_no_ws[:, i]) + \
+                instance.B.dot(U_no_ws[:, i])
 
-            # Get full warm-start
-            res_no_ws = pd.concat(res_list_no_ws)
+            # Update initial state
+            instance.update_x0(X_no_ws[:, i + 1])
 
-            # Store file
-            res_no_ws.to_csv(n_file_name, index=False)
+        # Store file with the KKT check of all the solutions at once
+        recorder.save(n_file_name, sweep)
 
-            # Plot results
-            # import matplotlib.pylab as plt
-            # plt.figure(1)
-            # plt.plot(X_no_ws.T)
-            # plt.title("No Warm Start")
-            # plt.show(block=False)
+        # Plot results
+        # import matplotlib.pylab as plt
+        # plt.figure(1)
+        # plt.plot(X_no_ws.T)
+        # plt.title("No Warm Start")
+        # plt.show(block=False)
 
-        '''
+    def solve_ws(self):
+        """
         Solve problem with warm start
-        '''
-        # Solution directory
-        ws_path = os.path.join('.', 'results', 'parametric_problems',
-                               'OSQP warmstart',
-                               'MPC',
-                               )
+        """
+
+        # Check if solution already exists
+        n_file_name = self.results_file(True)
+        if os.path.isfile(n_file_name):
+            return
 
         # Create directory for the results
-        make_sure_path_exists(ws_path)
+        make_sure_path_exists(os.path.dirname(n_file_name))
 
-        # Check if solution already exists
-        n_file_name = os.path.join(ws_path, 'n%i.csv' % self.dimension)
+        # Create example instance
+        instance = self.example()
+        qp = instance.qp_problem
+        x0 = np.copy(instance.x0)
 
-        # Set initial state as x0
-        instance.update_x0(x0)
-        
-        if not os.path.isfile(n_file_name):
-            # Setup solver
-            m = osqp.OSQP()
-            m.setup(qp['P'], qp['q'], qp['A'], qp['l'], qp['u'],
-                    **self.osqp_settings)
+        # Setup solver
+        m = osqp.OSQP()
+        m.setup(qp['P'], qp['q'], qp['A'], qp['l'], qp['u'],
+                **self.osqp_settings)
+
+        # Initialize states and inputs for the whole simulation
+        X_ws = np.zeros((instance.nx, self.n_simulation + 1))
+        U_ws = np.zeros((instance.nu, self.n_simulation))
+        X_ws[:, 0] = x0
+
+        recorder = SolveRecorder(self.n_simulation)  # Initialize results
+        sweep = ParametricSweep.from_problem(qp, self.n_simulation)
+        for i in range(self.n_simulation):
+
+            # Solve problem
+            r = m.solve()
+
+            if r.info.status != "solved":
+                print("OSQP no warmstart did not solve the problem")
+
+            recorder.add(r.info)
+            sweep.add(r.x, r.y, qp['q'], qp['l'], qp['u'])
+
+            # Get input
+            U_ws[:, i] = r.x[instance.nx * (instance.T + 1):
+                             instance.nx * (instance.T + 1)+instance.nu]
+
+            # Propagate state
+            X_ws[:, i + 1] = instance.A.dot(X_ws[:, i]) + \
+                instance.B.dot(U_ws[:, i])
+
+            # Update initial state
+            instance.update_x0(X_ws[:, i + 1])
+
+            # Update solver
+            m.update(l=instance.qp_problem['l'],
+                     u=instance.qp_problem['u'])
+
+        # Store file with the KKT check of all the solutions at once
+        recorder.save(n_file_name, sweep)
+
+        # # Plot results
+        # import matplotlib.pylab as plt
+        # plt.figure(3)
+        # plt.plot(X_ws.T)
+        # plt.title("X Warm Start")
+        # plt.show(block=False)
+        #
+        # plt.figure(4)
+        # plt.plot(U_ws.T)
+        # plt.title("U Warm Start")
+        # plt.show()
+
+    def solve_latency(self, n_simulation=10000, noise=0.01, core=None,
+                      disable_gc=True):
+        """
+        Real-time benchmark of the warm-started MPC loop
 
-            # Initialize states and inputs for the whole simulation
-            X_ws = np.zeros((instance.nx, self.n_simulation + 1))
-            U_ws = np.zeros((instance.nu, self.n_simulation))
-            X_ws[:, 0] = x0
+        The closed loop runs for n_simulation steps pinned to a single
+        core and (optionally) without garbage collection. The state is
+        perturbed by a random disturbance at every step so that the
+        problems do not become trivial once the state is regulated.
+        Every step records the wall-clock latency of the whole control
+        step (update and solve) together with the OSQP info.
 
-            res_list_ws = []  # Initialize results
-            for i in range(self.n_simulation):
+        Args:
+            n_simulation: number of steps of the simulation
+            noise: standard deviation of the state disturbance
+            core: core to pin the process to (default the last one)
+            disable_gc: disable the garbage collector during the loop
+        """
 
-                # Solve problem
-                r = m.solve()
+        # Check if solution already exists
+        n_file_name = latency_results_file(self.name(), self.dimension)
+        if os.path.isfile(n_file_name):
+            return
 
-                if r.info.status != "solved":
-                    print("OSQP no warmstart did not solve the problem")
+        print("Solve MPC problem for dimension %i in latency mode" %
+              self.dimension)
 
-                # Get results
-                solution_dict = {'status': [r.info.status],
-                                 'run_time': [r.info.run_time],
-                                 'iter': [r.info.iter]}
+        # Create directory for the results
+        make_sure_path_exists(os.path.dirname(n_file_name))
 
-                res_list_ws.append(pd.DataFrame(solution_dict))
+        # Create example instance and random disturbances (stream derived
+        # from the seed, independent of the one generating the dynamics)
+        instance = self.example()
+        qp = instance.qp_problem
+        rng = np.random.RandomState([self.seed, 1])
+        W = noise * rng.randn(instance.nx, n_simulation)
+        x_min = .5 * instance.xmin
+        x_max = .5 * instance.xmax
+        n_u = instance.nx * (instance.T + 1)
+
+        # Setup solver
+        m = osqp.OSQP()
+        m.setup(qp['P'], qp['q'], qp['A'], qp['l'], qp['u'],
+                **self.osqp_settings)
+
+        x = np.copy(instance.x0)
+        latency = np.empty(n_simulation)
+        recorder = SolveRecorder(n_simulation)
+        with realtime_process(core=core, disable_gc=disable_gc):
+            for i in range(n_simulation):
+                start = time.perf_counter()
+
+                # Update solver and solve problem
+                m.update(l=qp['l'], u=qp['u'])
+                r = m.solve()
 
-                # Get input
-                U_ws[:, i] = r.x[instance.nx * (instance.T + 1):
-                                 instance.nx * (instance.T + 1)+instance.nu]
+                latency[i] = time.perf_counter() - start
+                recorder.add(r.info)
 
-                # Propagate state
-                X_ws[:, i + 1] = instance.A.dot(X_ws[:, i]) + \
-                    instance.B.dot(U_ws[:, i])
+                # Propagate state with disturbance
+                u = r.x[n_u:n_u + instance.nu]
+                x = instance.A.dot(x) + instance.B.dot(u) + W[:, i]
+                np.clip(x, x_min, x_max, out=x)
 
                 # Update initial state
-                instance.update_x0(X_ws[:, i + 1])
-
-                # Update solver
-                m.update(l=instance.qp_problem['l'],
-                         u=instance.qp_problem['u'])
-
-            # Get full warm-start
-            res_ws = pd.concat(res_list_ws)
-
-            # Store file
-            res_ws.to_csv(n_file_name, index=False)
-
-            # # Plot results
-            # import matplotlib.pylab as plt
-            # plt.figure(3)
-            # plt.plot(X_ws.T)
-            # plt.title("X Warm Start")
-            # plt.show(block=False)
-            #
-            # plt.figure(4)
-            # plt.plot(U_ws.T)
-            # plt.title("U Warm Start")
-            # plt.show()
+                instance.update_x0(x)
+
+        # Store file
+        df = recorder.frame()
+        df.insert(1, 'latency', latency)
+        df.to_csv(n_file_name, index=False)
@@ -0,0 +1,190 @@
+"""
+Closed-loop simulation of many MPC scenarios on the same plant
+"""
+import os
+import time
+import numpy as np
+import pandas as pd
+from multiprocessing import cpu_count
+from problem_classes.control import ControlExample
+from utils.general import make_sure_path_exists
+from utils.parametric import SolveRecorder
+from utils.scheduler import run_tasks
+# import osqppurepy as osqp
+import osqp
+
+
+def scenarios_results_file(dimension):
+    """
+    File with the solves of all the scenarios of the MPC problem
+
+        ./results/parametric_problems/scenarios/MPC/n{dim}.csv
+    """
+    return os.path.join('.', 'results', 'parametric_problems', 'scenarios',
+                        'MPC', 'n%i.csv' % dimension)
+
+
+def scenario_data(instance, scenario, n_simulation, noise, seed):
+    """
+    Initial state and disturbance sequence of a scenario. They depend only
+    on the seed and on the scenario number (not on the shard).
+    """
+    rng = np.random.RandomState([seed, scenario])
+    x_min = .5 * instance.xmin
+    x_max = .5 * instance.xmax
+    x0 = x_min + rng.rand(instance.nx) * (x_max - x_min)
+    W = noise * rng.randn(instance.nx, n_simulation)
+    return x0, W
+
+
+def solve_scenarios_shard(osqp_settings, dimension, scenarios,
+                          n_simulation, noise, seed):
+    """
+    Simulate a shard of scenarios in a single worker
+
+    All the scenarios share the same factorized OSQP workspace: only the
+    bounds change between solves and every solve is warm started from the
+    previous solution of its own scenario. The scenarios advance in
+    lockstep so that the state propagation A x + B u is computed for all
+    of them at once.
+
+    Returns:
+        (results, wall_time) where results is a dataframe with the OSQP
+        info of every solve and wall_time is the time of the simulation
+    """
+    instance = ControlExample(dimension, seed=seed)
+    qp = instance.qp_problem
+    n_scenarios = len(scenarios)
+    n_u = instance.nx * (instance.T + 1)
+    x_min = .5 * instance.xmin[:, None]
+    x_max = .5 * instance.xmax[:, None]
+
+    # States (one column per scenario) and disturbances
+    X = np.empty((instance.nx, n_scenarios))
+    W = np.empty((instance.nx, n_scenarios, n_simulation))
+    for j, scenario in enumerate(scenarios):
+        X[:, j], W[:, j, :] = scenario_data(instance, scenario,
+                                            n_simulation, noise, seed)
+    U = np.empty((instance.nu, n_scenarios))
+
+    # Last solution of each scenario (zero for the first solve)
+    x_prev = np.zeros((n_scenarios, qp['n']))
+    y_prev = np.zeros((n_scenarios, qp['m']))
+
+    # Setup solver once for all the scenarios
+    m = osqp.OSQP()
+    m.setup(qp['P'], qp['q'], qp['A'], qp['l'], qp['u'],
+            **osqp_settings)
+
+    recorder = SolveRecorder(n_scenarios * n_simulation)
+    start = time.perf_counter()
+    for i in range(n_simulation):
+        for j in range(n_scenarios):
+
+            # Update initial state and warm start of the scenario
+            instance.update_x0(X[:, j])
+            m.update(l=qp['l'], u=qp['u'])
+            m.warm_start(x=x_prev[j], y=y_prev[j])
+
+            # Solve problem
+            r = m.solve()
+            recorder.add(r.info)
+            x_prev[j] = r.x
+            y_prev[j] = r.y
+
+            # Get input
+            U[:, j] = r.x[n_u:n_u + instance.nu]
+
+        # Propagate the states of all the scenarios
+        X = instance.A.dot(X) + instance.B.dot(U) + W[:, :, i]
+        np.clip(X, x_min, x_max, out=X)
+    wall_time = time.perf_counter() - start
+
+    df = recorder.frame()
+    df.insert(0, 'scenario', np.tile(scenarios, n_simulation))
+    df.insert(1, 'step', np.repeat(np.arange(n_simulation), n_scenarios))
+    return df, wall_time
+
+
+class MPCScenarios(object):
+    def __init__(self,
+                 osqp_settings,
+                 dimension,
+                 n_scenarios=1000,
+                 n_simulation=100,
+                 noise=0.01,
+                 seed=1):
+        """
+        Generate MPC scenarios on the same plant
+
+        Args:
+            osqp_settings: osqp solver settings
+            dimension: leading dimension for the problem
+            n_scenarios: number of closed-loop trajectories
+            n_simulation: number of MPC problems of every trajectory
+            noise: standard deviation of the state disturbances
+            seed: random seed of the plant and of the scenarios
+        """
+        self.osqp_settings = osqp_settings
+        self.dimension = dimension
+        self.n_scenarios = n_scenarios
+        self.n_simulation = n_simulation
+        self.noise = noise
+        self.seed = seed
+
+    def solve(self, parallel=True, cores=None):
+        """
+        Simulate all the scenarios
+
+        The scenarios are split in one shard per worker. Every worker
+        generates the plant from the seed and sets up OSQP once.
+
+        Returns:
+            dictionary with the throughput of the simulation
+                - 'solves_per_second': solves over the elapsed time of
+                  the whole simulation (process startup included)
+                - 'worker_solves_per_second': mean throughput of a worker
+        """
+        print("Simulate %i MPC scenarios for dimension %i" %
+              (self.n_scenarios, self.dimension))
+
+        if cores is None:
+            cores = cpu_count()
+        n_shards = min(cores, self.n_scenarios) if parallel else 1
+
+        shards = np.array_split(np.arange(self.n_scenarios), n_shards)
+        tasks = [(self.osqp_settings, self.dimension, shard,
+                  self.n_simulation, self.noise, self.seed)
+                 for shard in shards]
+
+        start = time.perf_counter()
+        results = [None] * n_shards
+        for index, result in run_tasks(solve_scenarios_shard, tasks,
+                                       costs=[len(s) for s in shards],
+                                       parallel=parallel, cores=cores):
+            results[index] = result
+        elapsed = time.perf_counter() - start
+
+        # Store file
+        n_file_name = scenarios_results_file(self.dimension)
+        make_sure_path_exists(os.path.dirname(n_file_name))
+        df = pd.concat([df_shard for (df_shard, _) in results])
+        df = df.sort_values(['scenario', 'step'], kind='stable')
+        df.to_csv(n_file_name, index=False)
+
+        n_solves = len(df)
+        stats = {'dimension': self.dimension,
+                 'scenarios': self.n_scenarios,
+                 'solves': n_solves,
+                 'workers': n_shards,
+                 'elapsed_time': elapsed,
+                 'solves_per_second': n_solves / elapsed,
+                 'worker_solves_per_second': np.mean(
+                     [len(df_shard) / wall_time
+                      for (df_shard, wall_time) in results]),
+                 'mean_iter': df['iter'].mean(),
+                 'solved': (df['status'] == 'solved').mean()}
+        print(" - %.0f solves/second (%.0f per worker)" %
+              (stats['solves_per_second'],
+               stats['worker_solves_per_second']))
+        return stats
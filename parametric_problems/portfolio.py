@@ -4,7 +4,8 @@ Solve Portoflio problem for one year simulation
 import os
 import numpy as np
 from utils.general import make_sure_path_exists
-import pandas as pd
+from utils.parametric import ParametricSweep, SolveRecorder, \
+    parametric_results_file
 from problem_classes.portfolio import PortfolioExample
 # import osqppurepy as osqp
 import osqp
@@ -16,7 +17,8 @@ class PortfolioParametric(object):
                  n_factors=100,
                  n_assets=3000,
                  n_months_per_risk_model_update=3,
-                 n_years=4):
+                 n_years=4,
+                 seed=1):
         """
         Generate Portfolio problem as parametric QP
 
@@ -27,6 +29,7 @@ class PortfolioParametric(object):
             n_months_per_risk_model_update: number of months for every risk
                                             model update
             n_years: number of years to run the simulation
+            seed: random seed of the problem data and of the updates
         """
         self.osqp_settings = osqp_settings
         self.n_factors = n_factors
@@ -36,180 +39,205 @@ class PortfolioParametric(object):
             n_months_per_risk_model_update
         self.n_problems = n_years * 240
         self.alpha = 0.1  # Relaxation parameter between new data nad old ones
+        self.seed = seed
 
-    def solve(self):
+    @staticmethod
+    def name():
+        return 'Portfolio'
+
+    def example(self):
+        """
+        Generate the Portfolio instance (the same in every pass)
+        """
+        return PortfolioExample(self.n_factors, seed=self.seed,
+                                n=self.n_assets)
+
+    def estimated_nnz(self):
+        """
+        Expected number of nonzeros of P and A of the instance computed
+        from its dimensions (without generating it)
+        """
+        k, n = self.n_factors, self.n_assets
+        nnz_P = n + k                         # D and I
+        nnz_A = n + .5 * n * k + k + n        # Budget, F', -I and bounds
+        return int(nnz_P + nnz_A)
+
+    def results_file(self, warm_start):
+        return parametric_results_file(self.name(), self.n_factors,
+                                       warm_start)
+
+    def solve(self, warm_start=None):
         """
         Solve Portfolio problem
+
+        Args:
+            warm_start: solve only the pass with (True) or without (False)
+                        warm start (default both)
         """
 
         print("Solve Portfolio problem for dimension %i" % self.n_factors)
 
-        # Create example instance
-        instance = PortfolioExample(self.n_factors, n=self.n_assets)
+        if warm_start is None or not warm_start:
+            self.solve_no_ws()
+        if warm_start is None or warm_start:
+            self.solve_ws()
 
-        # Store number of nonzeros in F and D for updates
-        nnzF = instance.F.nnz
-        
-        # Store alpha
+    def update_model(self, instance, i, rng):
+        """
+        Update the model after the i-th problem. The risk model (F, D) is
+        updated every n_qp_per_update problems, mu at every problem.
+
+        The updates are drawn from rng so that both passes solve the same
+        sequence of problems.
+
+        Returns:
+            True if the risk model was updated
+        """
         alpha = self.alpha
 
-        '''
+        # Update model
+        current_mu = instance.mu
+        current_F_data = instance.F.data
+        current_D_data = instance.D.data
+
+        new_mu = alpha * rng.randn(instance.n) + (1 - alpha) * current_mu
+        if i % self.n_qp_per_update == 0:
+            #  print("Update everything: mu, F, D")
+            # Update everything
+            new_F = instance.F.copy()
+            new_F.data = alpha * rng.randn(instance.F.nnz) + \
+                (1 - alpha) * current_F_data
+            new_D = instance.D.copy()
+            new_D.data = alpha * rng.rand(instance.n) * \
+                np.sqrt(instance.k) + (1 - alpha) * current_D_data
+            instance.update_parameters(new_mu, new_F, new_D)
+            return True
+
+        #  print("Update only mu")
+        # Update only mu
+        instance.update_parameters(new_mu)
+        return False
+
+    def solve_no_ws(self):
+        """
         Solve problem without warm start
-        '''
+        """
         #  print("Solving without warm start")
 
-        # Solution directory
-        no_ws_path = os.path.join('.', 'results', 'parametric_problems',
-                                  'OSQP no warmstart',
-                                  'Portfolio',
-                                  )
+        # Check if solution already exists
+        n_file_name = self.results_file(False)
+        if os.path.isfile(n_file_name):
+            return
 
         # Create directory for the results
-        make_sure_path_exists(no_ws_path)
+        make_sure_path_exists(os.path.dirname(n_file_name))
 
-        # Check if solution already exists
-        n_file_name = os.path.join(no_ws_path, 'n%i.csv' % self.n_factors)
+        # Create example instance and random updates (stream derived from
+        # the seed, independent of the one generating the instance and the
+        # same in both passes)
+        instance = self.example()
+        rng = np.random.RandomState([self.seed, 1])
 
-        if not os.path.isfile(n_file_name):
+        recorder = SolveRecorder(self.n_problems)  # Initialize results
+        sweep = ParametricSweep.from_problem(instance.qp_problem,
+                                             self.n_problems)
+        for i in range(self.n_problems):
+            qp = instance.qp_problem
 
-            res_list_no_ws = []  # Initialize results
-            for i in range(self.n_problems):
-                qp = instance.qp_problem
+            # Solve problem
+            m = osqp.OSQP()
+            m.setup(qp['P'], qp['q'], qp['A'], qp['l'], qp['u'],
+                    **self.osqp_settings)
+            r = m.solve()
+
+            # DEBUG
+            #  print("niter = %d" % r.info.iter)
+
+            if r.info.status != "solved":
+                print("OSQP no warmstart did not solve the problem")
+
+            recorder.add(r.info)
+            sweep.add(r.x, r.y, qp['q'], qp['l'], qp['u'])
+
+            # Update model
+            if self.update_model(instance, i, rng):
+                sweep.set_matrices(instance.qp_problem['P'],
+                                   instance.qp_problem['A'])
 
-                # Solve problem
-                m = osqp.OSQP()
-                m.setup(qp['P'], qp['q'], qp['A'], qp['l'], qp['u'],
-                        **self.osqp_settings)
-                r = m.solve()
-
-                # DEBUG
-                #  print("niter = %d" % r.info.iter)
-
-                solution_dict = {'status': [r.info.status],
-                                 'run_time': [r.info.run_time],
-                                 'iter': [r.info.iter],
-                                 'obj_val': [r.info.obj_val]}
-
-                if r.info.status != "solved":
-                    print("OSQP no warmstart did not solve the problem")
-                    import ipdb; ipdb.set_trace()
-
-                res_list_no_ws.append(pd.DataFrame(solution_dict))
-
-                # Update model
-                current_mu = instance.mu
-                current_F_data = instance.F.data
-                current_D_data = instance.D.data
-
-                if i % self.n_qp_per_update == 0:
-                    #  print("Update everything: mu, F, D")
-                    # Update everything
-                    new_mu = alpha * np.random.randn(instance.n) + (1 - alpha) * current_mu
-                    new_F = instance.F.copy()
-                    new_F.data = alpha * np.random.randn(nnzF) + (1 - alpha) * current_F_data
-                    new_D = instance.D.copy()
-                    new_D.data = alpha * np.random.rand(instance.n) * \
-                        np.sqrt(instance.k) + (1 - alpha) * current_D_data
-                    instance.update_parameters(new_mu, new_F, new_D)
-                else:
-                    #  print("Update only mu")
-                    # Update only mu
-                    new_mu = alpha * np.random.randn(instance.n) + (1 - alpha) * current_mu
-                    instance.update_parameters(new_mu)
-
-            # Get full warm-start
-            res_no_ws = pd.concat(res_list_no_ws)
-
-            # Store file
-            res_no_ws.to_csv(n_file_name, index=False)
-
-            # Plot results
-            # import matplotlib.pylab as plt
-            # plt.figure(0)
-            # plt.plot(X_no_ws.T)
-            # plt.title("No Warm Start")
-            # plt.show(block=False)
-
-        '''
+        # Store file with the KKT check of all the solutions at once
+        recorder.save(n_file_name, sweep)
+
+        # Plot results
+        # import matplotlib.pylab as plt
+        # plt.figure(0)
+        # plt.plot(X_no_ws.T)
+        # plt.title("No Warm Start")
+        # plt.show(block=False)
+
+    def solve_ws(self):
+        """
         Solve problem with warm start
-        '''
+        """
         #  print("Solving with warm start")
 
-        # Solution directory
-        ws_path = os.path.join('.', 'results', 'parametric_problems',
-                               'OSQP warmstart',
-                               'Portfolio',
-                               )
+        # Check if solution already exists
+        n_file_name = self.results_file(True)
+        if os.path.isfile(n_file_name):
+            return
 
         # Create directory for the results
-        make_sure_path_exists(ws_path)
+        make_sure_path_exists(os.path.dirname(n_file_name))
 
-        # Check if solution already exists
-        n_file_name = os.path.join(ws_path, 'n%i.csv' % self.n_factors)
+        # Create example instance and random updates (stream derived from
+        # the seed, independent of the one generating the instance and the
+        # same in both passes)
+        instance = self.example()
+        rng = np.random.RandomState([self.seed, 1])
 
-        if not os.path.isfile(n_file_name):
-            # Setup solver
-            m = osqp.OSQP()
-            m.setup(qp['P'], qp['q'], qp['A'], qp['l'], qp['u'],
-                    **self.osqp_settings)
+        # Setup solver
+        qp = instance.qp_problem
+        m = osqp.OSQP()
+        m.setup(qp['P'], qp['q'], qp['A'], qp['l'], qp['u'],
+                **self.osqp_settings)
+
+        recorder = SolveRecorder(self.n_problems)  # Initialize results
+        sweep = ParametricSweep.from_problem(qp, self.n_problems)
+        for i in range(self.n_problems):
 
-            res_list_ws = []  # Initialize results
-            for i in range(self.n_problems):
-
-                # Solve problem
-                r = m.solve()
-
-                # DEBUG
-                #  print("niter = %d" % r.info.iter)
-
-                if r.info.status != "solved":
-                    print("OSQP warmstart did not solve the problem")
-
-                # Get results
-                solution_dict = {'status': [r.info.status],
-                                 'run_time': [r.info.run_time],
-                                 'iter': [r.info.iter],
-                                 'obj_val': [r.info.obj_val]}
-
-                res_list_ws.append(pd.DataFrame(solution_dict))
-
-                # Update model
-                current_mu = instance.mu
-                current_F_data = instance.F.data
-                current_D_data = instance.D.data
-
-                if i % self.n_qp_per_update == 0:
-                    #  print("Update everything: mu, F, D")
-                    # Update everything
-                    new_mu = alpha * np.random.randn(instance.n) + (1 - alpha) * current_mu
-                    new_F = instance.F.copy()
-                    new_F.data = alpha * np.random.randn(nnzF) + (1 - alpha) * current_F_data
-                    new_D = instance.D.copy()
-                    new_D.data = alpha * np.random.rand(instance.n) * \
-                        np.sqrt(instance.k) + (1 - alpha) * current_D_data
-                    instance.update_parameters(new_mu, new_F, new_D)
-                    # Update solver
-                    m.update(q=instance.qp_problem['q'],
-                             Px=instance.qp_problem['P'].data,
-                             Ax=instance.qp_problem['A'].data)
-                else:
-                    #  print("Update only mu")
-                    # Update only mu
-                    new_mu = alpha * np.random.randn(instance.n) + (1 - alpha) * current_mu
-                    instance.update_parameters(new_mu)
-
-                    # Update solver
-                    m.update(q=instance.qp_problem['q'])
-
-            # Get full warm-start
-            res_ws = pd.concat(res_list_ws)
-
-            # Store file
-            res_ws.to_csv(n_file_name, index=False)
-
-            # Plot results
-            # import matplotlib.pylab as plt
-            # plt.figure(1)
-            # plt.plot(X_ws.T)
-            # plt.title("Warm Start")
-            # plt.show(block=False)
+            # Solve problem
+            r = m.solve()
+
+            # DEBUG
+            #  print("niter = %d" % r.info.iter)
+
+            if r.info.status != "solved":
+                print("OSQP warmstart did not solve the problem")
+
+            recorder.add(r.info)
+            qp = instance.qp_problem
+            sweep.add(r.x, r.y, qp['q'], qp['l'], qp['u'])
+
+            # Update model
+            if self.update_model(instance, i, rng):
+                qp = instance.qp_problem
+                sweep.set_matrices(qp['P'], qp['A'])
+
+                # Update solver (only the entries of D and F)
+                m.update(q=qp['q'],
+                         Px=qp['P'].data[instance.P_D_idx],
+                         Px_idx=instance.P_D_idx,
+                         Ax=qp['A'].data[instance.A_F_idx],
+                         Ax_idx=instance.A_F_idx)
+            else:
+                # Update solver
+                m.update(q=instance.qp_problem['q'])
+
+        # Store file with the KKT check of all the solutions at once
+        recorder.save(n_file_name, sweep)
+
+        # Plot results
+        # import matplotlib.pylab as plt
+        # plt.figure(1)
+        # plt.plot(X_ws.T)
+        # plt.title("Warm Start")
+        # plt.show(block=False)
@@ -0,0 +1,86 @@
+'''
+Parallel runner of the parametric problems
+
+Every (problem, dimension, warm start) pass is a separate task. The passes
+with and without warm start of the same problem build their own instance
+from the same seed, so they solve the same sequence of QPs and can run
+in any order and in any process.
+'''
+import os
+from multiprocessing import cpu_count
+from parametric_problems.lasso import LassoParametric
+from parametric_problems.mpc import MPCParametric
+from parametric_problems.portfolio import PortfolioParametric
+from utils.scheduler import run_tasks
+
+PROBLEMS_MAP = {'Lasso': LassoParametric,
+                'MPC': MPCParametric,
+                'Portfolio': PortfolioParametric}
+
+
+def solve_parametric_pass(problem, dimension, warm_start, osqp_settings,
+                          seed):
+    '''
+    Solve a single pass of a parametric problem
+
+    Args:
+        problem: parametric problem name
+        dimension: leading dimension of the problem
+        warm_start: pass with or without warm start
+        osqp_settings: osqp solver settings
+        seed: random seed of the problem
+    '''
+    parametric = PROBLEMS_MAP[problem](osqp_settings, dimension, seed=seed)
+    parametric.solve(warm_start)
+
+
+def estimate_cost(parametric):
+    '''
+    Estimate the cost of a pass as the number of nonzeros of the problem
+    times the number of QPs solved (the problem is not generated)
+    '''
+    return parametric.estimated_nnz() * parametric.n_problems
+
+
+def solve_parametric_problems(problems, dimensions, osqp_settings,
+                              parallel=True, cores=None, seed=1):
+    '''
+    Solve all the passes of the parametric problems that do not have
+    results yet
+
+    The tasks are sorted by estimated cost so that the longest passes
+    start first and the whole study takes about as long as its longest
+    pass.
+
+    Args:
+        problems: list of parametric problem names
+        dimensions: dictionary of the dimensions of each problem
+        osqp_settings: osqp solver settings
+        parallel: solve the passes in parallel
+        cores: number of worker processes (default all the cores)
+        seed: random seed of the problems
+    '''
+    if cores is None:
+        cores = cpu_count()
+
+    tasks = []
+    costs = []
+    for problem in problems:
+        for dim in dimensions[problem]:
+            parametric = PROBLEMS_MAP[problem](osqp_settings, dim,
+                                               seed=seed)
+            missing = [warm_start for warm_start in [False, True]
+                       if not os.path.isfile(
+                           parametric.results_file(warm_start))]
+            if missing:
+                cost = estimate_cost(parametric)
+            for warm_start in missing:
+                tasks.append((problem, dim, warm_start, osqp_settings, seed))
+                costs.append(cost)
+
+    for index, _ in run_tasks(solve_parametric_pass, tasks, costs=costs,
+                              parallel=parallel, cores=cores):
+        (problem, dim, warm_start, _, _) = tasks[index]
+        print(" - Solved %s with dimension %i (%s)" %
+              (problem, dim,
+               'warm start' if warm_start else 'no warm start'))
@@ -2,12 +2,17 @@ import numpy as np
 import scipy.linalg as sla
 import scipy.sparse as spa
 import cvxpy
+from problem_classes.cvxpy_problem import CVXPYProblemMixin
+from utils.sparse import block_csc, block_diag_csc, random_csc, \
+    large_scale_density, LARGE_SCALE_ROW_NNZ
 
 
-class ControlExample(object):
+class ControlExample(CVXPYProblemMixin):
     '''
     Control QP example
     '''
+    CVXPY_OUTPUTS = ('problem', 'variables', 'param')
+
     def __init__(self, n, seed=1):
         '''
         Generate problem in QP format and CVXPY format
@@ -19,27 +24,7 @@ class ControlExample(object):
         self.nx = int(n)       # States
         self.nu = int(n / 2)   # Inputs
 
-        self.A = spa.eye(self.nx) + .1 * spa.random(self.nx, self.nx,
-                                                    density=1.0,
-                                                    data_rvs=np.random.randn)
-
-        # Restrict eigenvalues of A to be less than 1
-        lambda_values, V = np.linalg.eig(self.A.todense())
-        abs_lambda_values = np.abs(lambda_values)
-
-        # Enforce eigenvalues to be maximum norm 1
-        for i in range(len(lambda_values)):
-            lambda_values[i] = lambda_values[i] \
-                if abs_lambda_values[i] < 1 - 1e-02 else \
-                lambda_values[i] / (abs_lambda_values[i] + 1e-02)
-
-        # Reconstruct A = V * Lambda * V^{-1}
-        self.A = spa.csc_matrix(
-            V.dot(np.diag(lambda_values)).dot(np.linalg.inv(V)).real
-            )
-
-        self.B = spa.random(self.nx, self.nu, density=1.0,
-                            data_rvs=np.random.randn)
+        self.A, self.B = self._generate_dynamics()
 
         # Control penalty
         self.R = .1 * spa.eye(self.nu)
@@ -47,12 +32,7 @@ class ControlExample(object):
         # Choose only 70% of nonzero elements
         diagQ = np.multiply(np.random.rand(self.nx), ind07)
         self.Q = spa.diags(diagQ)
-        QN = sla.solve_discrete_are(self.A.todense(), self.B.todense(),
-                                    self.Q.todense(), self.R.todense())
-        self.QN = spa.csc_matrix(QN.dot(QN.T))
-
-        # self.QN = spa.csc_matrix(QN.dot(QN))  # Ensure symmetric PSD
-        # self.QN = 10 * self.Q
+        self.QN = self._terminal_cost()
 
         # Input ad state bounds
         self.umin = - 1.0 * np.random.rand(self.nu)
@@ -64,21 +44,56 @@ class ControlExample(object):
         self.x0 = np.random.rand(self.nx)
         min_x0 = .5 * self.xmin
         max_x0 = .5 * self.xmax
-        for i in range(self.nx):
-            self.x0[i] = min_x0[i] + \
-                self.x0[i] * (max_x0[i] - min_x0[i])
+        self.x0 = min_x0 + self.x0 * (max_x0 - min_x0)
 
         # Horizon length
         self.T = 10
 
         self.qp_problem = self._generate_qp_problem()
-        self.cvxpy_problem, self.cvxpy_variables, self.cvxpy_param = \
-            self._generate_cvxpy_problem()
 
     @staticmethod
     def name():
         return 'Control'
 
+    def _generate_dynamics(self):
+        '''
+        Random dynamics (A, B) with the eigenvalues of A inside the unit
+        circle
+        '''
+        A = spa.eye(self.nx) + .1 * spa.random(self.nx, self.nx,
+                                               density=1.0,
+                                               data_rvs=np.random.randn)
+
+        # Restrict eigenvalues of A to be less than 1
+        lambda_values, V = np.linalg.eig(A.todense())
+        abs_lambda_values = np.abs(lambda_values)
+
+        # Enforce eigenvalues to be maximum norm 1
+        for i in range(len(lambda_values)):
+            lambda_values[i] = lambda_values[i] \
+                if abs_lambda_values[i] < 1 - 1e-02 else \
+                lambda_values[i] / (abs_lambda_values[i] + 1e-02)
+
+        # Reconstruct A = V * Lambda * V^{-1}
+        A = spa.csc_matrix(
+            V.dot(np.diag(lambda_values)).dot(np.linalg.inv(V)).real
+            )
+
+        B = spa.random(self.nx, self.nu, density=1.0,
+                       data_rvs=np.random.randn)
+        return A, B
+
+    def _terminal_cost(self):
+        '''
+        Terminal cost from the solution of the discrete-time algebraic
+        Riccati equation
+        '''
+        QN = sla.solve_discrete_are(self.A.todense(), self.B.todense(),
+                                    self.Q.todense(), self.R.todense())
+        # return spa.csc_matrix(QN.dot(QN))  # Ensure symmetric PSD
+        # return 10 * self.Q
+        return spa.csc_matrix(QN.dot(QN.T))
+
     def _generate_qp_problem(self):
         '''
         Generate QP problem
@@ -90,7 +105,7 @@ class ControlExample(object):
         # Objective
         Px = spa.kron(spa.eye(self.T), self.Q)
         Pu = spa.kron(spa.eye(self.T), self.R)
-        P = 2. * spa.block_diag([Px, self.QN, Pu]).tocsc()
+        P = 2. * block_diag_csc([Px, self.QN, Pu])
         q = np.zeros((self.T + 1) * nx + self.T * nu)
 
         # Dynamics
@@ -99,12 +114,13 @@ class ControlExample(object):
         Au = spa.kron(spa.vstack([spa.csc_matrix((1, self.T)),
                                   spa.eye(self.T)]),
                       self.B)
-        A = spa.hstack([Ax, Au])
+        Ax = spa.csc_matrix(Ax)   # Converted once for A and A_nobounds
+        Au = spa.csc_matrix(Au)
         l = self._b(self.x0)
         u = self._b(self.x0)
 
         # Constraints without bounds
-        A_nobounds = A.copy()
+        A_nobounds = block_csc([[Ax, Au]])
         l_nobounds = np.copy(l)
         u_nobounds = np.copy(u)
 
@@ -115,24 +131,20 @@ class ControlExample(object):
         # State constraints
         l = np.append(l, np.tile(self.xmin, self.T + 1))
         u = np.append(u, np.tile(self.xmax, self.T + 1))
-        A = spa.vstack([A,
-                        spa.hstack([spa.eye((self.T + 1)*nx),
-                                    spa.csc_matrix(((self.T + 1)*nx,
-                                                    self.T * nu))])
-                        ]).tocsc()
         lx = np.append(lx, np.tile(self.xmin, self.T + 1))
         ux = np.append(ux, np.tile(self.xmax, self.T + 1))
 
         # Input constraints
         l = np.append(l, np.tile(self.umin, self.T))
         u = np.append(u, np.tile(self.umax, self.T))
-        A = spa.vstack([A,
-                        spa.hstack([spa.csc_matrix((self.T*nu, (self.T+1)*nx)),
-                                    spa.eye(self.T*nu)])
-                        ]).tocsc()
         lx = np.append(lx, np.tile(self.umin, self.T))
         ux = np.append(ux, np.tile(self.umax, self.T))
 
+        # Dynamics, state and input constraints
+        A = block_csc([[Ax, Au],
+                       [spa.eye((self.T + 1)*nx), None],
+                       [None, spa.eye(self.T*nu)]])
+
         # Get index of bounds (all variables)
         bounds_idx = np.arange(A.shape[1])
 
@@ -253,5 +265,63 @@ class ControlExample(object):
         self.qp_problem['l_nobounds'][:(self.T + 1) * self.nx] = b_new
         self.qp_problem['u_nobounds'][:(self.T + 1) * self.nx] = b_new
 
-        # Update parameter in CVXPY problem
-        self.cvxpy_param.value = self.x0
+        # Update parameter in CVXPY problem (if already generated)
+        if self._cvxpy is not None:
+            self.cvxpy_param.value = self.x0
+
+
+class ControlLargeExample(ControlExample):
+    '''
+    Control QP example for large dimensions
+
+    The dynamics and the terminal cost are sparse and are generated
+    without dense eigendecompositions or Riccati equations
+    '''
+    @staticmethod
+    def name():
+        return 'Control large'
+
+    def _generate_dynamics(self):
+        '''
+        Random sparse dynamics (A, B) with A = D + N where D is block
+        diagonal with damped 2 x 2 rotations and N couples each block only
+        with the following ones. A is block upper triangular so that its
+        eigenvalues are the ones of D, with modulus self.radius < 1.
+        '''
+        n_blocks = (self.nx + 1) // 2
+        block = np.arange(self.nx) // 2   # Block of every state
+
+        # Damped rotations r * [cos(t), -sin(t); sin(t), cos(t)]
+        r = .9 + .09 * np.random.rand(n_blocks)
+        theta = np.pi * np.random.rand(n_blocks)
+        c = (r * np.cos(theta))[block]
+        s = (r * np.sin(theta))[block]
+        even = np.arange(0, self.nx - 1, 2)   # First state of 2 x 2 blocks
+        if self.nx % 2:
+            c[-1] = r[-1]                     # Last block is 1 x 1
+        D = spa.diags(c) + \
+            spa.csc_matrix((np.concatenate([-s[even], s[even]]),
+                            (np.concatenate([even, even + 1]),
+                             np.concatenate([even + 1, even]))),
+                           shape=(self.nx, self.nx))
+        self.radius = r[block]
+
+        # Coupling with the following blocks only
+        N = random_csc(self.nx, self.nx,
+                       large_scale_density(self.nx, 1.0)).tocoo()
+        upper = block[N.col] > block[N.row]
+        N = spa.csc_matrix((.1 * N.data[upper] / np.sqrt(LARGE_SCALE_ROW_NNZ),
+                            (N.row[upper], N.col[upper])),
+                           shape=(self.nx, self.nx))
+
+        B = random_csc(self.nx, self.nu, large_scale_density(self.nu, 1.0))
+        return (D + N).tocsc(), B
+
+    def _terminal_cost(self):
+        '''
+        Diagonal terminal cost Q / (1 - r^2) where r is the modulus of the
+        eigenvalues of the block of each state (cost-to-go of the
+        uncoupled blocks without inputs)
+        '''
+        return spa.diags(self.Q.diagonal() / (1. - self.radius ** 2),
+                         format='csc')
@@ -0,0 +1,55 @@
+'''
+CVXPY problem of the problem classes generated on first access
+'''
+
+
+class CVXPYProblemMixin(object):
+    '''
+    CVXPY problem of a problem class generated only on first access
+    (only the solvers going through CVXPY need it)
+
+    The class defines _generate_cvxpy_problem returning the CVXPY problem
+    followed by the objects named in CVXPY_OUTPUTS after 'problem', e.g.
+
+        CVXPY_OUTPUTS = ('problem', 'variables', 'param')
+
+    exposed as cvxpy_problem, cvxpy_variables and cvxpy_param. The
+    outputs are kept in _cvxpy: setting it to None generates the problem
+    again at the next access.
+    '''
+    CVXPY_OUTPUTS = ('problem',)
+    _cvxpy = None
+
+    def _cvxpy_output(self, name):
+        '''
+        Output name of _generate_cvxpy_problem (generated if needed)
+        '''
+        if name not in self.CVXPY_OUTPUTS:
+            raise AttributeError('cvxpy_%s' % name)
+        if self._cvxpy is None:
+            outputs = self._generate_cvxpy_problem()
+            if len(self.CVXPY_OUTPUTS) == 1:
+                outputs = (outputs,)
+            self._cvxpy = outputs
+        return self._cvxpy[self.CVXPY_OUTPUTS.index(name)]
+
+    @property
+    def cvxpy_problem(self):
+        '''
+        CVXPY problem (generated only on first access)
+        '''
+        return self._cvxpy_output('problem')
+
+    @property
+    def cvxpy_variables(self):
+        '''
+        CVXPY problem variables
+        '''
+        return self._cvxpy_output('variables')
+
+    @property
+    def cvxpy_param(self):
+        '''
+        CVXPY problem parameter
+        '''
+        return self._cvxpy_output('param')
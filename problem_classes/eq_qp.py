@@ -1,9 +1,11 @@
 import numpy as np
 import scipy.sparse as spa
 import cvxpy
+from problem_classes.cvxpy_problem import CVXPYProblemMixin
+from utils.sparse import random_matrix, LargeScaleMixin
 
 
-class EqQPExample(object):
+class EqQPExample(CVXPYProblemMixin):
     '''
     Equality constrained QP example
     '''
@@ -19,25 +21,23 @@ class EqQPExample(object):
         # Generate problem data
         self.n = int(n)
         self.m = m
-        P = spa.random(n, n, density=0.15,
-                       data_rvs=np.random.randn,
-                       format='csc')
+        P = self._random_matrix(n, n, 0.15, format='csc')
         self.P = P.dot(P.T).tocsc() + 1e-02 * spa.eye(n)
         self.q = np.random.randn(n)
-        self.A = spa.random(m, n, density=0.15,
-                            data_rvs=np.random.randn,
-                            format='csc')
+        self.A = self._random_matrix(m, n, 0.15, format='csc')
         x_sol = np.random.randn(n)  # Create fictitious solution
         self.l = self.A@x_sol
         self.u = np.copy(self.l)
 
         self.qp_problem = self._generate_qp_problem()
-        self.cvxpy_problem = self._generate_cvxpy_problem()
 
     @staticmethod
     def name():
         return 'Eq QP'
 
+    # Random sparse data matrices
+    _random_matrix = staticmethod(random_matrix)
+
     def _generate_qp_problem(self):
         '''
         Generate QP problem
@@ -79,3 +79,12 @@ class EqQPExample(object):
         y = constraints[0].dual_value
 
         return x, y
+
+
+class EqQPLargeExample(LargeScaleMixin, EqQPExample):
+    '''
+    Equality constrained QP example for large dimensions (see LargeScaleMixin)
+    '''
+    @staticmethod
+    def name():
+        return 'Eq QP large'
@@ -1,12 +1,17 @@
 import numpy as np
 import scipy.sparse as spa
 import cvxpy
+from problem_classes.cvxpy_problem import CVXPYProblemMixin
+from utils.sparse import block_csc, block_diag_csc, \
+    random_matrix, LargeScaleMixin
 
 
-class HuberExample(object):
+class HuberExample(CVXPYProblemMixin):
     '''
     Huber QP example
     '''
+    CVXPY_OUTPUTS = ('problem', 'variables')
+
     def __init__(self, n, seed=1):
         '''
         Generate problem in QP format and CVXPY format
@@ -17,8 +22,7 @@ class HuberExample(object):
         self.n = int(n)               # Number of features
         self.m = int(self.n * 100)    # Number of data-points
 
-        self.Ad = spa.random(self.m, self.n, density=0.15,
-                             data_rvs=np.random.randn)
+        self.Ad = self._random_matrix(self.m, self.n, 0.15)
         self.x_true = np.random.randn(n) / np.sqrt(n)
         ind95 = (np.random.rand(self.m) < 0.95).astype(float)
         self.bd = self.Ad.dot(self.x_true) + \
@@ -26,13 +30,14 @@ class HuberExample(object):
             + np.multiply(10.*np.random.rand(self.m), 1. - ind95)
 
         self.qp_problem = self._generate_qp_problem()
-        self.cvxpy_problem, self.cvxpy_variables = \
-            self._generate_cvxpy_problem()
 
     @staticmethod
     def name():
         return 'Huber'
 
+    # Random sparse data matrices
+    _random_matrix = staticmethod(random_matrix)
+
     def _generate_qp_problem(self):
         '''
         Generate QP problem
@@ -46,17 +51,17 @@ class HuberExample(object):
         # https://doi.org/10.1109/34.877518
         # x_solver = (x, z, r, s)
         Im = spa.eye(self.m)
-        P = spa.block_diag((spa.csc_matrix((self.n, self.n)), Im,
-                            spa.csc_matrix((2*self.m, 2*self.m))), format='csc')
+        P = block_diag_csc([spa.csc_matrix((self.n, self.n)), Im,
+                            spa.csc_matrix((2*self.m, 2*self.m))])
         q = np.hstack([np.zeros(self.n + self.m), np.ones(2*self.m)])
-        A = spa.bmat([[self.Ad, -Im,   -Im,   Im],
-                      [None,     None,  Im,   None],
-                      [None,     None,  None, Im]], format='csc')
+        A = block_csc([[self.Ad, -Im,   -Im,   Im],
+                       [None,     None,  Im,   None],
+                       [None,     None,  None, Im]])
         l = np.hstack([self.bd, np.zeros(2*self.m)])
         u = np.hstack([self.bd, np.inf*np.ones(2*self.m)])
 
         # Constraints without bounds
-        A_nobounds = spa.hstack([self.Ad, -Im, -Im, Im], format='csc')
+        A_nobounds = block_csc([[self.Ad, -Im, -Im, Im]])
         l_nobounds = self.bd
         u_nobounds = self.bd
 
@@ -126,3 +131,12 @@ class HuberExample(object):
                             -constraints[2].dual_value))
 
         return x, y
+
+
+class HuberLargeExample(LargeScaleMixin, HuberExample):
+    '''
+    Huber QP example for large dimensions (see LargeScaleMixin)
+    '''
+    @staticmethod
+    def name():
+        return 'Huber large'
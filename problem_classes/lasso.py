@@ -1,12 +1,17 @@
 import numpy as np
 import scipy.sparse as spa
 import cvxpy
+from problem_classes.cvxpy_problem import CVXPYProblemMixin
+from utils.sparse import block_csc, block_diag_csc, \
+    random_matrix, LargeScaleMixin
 
 
-class LassoExample(object):
+class LassoExample(CVXPYProblemMixin):
     '''
     Lasso QP example
     '''
+    CVXPY_OUTPUTS = ('problem', 'variables', 'param')
+
     def __init__(self, n, seed=1):
         '''
         Generate problem in QP format and CVXPY format
@@ -17,8 +22,7 @@ class LassoExample(object):
         self.n = int(n)               # Number of features
         self.m = int(self.n * 100)    # Number of data-points
 
-        self.Ad = spa.random(self.m, self.n, density=0.15,
-                             data_rvs=np.random.randn)
+        self.Ad = self._random_matrix(self.m, self.n, 0.15)
         self.x_true = np.multiply((np.random.rand(self.n) >
                                    0.5).astype(float),
                                   np.random.randn(self.n)) / np.sqrt(self.n)
@@ -27,13 +31,14 @@ class LassoExample(object):
         self.lambda_param = (1./5.) * self.lambda_max
 
         self.qp_problem = self._generate_qp_problem()
-        self.cvxpy_problem, self.cvxpy_variables, self.cvxpy_param = \
-            self._generate_cvxpy_problem()
 
     @staticmethod
     def name():
         return 'Lasso'
 
+    # Random sparse data matrices
+    _random_matrix = staticmethod(random_matrix)
+
     def _generate_qp_problem(self):
         '''
         Generate QP problem
@@ -43,17 +48,15 @@ class LassoExample(object):
         #       minimize	y' * y + lambda * 1' * t
         #       subject to  y = Ax - b
         #                   -t <= x <= t
-        P = spa.block_diag((spa.csc_matrix((self.n, self.n)),
+        P = block_diag_csc([spa.csc_matrix((self.n, self.n)),
                             2*spa.eye(self.m),
-                            spa.csc_matrix((self.n, self.n))), format='csc')
+                            spa.csc_matrix((self.n, self.n))])
         q = np.append(np.zeros(self.m + self.n),
                       self.lambda_param * np.ones(self.n))
         In = spa.eye(self.n)
-        Onm = spa.csc_matrix((self.n, self.m))
-        A = spa.vstack([spa.hstack([self.Ad, -spa.eye(self.m),
-                                    spa.csc_matrix((self.m, self.n))]),
-                        spa.hstack([In, Onm, -In]),
-                        spa.hstack([In, Onm, In])]).tocsc()
+        A = block_csc([[self.Ad, -spa.eye(self.m), None],
+                       [In, None, -In],
+                       [In, None, In]])
         l = np.hstack([self.bd, -np.inf * np.ones(self.n), np.zeros(self.n)])
         u = np.hstack([self.bd, np.zeros(self.n), np.inf * np.ones(self.n)])
 
@@ -116,9 +119,18 @@ class LassoExample(object):
         # Update internal lambda parameter
         self.lambda_param = lambda_new
 
-        # Update q in QP problem
-        self.qp_problem['q'] = np.append(np.zeros(self.m + self.n),
-                                         self.lambda_param * np.ones(self.n))
+        # Update q in QP problem (in place)
+        self.qp_problem['q'][self.m + self.n:] = self.lambda_param
+
+        # Update parameter in CVXPY problem (if already generated)
+        if self._cvxpy is not None:
+            self.cvxpy_param.value = self.lambda_param
+
 
-        # Update parameter in CVXPY problem
-        self.cvxpy_param.value = self.lambda_param
+class LassoLargeExample(LargeScaleMixin, LassoExample):
+    '''
+    Lasso QP example for large dimensions (see LargeScaleMixin)
+    '''
+    @staticmethod
+    def name():
+        return 'Lasso large'
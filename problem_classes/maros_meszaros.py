@@ -1,7 +1,12 @@
+import os
 import numpy as np
 import scipy.sparse as spa
 import scipy.io as spio
 import cvxpy
+from utils.packed import pack_problems, open_packed
+
+# Packed binary store of the problems (see MarosMeszaros.pack)
+PACKED_FOLDER = os.path.join('.', 'cache', 'maros_meszaros')
 
 
 class MarosMeszaros(object):
@@ -25,20 +30,45 @@ class MarosMeszaros(object):
 
     @staticmethod
     def _load_maros_meszaros_problem(f):
+        mat_file = f if f.endswith('.mat') else f + '.mat'
+        name = os.path.basename(mat_file)[:-4]
+
+        # Load from the packed store if the problem is up to date there
+        packed = open_packed(PACKED_FOLDER)
+        if packed is not None and packed.is_current(name, mat_file):
+            m = packed.load(name)
+        else:
+            m = MarosMeszaros._read_mat_file(mat_file)
+
+        return m['P'], m['q'], m['r'], m['A'], m['l'], m['u'], m['n'], m['m']
+
+    @staticmethod
+    def _read_mat_file(f):
         # Load file
         m = spio.loadmat(f)
 
         # Convert matrices
-        P = m['P'].astype(float).tocsc()
-        q = m['q'].T.flatten().astype(float)
-        r = m['r'].T.flatten().astype(float)[0]
-        A = m['A'].astype(float).tocsc()
-        l = m['l'].T.flatten().astype(float)
-        u = m['u'].T.flatten().astype(float)
-        n = m['n'].T.flatten().astype(int)[0]
-        m = m['m'].T.flatten().astype(int)[0]
-
-        return P, q, r, A, l, u, n, m
+        return {'P': m['P'].astype(float).tocsc(),
+                'q': m['q'].T.flatten().astype(float),
+                'r': m['r'].T.flatten().astype(float)[0],
+                'A': m['A'].astype(float).tocsc(),
+                'l': m['l'].T.flatten().astype(float),
+                'u': m['u'].T.flatten().astype(float),
+                'n': m['n'].T.flatten().astype(int)[0],
+                'm': m['m'].T.flatten().astype(int)[0]}
+
+    @staticmethod
+    def pack(file_names):
+        '''
+        Convert the .mat files once into the packed store in PACKED_FOLDER.
+        The problems are then loaded from memory mapped arrays instead of
+        parsing their .mat files every time.
+
+        Args:
+            file_names: dictionary mapping problem names to .mat files
+        '''
+        pack_problems(PACKED_FOLDER, file_names,
+                      MarosMeszaros._read_mat_file)
 
     @staticmethod
     def name():
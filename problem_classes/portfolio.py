@@ -1,12 +1,17 @@
 import numpy as np
 import scipy.sparse as spa
 import cvxpy
+from problem_classes.cvxpy_problem import CVXPYProblemMixin
+from utils.sparse import block_csc, block_diag_csc, \
+    random_matrix, LargeScaleMixin
 
 
-class PortfolioExample(object):
+class PortfolioExample(CVXPYProblemMixin):
     '''
     Portfolio QP example
     '''
+    CVXPY_OUTPUTS = ('problem', 'param')
+
     def __init__(self, k, seed=1, n=None):
         '''
         Generate problem in QP format and CVXPY format
@@ -21,21 +26,21 @@ class PortfolioExample(object):
             self.n = int(n)
 
         # Generate data
-        self.F = spa.random(self.n, self.k, density=0.5,
-                            data_rvs=np.random.randn, format='csc')
+        self.F = self._random_matrix(self.n, self.k, 0.5, format='csc')
         self.D = spa.diags(np.random.rand(self.n) *
                            np.sqrt(self.k), format='csc')
         self.mu = np.random.randn(self.n)
         self.gamma = 1.0
 
         self.qp_problem = self._generate_qp_problem()
-        self.cvxpy_problem, self.cvxpy_param = \
-            self._generate_cvxpy_problem()
 
     @staticmethod
     def name():
         return 'Portfolio'
 
+    # Random sparse data matrices
+    _random_matrix = staticmethod(random_matrix)
+
     def _generate_qp_problem(self):
         '''
         Generate QP problem
@@ -46,23 +51,18 @@ class PortfolioExample(object):
         #       subject to  1' x = 1
         #                   F' x = y
         #                   0 <= x <= 1
-        P = spa.block_diag((2 * self.D, 2 * spa.eye(self.k)), format='csc')
+        P = block_diag_csc([2 * self.D, 2 * spa.eye(self.k)])
         q = np.append(- self.mu / self.gamma, np.zeros(self.k))
-        A = spa.vstack([
-                spa.hstack([spa.csc_matrix(np.ones((1, self.n))),
-                           spa.csc_matrix((1, self.k))]),
-                spa.hstack([self.F.T, -spa.eye(self.k)]),
-                spa.hstack((spa.eye(self.n), spa.csc_matrix((self.n, self.k))))
-            ]).tocsc()
+        ones = spa.csc_matrix((np.ones(self.n), np.zeros(self.n, dtype=int),
+                               np.arange(self.n + 1)), shape=(1, self.n))
+        blocks = [[ones, None],
+                  [spa.csc_matrix(self.F.T), -spa.eye(self.k, format='csc')]]
+        A = block_csc(blocks + [[spa.eye(self.n), None]])
         l = np.hstack([1., np.zeros(self.k), np.zeros(self.n)])
         u = np.hstack([1., np.zeros(self.k), np.ones(self.n)])
 
-        # Constraints without bounds
-        A_nobounds = spa.vstack([
-                spa.hstack([spa.csc_matrix(np.ones((1, self.n))),
-                            spa.csc_matrix((1, self.k))]),
-                spa.hstack([self.F.T, -spa.eye(self.k)]),
-                ]).tocsc()
+        # Constraints without bounds (same blocks without the last row)
+        A_nobounds = block_csc(blocks)
         l_nobounds = np.hstack([1., np.zeros(self.k)])
         u_nobounds = np.hstack([1., np.zeros(self.k)])
         bounds_idx = np.arange(self.n)
@@ -87,8 +87,44 @@ class PortfolioExample(object):
         problem['lx'] = lx
         problem['ux'] = ux
 
+        # Positions of the data of D and F in the data of P and A
+        self._data_index(problem)
+
         return problem
 
+    def _data_index(self, problem):
+        '''
+        Compute the positions of the entries of D and F (in CSC order) in
+        the data of the CSC matrices P, A and A_nobounds
+
+        The column i < n of A has the entry of the budget constraint,
+        the entries of the row i of F (sorted by factor) and, if A has the
+        bounds, the entry of the identity.
+        '''
+        # Column i < n of P has only the entry 2 * D[i, i]
+        self.P_D_idx = problem['P'].indptr[:self.n].copy()
+
+        # Asset and rank in the row of F of every entry of F
+        rows = self.F.indices
+        cols = np.repeat(np.arange(self.k), np.diff(self.F.indptr))
+        csr_order = np.lexsort((cols, rows))
+        rank = np.empty(self.F.nnz, dtype=np.int64)
+        rank[csr_order] = np.arange(self.F.nnz)
+        rank -= np.append(0, np.cumsum(np.bincount(rows,
+                                                   minlength=self.n)))[rows]
+
+        self.A_F_idx = problem['A'].indptr[rows] + 1 + rank
+        self.A_nobounds_F_idx = problem['A_nobounds'].indptr[rows] + 1 + rank
+
+        if not np.array_equal(problem['P'].data[self.P_D_idx],
+                              2 * self.D.data) or \
+                not np.array_equal(problem['A'].data[self.A_F_idx],
+                                   self.F.data) or \
+                not np.array_equal(
+                    problem['A_nobounds'].data[self.A_nobounds_F_idx],
+                    self.F.data):
+            raise ValueError("Unexpected structure of the portfolio QP")
+
     def _generate_cvxpy_problem(self):
         '''
         Generate QP problem
@@ -134,36 +170,54 @@ class PortfolioExample(object):
     def update_parameters(self, mu, F=None, D=None):
         """
         Update problem parameters with new mu, F, D
+
+        The new values of F and D are written in place into the data of
+        the matrices P and A of the QP problem (no matrix is rebuilt).
+        The updated entries are P.data[P_D_idx] and A.data[A_F_idx].
         """
 
         # Update internal parameters
         self.mu = mu
         if F is not None:
             if F.shape == self.F.shape and \
-                    all(F.indptr == self.F.indptr) and \
-                    all(F.indices == self.F.indices):
+                    np.array_equal(F.indptr, self.F.indptr) and \
+                    np.array_equal(F.indices, self.F.indices):
                 # Check if F has same sparsity pattern as self.D
                 self.F = F
             else:
                 raise ValueError("F sparsity pattern changed")
         if D is not None:
             if D.shape == self.D.shape and \
-                    all(D.indptr == self.D.indptr) and \
-                    all(D.indices == self.D.indices):
+                    np.array_equal(D.indptr, self.D.indptr) and \
+                    np.array_equal(D.indices, self.D.indices):
                 # Check if D has same sparsity pattern as self.D
                 self.D = D
             else:
                 raise ValueError("D sparsity pattern changed")
 
         # Update parameters in QP problem
+        self.qp_problem['q'] = np.append(- self.mu / self.gamma,
+                                         np.zeros(self.k))
+        if F is not None:
+            self.qp_problem['A'].data[self.A_F_idx] = self.F.data
+            self.qp_problem['A_nobounds'].data[self.A_nobounds_F_idx] = \
+                self.F.data
+        if D is not None:
+            self.qp_problem['P'].data[self.P_D_idx] = 2 * self.D.data
+
         if F is None and D is None:
-            # Update only q
-            self.qp_problem['q'] = np.append(- self.mu / self.gamma,
-                                             np.zeros(self.k))
-            # Update parameter in CVXPY problem
-            self.cvxpy_param.value = self.mu
+            # Update parameter in CVXPY problem (if already generated)
+            if self._cvxpy is not None:
+                self.cvxpy_param.value = self.mu
         else:
-            # Generate problem from scratch
-            self.qp_problem = self._generate_qp_problem()
-            self.cvxpy_problem, self.cvxpy_param = \
-                self._generate_cvxpy_problem()
+            # The CVXPY problem has F and D as constants
+            self._cvxpy = None
+
+
+class PortfolioLargeExample(LargeScaleMixin, PortfolioExample):
+    '''
+    Portfolio QP example for large dimensions (see LargeScaleMixin)
+    '''
+    @staticmethod
+    def name():
+        return 'Portfolio large'
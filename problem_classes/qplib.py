@@ -1,5 +1,4 @@
-import linecache
-import pandas as pd
+from itertools import islice, chain
 import numpy as np
 import scipy.sparse as spa
 import scipy.io as spio
@@ -25,289 +24,79 @@ class QPLIB(object):
             self.cvxpy_problem = self._generate_cvxpy_problem()
 
     def _load_qplib_problem(self, filename, verbose=False):
-        # minimize or maximize
-        head = 3                                    # 3
-        line = linecache.getline(filename, head)
-        if 'minimize' in line:
-            obj_type = 'min'
-        else:
-            obj_type = 'max'
-
-        # number of variables
-        head += 1                                   # 4
-        line = linecache.getline(filename, head)
-        parts = line.split(' ')
-        if 'variables\n' in parts:
-            n = int(parts[0])
-            if verbose:
-                print(line)
-        else:
-            raise ValueError("No number of variables recognized")
-
-        # number of constraints
-        head += 1                                   # 5
-        line = linecache.getline(filename, head)
-        parts = line.split(' ')
-        if 'constraints\n' in parts:
-            m = int(parts[0])
-            if verbose:
-                print(line)
-        else:
-            m = 0  # No constraints
-            head -= 1
-
-        # nnz in Ptriu
-        head += 1                                   # 6
-        line = linecache.getline(filename, head)
-        parts = line.split(' ')
-        if ('quadratic' in parts) and ('objective\n' in parts):
-            nnz_Ptriu = int(parts[0])
-            if verbose:
-                print(line)
-        else:
-            nnz_Ptriu = 0
-            head -= 1
+        # Read the file sequentially in a single pass
+        with open(filename, 'r') as f:
+            reader = QPLIBReader(f, verbose=verbose)
 
-        # Extract upper triangular part of P
-        head += 1                                   # 7
-        if (nnz_Ptriu > 0):
-            P_df = pd.read_csv(filename, sep=' ', skiprows=head-1, nrows=nnz_Ptriu, header=None)
-
-            # Replace the order of rows and columns since QPLIB stores P as a lower triangular matrix
-            P = spa.csc_matrix((P_df[2].values, (P_df[1].values-1, P_df[0].values-1)), shape=(n, n))
-            P = (P + spa.triu(P, 1).T).tocsc()
-        else:
-            P = spa.csc_matrix((n, n))
-
-        # Default value of q
-        head += nnz_Ptriu
-        line = linecache.getline(filename, head)
-        parts = line.split(' ')
-        q_dflt = float(parts[0])
-        if verbose:
-            print(line)
+            # Skip name and problem type
+            reader.next_line()
+            reader.next_line()
 
-        # Number of non-default values for q
-        head += 1
-        line = linecache.getline(filename, head)
-        parts = line.split(' ')
-        q_non_dflt_numel = int(parts[0])
-        if verbose:
-            print(line)
-
-        # Extract q
-        head += 1
-        q = q_dflt * np.ones(n)
-        if (q_non_dflt_numel > 0):
-            q_df = pd.read_csv(filename, sep=' ', skiprows=head-1, nrows=q_non_dflt_numel, header=None)
-            q[q_df[0] - 1] = q_df[1]
-
-        # Objective constant
-        head += q_non_dflt_numel
-        line = linecache.getline(filename, head)
-        parts = line.split(' ')
-        r = float(parts[0])
-        if verbose:
-            print(line)
-
-        # Extract constraints only if present
-        if m > 0:
-            # nnz in A
-            head += 1
-            line = linecache.getline(filename, head)
-            parts = line.split(' ')
-            nnz_A = int(parts[0])
-            if verbose:
-                print(line)
-
-            # Extract A
-            head += 1
-            if (nnz_A > 0):
-                A_df = pd.read_csv(filename, sep=' ', skiprows=head-1, nrows=nnz_A, header=None)
-                A = spa.csc_matrix((A_df[2].values, (A_df[0].values-1, A_df[1].values-1)), shape=(m, n))
+            # minimize or maximize
+            if 'minimize' in reader.next_line():
+                obj_type = 'min'
             else:
-                A = None
-        else:
-            head += 1
-            nnz_A = 0
-            A = spa.csc_matrix((0, n))
-
-        # Value for infinity
-        head += nnz_A
-        line = linecache.getline(filename, head)
-        parts = line.split(' ')
-        infty = float(parts[0])
-        if verbose:
-            print(line)
-
-        # Extract constraints if present
-        if m > 0:
-            # Default value of l
-            head += 1
-            line = linecache.getline(filename, head)
-            parts = line.split(' ')
-            l_dflt = float(parts[0])
-            if verbose:
-                print(line)
-
-            # Number of non-default values for l
-            head += 1
-            line = linecache.getline(filename, head)
-            parts = line.split(' ')
-            l_non_dflt_numel = int(parts[0])
-            if verbose:
-                print(line)
-
-            # Extract l
-            head += 1
-            l = l_dflt * np.ones(m)
-            if (l_non_dflt_numel > 0):
-                l_df = pd.read_csv(filename, sep=' ', skiprows=head-1, nrows=l_non_dflt_numel, header=None)
-                l[l_df[0] - 1] = l_df[1]
-
-            # Default values for u
-            head += l_non_dflt_numel
-            line = linecache.getline(filename, head)
-            parts = line.split(' ')
-            u_dflt = float(parts[0])
-            if verbose:
-                print(line)
-
-            # Number of non-default values for u
-            head += 1
-            line = linecache.getline(filename, head)
-            parts = line.split(' ')
-            u_non_dflt_numel = int(parts[0])
-            if verbose:
-                print(line)
-
-            # Extract u
-            head += 1
-            u = u_dflt * np.ones(m)
-            if (u_non_dflt_numel > 0):
-                u_df = pd.read_csv(filename, sep=' ', skiprows=head-1, nrows=u_non_dflt_numel, header=None)
-                u[u_df[0] - 1] = u_df[1]
-        else:
-            head += 1
-            l = np.array([])
-            u = np.array([])
-            u_non_dflt_numel = 0  # To continue processing
-
-        # Default value of lx
-        head += u_non_dflt_numel
-        line = linecache.getline(filename, head)
-        parts = line.split(' ')
-        lx_dflt = float(parts[0])
-        if verbose:
-            print(line)
-
-        # Number of non-default values for lx
-        head += 1
-        line = linecache.getline(filename, head)
-        parts = line.split(' ')
-        lx_non_dflt_numel = int(parts[0])
-        if verbose:
-            print(line)
-
-        # Extract lx
-        head += 1
-        lx = lx_dflt * np.ones(n)
-        if (lx_non_dflt_numel > 0):
-            lx_df = pd.read_csv(filename, sep=' ', skiprows=head-1, nrows=lx_non_dflt_numel, header=None)
-            lx[lx_df[0] - 1] = lx_df[1]
-
-        # Default value of ux
-        head += lx_non_dflt_numel
-        line = linecache.getline(filename, head)
-        parts = line.split(' ')
-        ux_dflt = float(parts[0])
-        if verbose:
-            print(line)
-
-        # Number of non-default values for ux
-        head += 1
-        line = linecache.getline(filename, head)
-        parts = line.split(' ')
-        ux_non_dflt_numel = int(parts[0])
-        if verbose:
-            print(line)
-
-        # Extract ux
-        head += 1
-        ux = ux_dflt * np.ones(n)
-        if (ux_non_dflt_numel > 0):
-            ux_df = pd.read_csv(filename, sep=' ', skiprows=head-1, nrows=ux_non_dflt_numel, header=None)
-            ux[ux_df[0] - 1] = ux_df[1]
+                obj_type = 'max'
+
+            # number of variables
+            n = reader.read_header('variables')
+            if n is None:
+                raise ValueError("No number of variables recognized")
+
+            # number of constraints
+            m = reader.read_header('constraints')
+            if m is None:
+                m = 0  # No constraints
+
+            # nnz in Ptriu
+            nnz_Ptriu = reader.read_header('objective', 'quadratic')
+            if nnz_Ptriu is None:
+                nnz_Ptriu = 0
+
+            # Extract upper triangular part of P
+            # NB. Replace the order of rows and columns since QPLIB stores
+            # P as a lower triangular matrix
+            if nnz_Ptriu > 0:
+                P_j, P_i, P_val = reader.read_entries(nnz_Ptriu, 2)
+                P = spa.csc_matrix((P_val, (P_i, P_j)), shape=(n, n))
+                P = (P + spa.triu(P, 1).T).tocsc()
+            else:
+                P = spa.csc_matrix((n, n))
 
+            # Extract q
+            q = reader.read_vector(n)
 
-        # Default value of x0
-        head += ux_non_dflt_numel
-        line = linecache.getline(filename, head)
-        parts = line.split(' ')
-        x0_dflt = float(parts[0])
-        if verbose:
-            print(line)
+            # Objective constant
+            r = reader.read_value(float)
 
-        # Number of non-default values for x0
-        head += 1
-        line = linecache.getline(filename, head)
-        parts = line.split(' ')
-        x0_non_dflt_numel = int(parts[0])
-        if verbose:
-            print(line)
+            # Extract constraints only if present
+            if m > 0:
+                # nnz in A
+                nnz_A = reader.read_value(int)
 
-        # Extract x0
-        head += 1
-        x0 = x0_dflt * np.ones(n)
-        if (x0_non_dflt_numel > 0):
-            x0_df = pd.read_csv(filename, sep=' ', skiprows=head-1, nrows=x0_non_dflt_numel, header=None)
-            x0[x0_df[0] - 1] = x0_df[1]
-
-        # Default value of y0
-        head += x0_non_dflt_numel
-        line = linecache.getline(filename, head)
-        parts = line.split(' ')
-        y0_dflt = float(parts[0])
-        if verbose:
-            print(line)
+                # Extract A
+                A_i, A_j, A_val = reader.read_entries(nnz_A, 2)
+                A = spa.csc_matrix((A_val, (A_i, A_j)), shape=(m, n))
+            else:
+                A = spa.csc_matrix((0, n))
 
-        # Number of non-default values for y0
-        head += 1
-        line = linecache.getline(filename, head)
-        parts = line.split(' ')
-        y0_non_dflt_numel = int(parts[0])
-        if verbose:
-            print(line)
+            # Value for infinity (not used)
+            reader.next_line()
 
-        # Extract y0
-        head += 1
-        y0 = y0_dflt * np.ones(m)
-        if (y0_non_dflt_numel > 0):
-            y0_df = pd.read_csv(filename, sep=' ', skiprows=head-1, nrows=y0_non_dflt_numel, header=None)
-            y0[y0_df[0] - 1] = y0_df[1]
-
-        # Default value of w0
-        head += y0_non_dflt_numel
-        line = linecache.getline(filename, head)
-        parts = line.split(' ')
-        w0_dflt = float(parts[0])
-        if verbose:
-            print(line)
+            # Extract constraints if present
+            if m > 0:
+                l = reader.read_vector(m)
+                u = reader.read_vector(m)
+            else:
+                l = np.array([])
+                u = np.array([])
 
-        # Number of non-default values for w0
-        head += 1
-        line = linecache.getline(filename, head)
-        parts = line.split(' ')
-        w0_non_dflt_numel = int(parts[0])
-        if verbose:
-            print(line)
+            # Extract variable bounds
+            lx = reader.read_vector(n)
+            ux = reader.read_vector(n)
 
-        # Extract w0
-        head += 1
-        w0 = w0_dflt * np.ones(n)
-        if (w0_non_dflt_numel > 0):
-            w0_df = pd.read_csv(filename, sep=' ', skiprows=head-1, nrows=w0_non_dflt_numel, header=None)
-            w0[w0_df[0] - 1] = w0_df[1]
+            # NB. The starting points x0, y0 and w0 that follow are not
+            # used and are not read
 
         # Assign final values to problem
         self.n = n
@@ -371,3 +160,88 @@ class QPLIB(object):
         y = constraints[0].dual_value - constraints[1].dual_value
 
         return x, y
+
+
+class QPLIBReader(object):
+    '''
+    Sequential reader of the sections of a .qplib file
+    '''
+    # Number of lines parsed at once when reading entries
+    chunk_size = 65536
+
+    def __init__(self, f, verbose=False):
+        self.f = f
+        self.verbose = verbose
+        self._line = None  # Line read ahead
+
+    def next_line(self):
+        if self._line is not None:
+            line, self._line = self._line, None
+        else:
+            line = self.f.readline()
+        if self.verbose:
+            print(line)
+        return line
+
+    def read_header(self, *keywords):
+        '''
+        Read integer value of an optional header line whose comment ends
+        with keywords[0] and contains all the other keywords. If the line
+        is not there, it is left for the next read and None is returned.
+        '''
+        if self._line is None:
+            self._line = self.f.readline()
+        words = self._line.split()
+        if words and words[-1] == keywords[0] and \
+                all(k in words for k in keywords[1:]):
+            return int(self.next_line().split()[0])
+        return None
+
+    def read_value(self, dtype):
+        '''
+        Read the value at the beginning of the next line
+        '''
+        return dtype(self.next_line().split()[0])
+
+    def read_entries(self, count, n_indices):
+        '''
+        Read count lines of n_indices 1-based indices followed by a value
+        into preallocated arrays
+
+        Returns:
+            n_indices 0-based index arrays and the array of values
+        '''
+        lines_iter = self.f if self._line is None \
+            else chain([self._line], self.f)
+        self._line = None
+
+        indices = [np.empty(count, dtype=np.int64)
+                   for _ in range(n_indices)]
+        values = np.empty(count)
+        start = 0
+        while start < count:
+            lines = list(islice(lines_iter, min(self.chunk_size,
+                                                count - start)))
+            if not lines:
+                raise ValueError("Unexpected end of file")
+            chunk = np.array(''.join(lines).split(), dtype=float)
+            chunk = chunk.reshape(len(lines), -1)
+            end = start + len(lines)
+            for k in range(n_indices):
+                indices[k][start:end] = chunk[:, k] - 1
+            values[start:end] = chunk[:, n_indices]
+            start = end
+        return indices + [values]
+
+    def read_vector(self, size):
+        '''
+        Read vector stored as default value, number of non-default values
+        and (index, value) entries
+        '''
+        default = self.read_value(float)
+        n_non_default = self.read_value(int)
+        v = np.full(size, default)
+        if n_non_default > 0:
+            idx, values = self.read_entries(n_non_default, 1)
+            v[idx] = values
+        return v
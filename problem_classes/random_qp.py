@@ -1,9 +1,11 @@
 import numpy as np
 import scipy.sparse as spa
 import cvxpy
+from problem_classes.cvxpy_problem import CVXPYProblemMixin
+from utils.sparse import random_matrix, LargeScaleMixin
 
 
-class RandomQPExample(object):
+class RandomQPExample(CVXPYProblemMixin):
     '''
     Random QP example
     '''
@@ -19,26 +21,24 @@ class RandomQPExample(object):
         # Generate problem data
         self.n = int(n)
         self.m = m
-        P = spa.random(n, n, density=0.15,
-                       data_rvs=np.random.randn,
-                       format='csc')
+        P = self._random_matrix(n, n, 0.15, format='csc')
         self.P = P.dot(P.T).tocsc() + 1e-02 * spa.eye(n)
         self.q = np.random.randn(n)
-        self.A = spa.random(m, n, density=0.15,
-                            data_rvs=np.random.randn,
-                            format='csc')
+        self.A = self._random_matrix(m, n, 0.15, format='csc')
         v = np.random.randn(n)   # Fictitious solution
         delta = np.random.rand(m)  # To get inequality
         self.u = self.A@v + delta
         self.l = - np.inf * np.ones(m)  # self.u - np.random.rand(m)
 
         self.qp_problem = self._generate_qp_problem()
-        self.cvxpy_problem = self._generate_cvxpy_problem()
 
     @staticmethod
     def name():
         return 'Random QP'
 
+    # Random sparse data matrices
+    _random_matrix = staticmethod(random_matrix)
+
     def _generate_qp_problem(self):
         '''
         Generate QP problem
@@ -80,3 +80,12 @@ class RandomQPExample(object):
         y = constraints[0].dual_value - constraints[1].dual_value
 
         return x, y
+
+
+class RandomQPLargeExample(LargeScaleMixin, RandomQPExample):
+    '''
+    Random QP example for large dimensions (see LargeScaleMixin)
+    '''
+    @staticmethod
+    def name():
+        return 'Random QP large'
@@ -2,13 +2,17 @@ import numpy as np
 import scipy.sparse as spa
 import scipy.io as spio
 import cvxpy
+from problem_classes.cvxpy_problem import CVXPYProblemMixin
 import tables
+from utils.sparse import augmented_csc_from_hdf5
 
 
-class SuitesparseHuber(object):
+class SuitesparseHuber(CVXPYProblemMixin):
     '''
     SuiteSparse Huber
     '''
+    CVXPY_OUTPUTS = ('problem', 'variables')
+
     def __init__(self, file_name):
         '''
         Suitesparse Matrix collection Ax = b huber problem.
@@ -19,24 +23,46 @@ class SuitesparseHuber(object):
 
         self.qp_problem = self._generate_qp_problem()
 
-        self.cvxpy_problem, self.cvxpy_variables = \
-            self._generate_cvxpy_problem()
 
     def _load_suitesparse_huber_data(self, file):
-        # Import with pytables
+        # Import with pytables. The matrix Ad is read directly into the
+        # constraint matrix of the QP problem
+        #       [Ad  -I  -I   I]
+        #       [0    0   I   0]
+        #       [0    0   0   I]
         with tables.open_file(file + '.mat') as f:
             self.bd = f.root['b'][:].flatten()
-            A_indices = f.root['A']['ir'][:]
-            A_pointers = f.root['A']['jc'][:]
-            A_data = f.root['A']['data'][:]
-            self.n = len(A_pointers) - 1
             self.m = len(self.bd)
-            self.Ad = spa.csc_matrix((A_data, A_indices, A_pointers), shape=(self.m, self.n))
+            self.n = int(np.prod(f.root['A']['jc'].shape)) - 1
+            self._A = augmented_csc_from_hdf5(
+                f.root['A'], self.m, 3 * self.m,
+                columns=[(self.m, [(0, -1.)]),
+                         (self.m, [(0, -1.), (self.m, 1.)]),
+                         (self.m, [(0, 1.), (2 * self.m, 1.)])])
+
+    @property
+    def Ad(self):
+        '''
+        Matrix Ad (extracted from the QP constraints at every access)
+        '''
+        return self.qp_problem['A'][:self.m, :self.n]
 
     @staticmethod
     def name():
         return 'Huber'
 
+    @staticmethod
+    def qp_dimensions(m, n, nnz):
+        '''
+        Dimensions of the QP problem of an m x n matrix A with nnz nonzero
+        elements (without generating it)
+
+        Returns:
+            (n, m, N) with the number of variables, of constraints and
+            nnz(P) + nnz(A)
+        '''
+        return n + 3 * m, 3 * m, m + (nnz + 5 * m)
+
     def _generate_qp_problem(self):
         '''
         Generate QP problem
@@ -53,14 +79,12 @@ class SuitesparseHuber(object):
         P = spa.block_diag((spa.csc_matrix((self.n, self.n)), Im,
                             spa.csc_matrix((2*self.m, 2*self.m))), format='csc')
         q = np.hstack([np.zeros(self.n + self.m), np.ones(2*self.m)])
-        A = spa.bmat([[self.Ad, -Im,   -Im,   Im],
-                      [None,     None,  Im,   None],
-                      [None,     None,  None, Im]], format='csc')
+        A = self._A
         l = np.hstack([self.bd, np.zeros(2*self.m)])
         u = np.hstack([self.bd, np.inf*np.ones(2*self.m)])
 
         # Constraints without bounds
-        A_nobounds = spa.hstack([self.Ad, -Im, -Im, Im], format='csc')
+        A_nobounds = A[:self.m, :]
         l_nobounds = self.bd
         u_nobounds = self.bd
 
@@ -2,13 +2,17 @@ import numpy as np
 import scipy.sparse as spa
 import scipy.io as spio
 import cvxpy
+from problem_classes.cvxpy_problem import CVXPYProblemMixin
 import tables
+from utils.sparse import augmented_csc_from_hdf5
 
 
-class SuitesparseLasso(object):
+class SuitesparseLasso(CVXPYProblemMixin):
     '''
     SuiteSparse Lasso
     '''
+    CVXPY_OUTPUTS = ('problem', 'variables', 'param')
+
     def __init__(self, file_name):
         '''
         Suitesparse Matrix collection Ax = b lasso problem.
@@ -19,28 +23,52 @@ class SuitesparseLasso(object):
 
         self.qp_problem = self._generate_qp_problem()
 
-        self.cvxpy_problem, self.cvxpy_variables, self.cvxpy_param = \
-            self._generate_cvxpy_problem()
 
     def _load_suitesparse_lasso_data(self, file):
-        # Import with pytables
+        # Import with pytables. The matrix Ad is read directly into the
+        # constraint matrix of the QP problem
+        #       [Ad  -I   0]
+        #       [I    0  -I]
+        #       [I    0   I]
         with tables.open_file(file + '.mat') as f:
             self.bd = f.root['b'][:].flatten()
-            A_indices = f.root['A']['ir'][:]
-            A_pointers = f.root['A']['jc'][:]
-            A_data = f.root['A']['data'][:]
-            self.n = len(A_pointers) - 1
             self.m = len(self.bd)
-            self.Ad = spa.csc_matrix((A_data, A_indices, A_pointers), shape=(self.m, self.n))
-
-        # Construct Lasso problem
-        self.lambda_max = np.linalg.norm(self.Ad.T.dot(self.bd), np.inf)
+            self.n = int(np.prod(f.root['A']['jc'].shape)) - 1
+            self._A = augmented_csc_from_hdf5(
+                f.root['A'], self.m, self.m + 2 * self.n,
+                below=[(self.m, 1.), (self.m + self.n, 1.)],
+                columns=[(self.m, [(0, -1.)]),
+                         (self.n, [(self.m, -1.), (self.m + self.n, 1.)])])
+
+        # Construct Lasso problem (Ad' * b from the columns of A)
+        b_padded = np.append(self.bd, np.zeros(2 * self.n))
+        self.lambda_max = np.linalg.norm(self._A.T.dot(b_padded)[:self.n],
+                                         np.inf)
         self.lambda_param = (1./5.) * self.lambda_max
 
+    @property
+    def Ad(self):
+        '''
+        Matrix Ad (extracted from the QP constraints at every access)
+        '''
+        return self.qp_problem['A'][:self.m, :self.n]
+
     @staticmethod
     def name():
         return 'Lasso'
 
+    @staticmethod
+    def qp_dimensions(m, n, nnz):
+        '''
+        Dimensions of the QP problem of an m x n matrix A with nnz nonzero
+        elements (without generating it)
+
+        Returns:
+            (n, m, N) with the number of variables, of constraints and
+            nnz(P) + nnz(A)
+        '''
+        return 2 * n + m, m + 2 * n, m + (nnz + m + 4 * n)
+
     def _generate_qp_problem(self):
         '''
         Generate QP problem
@@ -55,12 +83,7 @@ class SuitesparseLasso(object):
                             spa.csc_matrix((self.n, self.n))), format='csc')
         q = np.append(np.zeros(self.m + self.n),
                       self.lambda_param * np.ones(self.n))
-        In = spa.eye(self.n)
-        Onm = spa.csc_matrix((self.n, self.m))
-        A = spa.vstack([spa.hstack([self.Ad, -spa.eye(self.m),
-                                    spa.csc_matrix((self.m, self.n))]),
-                        spa.hstack([In, Onm, -In]),
-                        spa.hstack([In, Onm, In])]).tocsc()
+        A = self._A
         l = np.hstack([self.bd, -np.inf * np.ones(self.n), np.zeros(self.n)])
         u = np.hstack([self.bd, np.zeros(self.n), np.inf * np.ones(self.n)])
 
@@ -127,5 +150,6 @@ class SuitesparseLasso(object):
         self.qp_problem['q'] = np.append(np.zeros(self.m + self.n),
                                          self.lambda_param * np.ones(self.n))
 
-        # Update parameter in CVXPY problem
-        self.cvxpy_param.value = self.lambda_param
+        # Update parameter in CVXPY problem (if already generated)
+        if self._cvxpy is not None:
+            self.cvxpy_param.value = self.lambda_param
@@ -1,12 +1,17 @@
 import numpy as np
 import scipy.sparse as spa
 import cvxpy
+from problem_classes.cvxpy_problem import CVXPYProblemMixin
+from utils.sparse import block_csc, block_diag_csc, \
+    random_matrix, LargeScaleMixin
 
 
-class SVMExample(object):
+class SVMExample(CVXPYProblemMixin):
     '''
     SVM QP example
     '''
+    CVXPY_OUTPUTS = ('problem', 'variables')
+
     def __init__(self, n, seed=1):
         '''
         Generate problem in QP format and CVXPY format
@@ -21,23 +26,22 @@ class SVMExample(object):
         self.N = int(self.m / 2)
         self.gamma = 1.0
         self.b_svm = np.append(np.ones(self.N), -np.ones(self.N))
-        A_upp = spa.random(self.N, self.n, density=.15,
-                           data_rvs=np.random.randn)
-        A_low = spa.random(self.N, self.n, density=.15,
-                           data_rvs=np.random.randn)
+        A_upp = self._random_matrix(self.N, self.n, .15)
+        A_low = self._random_matrix(self.N, self.n, .15)
         self.A_svm = spa.vstack([
             A_upp / np.sqrt(self.n) + (A_upp != 0.).astype(float) / self.n,
             A_low / np.sqrt(self.n) - (A_low != 0.).astype(float) / self.n
             ]).tocsc()
 
         self.qp_problem = self._generate_qp_problem()
-        self.cvxpy_problem, self.cvxpy_variables = \
-            self._generate_cvxpy_problem()
 
     @staticmethod
     def name():
         return 'SVM'
 
+    # Random sparse data matrices
+    _random_matrix = staticmethod(random_matrix)
+
     def _generate_qp_problem(self):
         '''
         Generate QP problem
@@ -48,20 +52,17 @@ class SVMExample(object):
         #       subject to  t >= diag(b) A x + 1
         #                   t >= 0
 
-        P = spa.block_diag((spa.eye(self.n),
-                            spa.csc_matrix((self.m, self.m))), format='csc')
+        P = block_diag_csc([spa.eye(self.n),
+                            spa.csc_matrix((self.m, self.m))])
         q = np.append(np.zeros(self.n), (self.gamma/2) * np.ones(self.m))
-        A = spa.vstack([spa.hstack([spa.diags(self.b_svm).dot(self.A_svm),
-                                    -spa.eye(self.m)]),
-                        spa.hstack([spa.csc_matrix((self.m, self.n)),
-                                    spa.eye(self.m)])
-                        ]).tocsc()
+        bA = spa.diags(self.b_svm).dot(self.A_svm)
+        A = block_csc([[bA, -spa.eye(self.m)],
+                       [None, spa.eye(self.m)]])
         l = np.hstack([-np.inf*np.ones(self.m), np.zeros(self.m)])
         u = np.hstack([-np.ones(self.m), np.inf*np.ones(self.m)])
 
         # Constraints without bounds
-        A_nobounds = spa.hstack([spa.diags(self.b_svm).dot(self.A_svm),
-                                 -spa.eye(self.m)]).tocsc()
+        A_nobounds = block_csc([[bA, -spa.eye(self.m)]])
         l_nobounds = -np.inf*np.ones(self.m)
         u_nobounds = -np.ones(self.m)
         bounds_idx = np.arange(self.n, self.n + self.m)
@@ -123,3 +124,12 @@ class SVMExample(object):
                             -constraints[1].dual_value))
 
         return x, y
+
+
+class SVMLargeExample(LargeScaleMixin, SVMExample):
+    '''
+    SVM QP example for large dimensions (see LargeScaleMixin)
+    '''
+    @staticmethod
+    def name():
+        return 'SVM large'
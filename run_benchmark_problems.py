@@ -9,7 +9,7 @@ This code tests the solvers:
     - qpOASES
 
 '''
-from benchmark_problems.example import Example
+from benchmark_problems.example import Example, solve_examples
 import solvers.solvers as s
 from utils.general import gen_int_log_space
 from utils.benchmark import compute_stats_info
@@ -24,14 +24,26 @@ parser.add_argument('--verbose', help='Verbose solvers', default=False,
                     action='store_true')
 parser.add_argument('--parallel', help='Parallel solution', default=False,
                     action='store_true')
+parser.add_argument('--sandbox', help='Solve each problem in a separate process with memory and time limits',
+                    default=False, action='store_true')
+parser.add_argument('--large_scale', help='Large-scale problem generators with 10-100x larger dimensions',
+                    default=False, action='store_true')
+parser.add_argument('--trace_memory', help='Record the peak Python allocations of every solve with tracemalloc (slows down the solves)',
+                    default=False, action='store_true')
 args = parser.parse_args()
 high_accuracy = args.high_accuracy
 verbose = args.verbose
 parallel = args.parallel
+sandbox = args.sandbox
+large_scale = args.large_scale
+trace_memory = args.trace_memory
 
 print('high_accuracy', high_accuracy)
 print('verbose', verbose)
 print('parallel', parallel)
+print('sandbox', sandbox)
+print('large_scale', large_scale)
+print('trace_memory', trace_memory)
 
 
 
@@ -47,6 +59,12 @@ else:
     OUTPUT_FOLDER = 'benchmark_problems'
 
 
+# Only the sparse solvers on the large-scale problems
+if large_scale:
+    solvers = [solver for solver in solvers
+               if solver.split('_')[0] in ['OSQP', 'GUROBI', 'MOSEK']]
+    OUTPUT_FOLDER += '_large_scale'
+
 if verbose:
     for key in s.settings:
         s.settings[key]['verbose'] = True
@@ -76,29 +94,32 @@ problem_dimensions = {'Random QP': gen_int_log_space(10, 2000, n_dim),
                       'Huber': gen_int_log_space(10, 200, n_dim),
                       'Control': gen_int_log_space(10, 100, n_dim)}
 
-# Some problems become too big to be executed in parallel and we solve them
-# serially
-problem_parallel = {'Random QP': parallel,
-                    'Eq QP': parallel,
-                    'Portfolio': parallel,
-                    'Lasso': parallel,
-                    'SVM': parallel,
-                    'Huber': parallel,
-                    'Control': parallel}
+# Large-scale generators with dimensions beyond the ones above
+if large_scale:
+    problems = ['%s large' % problem for problem in problems]
+    problem_dimensions = {
+        'Random QP large': gen_int_log_space(2000, 50000, n_dim),
+        'Eq QP large': gen_int_log_space(2000, 50000, n_dim),
+        'Portfolio large': gen_int_log_space(150, 5000, n_dim),
+        'Lasso large': gen_int_log_space(200, 10000, n_dim),
+        'SVM large': gen_int_log_space(200, 10000, n_dim),
+        'Huber large': gen_int_log_space(200, 10000, n_dim),
+        'Control large': gen_int_log_space(100, 5000, n_dim)}
 
 # Small dimensions (to comment when running on the server)
 #  for key in problem_dimensions:
    #  problem_dimensions[key] = [4, 5]
 
-# Run all examples
-for problem in problems:
-    example = Example(problem,
-                      problem_dimensions[problem],
-                      solvers,
-                      s.settings,
-                      OUTPUT_FOLDER,
-                      n_instances)
-    example.solve(parallel=problem_parallel[problem])
+# Run all examples sharing the same task queue
+examples = [Example(problem,
+                    problem_dimensions[problem],
+                    solvers,
+                    s.settings,
+                    OUTPUT_FOLDER,
+                    n_instances,
+                    trace_memory=trace_memory)
+            for problem in problems]
+solve_examples(examples, parallel=parallel, sandbox=sandbox)
 
 # Compute results statistics
 compute_stats_info(solvers, OUTPUT_FOLDER,
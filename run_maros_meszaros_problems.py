@@ -21,14 +21,18 @@ parser.add_argument('--verbose', help='Verbose solvers', default=False,
                     action='store_true')
 parser.add_argument('--parallel', help='Parallel solution', default=False,
                     action='store_true')
+parser.add_argument('--trace_memory', help='Record the peak Python allocations of every solve with tracemalloc (slows down the solves)',
+                    default=False, action='store_true')
 args = parser.parse_args()
 high_accuracy = args.high_accuracy
 verbose = args.verbose
 parallel = args.parallel
+trace_memory = args.trace_memory
 
 print('high_accuracy', high_accuracy)
 print('verbose', verbose)
 print('parallel', parallel)
+print('trace_memory', trace_memory)
 
 # Add high accuracy solvers when accurazy
 if high_accuracy:
@@ -48,7 +52,8 @@ if verbose:
 # Run all examples
 maros_meszaros_runner = MarosMeszarosRunner(solvers,
                                             s.settings,
-                                            OUTPUT_FOLDER)
+                                            OUTPUT_FOLDER,
+                                            trace_memory=trace_memory)
 
 # DEBUG only: Choose only 2 problems
 # maros_meszaros_runner.problems = ["STADAT1", "BOYD1"]
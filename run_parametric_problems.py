@@ -6,14 +6,36 @@ This code compares OSQP with warm-start and factorization caching and without
 '''
 
 
-from parametric_problems.lasso import LassoParametric
+from parametric_problems.study import solve_parametric_problems
 from parametric_problems.mpc import MPCParametric
-from parametric_problems.portfolio import PortfolioParametric
-from utils.parametric import print_results_parametric, compute_results_parametric
+from parametric_problems.mpc_scenarios import MPCScenarios
+from parametric_problems.lasso_path import LassoPath
+from utils.parametric import print_results_parametric, \
+    compute_results_parametric, compute_latency_parametric
+import os
+import argparse
+import pandas as pd
 
-PROBLEMS_MAP = {'Lasso': LassoParametric,
-                'MPC': MPCParametric,
-                'Portfolio': PortfolioParametric}
+
+parser = argparse.ArgumentParser(description='Parametric Problems Runner')
+parser.add_argument('--parallel', help='Parallel solution', default=False,
+                    action='store_true')
+parser.add_argument('--latency', help='Latency distribution of the warm-started MPC loop',
+                    default=False, action='store_true')
+parser.add_argument('--scenarios', help='Throughput of many closed-loop MPC scenarios',
+                    default=False, action='store_true')
+parser.add_argument('--lasso_path', help='Lasso path with adaptive lambda grid (compared to scikit-learn if installed)',
+                    default=False, action='store_true')
+args = parser.parse_args()
+parallel = args.parallel
+latency = args.latency
+scenarios = args.scenarios
+lasso_path = args.lasso_path
+
+print('parallel', parallel)
+print('latency', latency)
+print('scenarios', scenarios)
+print('lasso_path', lasso_path)
 
 problems = [
             'Lasso',
@@ -32,15 +54,40 @@ osqp_settings = {'verbose': False,
                  'polish': False,
                  'rho': 0.1}
 
-# Solve all problems
-for problem in problems:
-    for dim in dimensions[problem]:
-        problem_instance = PROBLEMS_MAP[problem](osqp_settings,
-                                                 dim)
-        problem_instance.solve()
+if latency:
+    # Real-time benchmark of the MPC loop (one dimension at a time pinned
+    # to a single core)
+    for dim in dimensions['MPC']:
+        MPCParametric(osqp_settings, dim).solve_latency()
+    compute_latency_parametric('MPC', dimensions['MPC'])
+elif scenarios:
+    # Many closed-loop trajectories of every MPC plant split across the
+    # workers
+    stats = [MPCScenarios(osqp_settings, dim).solve(parallel=parallel)
+             for dim in dimensions['MPC']]
+    pd.DataFrame(stats).to_csv(os.path.join('.', 'results',
+                                            'parametric_problems',
+                                            'scenarios_mpc.csv'),
+                               index=False)
+elif lasso_path:
+    # Lasso paths with a single OSQP setup per dimension
+    stats = []
+    for dim in dimensions['Lasso']:
+        path = LassoPath(osqp_settings, dim, adaptive=True)
+        dim_stats = path.solve()
+        dim_stats.update(path.compare_sklearn())
+        stats.append(dim_stats)
+    pd.DataFrame(stats).to_csv(os.path.join('.', 'results',
+                                            'parametric_problems',
+                                            'lasso_path.csv'),
+                               index=False)
+else:
+    # Solve all problems (each pass with and without warm start is a task)
+    solve_parametric_problems(problems, dimensions, osqp_settings,
+                              parallel=parallel)
 
-# Compute results
-compute_results_parametric(problems, dimensions)
+    # Compute results
+    compute_results_parametric(problems, dimensions)
 
 #  # Extract results info
 #  print("Results")
@@ -22,14 +22,18 @@ parser.add_argument('--verbose', help='Verbose solvers', default=False,
                     action='store_true')
 parser.add_argument('--parallel', help='Parallel solution', default=False,
                     action='store_true')
+parser.add_argument('--trace_memory', help='Record the peak Python allocations of every solve with tracemalloc (slows down the solves)',
+                    default=False, action='store_true')
 args = parser.parse_args()
 high_accuracy = args.high_accuracy
 verbose = args.verbose
 parallel = args.parallel
+trace_memory = args.trace_memory
 
 print('high_accuracy', high_accuracy)
 print('verbose', verbose)
 print('parallel', parallel)
+print('trace_memory', trace_memory)
 
 
 # Add high accuracy solvers when accurazy
@@ -57,11 +61,11 @@ for problem in problems:
     suitesparse_runner = SuitesparseRunner(problem,
                                            solvers,
                                            s.settings,
-                                           OUTPUT_FOLDER)
-    suitesparse_runner.problems.remove('Rucci_Rucci1')  # Problematic, makes Gurobi crash the whole system
+                                           OUTPUT_FOLDER,
+                                           trace_memory=trace_memory)
     # DEBUG: To test
     #  suitesparse_runner.problems = ['HB_abb313', 'HB_ash331']
-    suitesparse_runner.solve(parallel=parallel, cores=12)
+    suitesparse_runner.solve(parallel=parallel)
 
 #  suitesparse_lasso_runner = SuitesparseLassoRunner(solvers,
                                                   #  s.settings,
@@ -2,7 +2,7 @@ import cvxpy.settings as stgs
 import cvxpy
 from . import statuses as s
 from .results import Results
-from utils.general import is_qp_solution_optimal
+from utils.general import is_qp_solution_optimal, PhaseTimer
 
 
 class ECOSSolver(object):
@@ -37,6 +37,9 @@ class ECOSSolver(object):
         Returns:
             Results structure
         '''
+        # NB. The CVXPY problem is generated on first access
+        timer = PhaseTimer()
+        timer.start('conversion')
         problem = example.cvxpy_problem
 
         if 'verbose' in self._settings:
@@ -44,6 +47,9 @@ class ECOSSolver(object):
         else:
             verbose = False
 
+        # NB. CVXPY builds the ECOS problem inside solve so the build
+        # phase is part of the solve phase
+        timer.start('solve')
         try:
             obj_val = problem.solve(solver=cvxpy.ECOS, verbose=verbose)
         except cvxpy.SolverError:
@@ -51,7 +57,9 @@ class ECOSSolver(object):
                 if self._settings['verbose']:
                     print("Error in ECOS solution\n")
             return Results(s.SOLVER_ERROR, None, None, None,
-                           None, None)
+                           None, None, phase_times=timer.stop())
+
+        timer.start('extraction')
 
         status = self.STATUS_MAP.get(problem.status, s.SOLVER_ERROR)
 
@@ -65,6 +73,7 @@ class ECOSSolver(object):
         x, y = example.revert_cvxpy_solution()
 
         # Validate status
+        timer.start('check')
         if not is_qp_solution_optimal(example.qp_problem, x, y,
                                       high_accuracy=self._settings.get('high_accuracy')):
             status = s.SOLVER_ERROR
@@ -79,4 +88,5 @@ class ECOSSolver(object):
                        x,
                        y,
                        run_time,
-                       niter)
+                       niter,
+                       phase_times=timer.stop())
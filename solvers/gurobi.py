@@ -1,8 +1,9 @@
 import gurobipy as grb
 import numpy as np
+import scipy.sparse as spa
 from . import statuses as s
 from .results import Results
-from utils.general import is_qp_solution_optimal
+from utils.general import is_qp_solution_optimal, PhaseTimer
 
 
 class GUROBISolver(object):
@@ -41,6 +42,8 @@ class GUROBISolver(object):
         Returns:
             Results structure
         '''
+        timer = PhaseTimer()
+        timer.start('conversion')
         p = example.qp_problem
 
         if p['A'] is not None:
@@ -58,71 +61,18 @@ class GUROBISolver(object):
         # Adjust infinity values in bounds
         u = np.copy(p['u'])
         l = np.copy(p['l'])
-
-        for i in range(m):
-            if u[i] >= 1e20:
-                u[i] = grb.GRB.INFINITY
-            if l[i] <= -1e20:
-                l[i] = -grb.GRB.INFINITY
+        u[u >= 1e20] = grb.GRB.INFINITY
+        l[l <= -1e20] = -grb.GRB.INFINITY
 
         # Create a new model
+        timer.start('build')
         model = grb.Model("qp")
 
-        # Add variables
-        for i in range(n):
-            model.addVar(ub=grb.GRB.INFINITY, lb=-grb.GRB.INFINITY)
-        model.update()
-        x = model.getVars()
-
-        # Add inequality constraints: iterate over the rows of A
-        # adding each row into the model
-        if p['A'] is not None:
-            # Ignore newer interface for now
-            #  if hasattr(model, '_v811_addMConstrs'):
-            #      # New interface, all constraints at once
-            #      # Get senses
-            #      senses = np.repeat(grb.GRB.EQUAL, m)
-            #      double_idx = np.array([])  # Array of double constrants for ranges
-            #      for i in range(m):
-            #          #  if (np.abs(l[i] - u[i]) < 1e-08):
-            #          #      # equal case already handled!
-            #          if (l[i] == -grb.GRB.INFINITY) & (u[i] != grb.GRB.INFINITY):
-            #              senses[i] = grb.GRB.LESS_EQUAL
-            #          elif (l[i] != -grb.GRB.INFINITY) & (u[i] == grb.GRB.INFINITY):
-            #      # Construct sense
-            #
-            #  else:
-            # Old interface
-            for i in range(m):
-                start = p['A'].indptr[i]
-                end = p['A'].indptr[i+1]
-                variables = [x[j] for j in p['A'].indices[start:end]]  # nnz
-                coeff = p['A'].data[start:end]
-                expr = grb.LinExpr(coeff, variables)
-                if (np.abs(l[i] - u[i]) < 1e-08):
-                    model.addConstr(expr, grb.GRB.EQUAL, u[i])
-                elif (l[i] == -grb.GRB.INFINITY) & (u[i] == grb.GRB.INFINITY):
-                    # Dummy constraint that is always satisfied.
-                    # Gurobi crashes if both constraints in addRange function
-                    # are infinite.
-                    model.addConstr(0.*expr, grb.GRB.LESS_EQUAL, 10.)
-                else:
-                    model.addRange(expr, lower=l[i], upper=u[i])
-
-        # Define objective
-        if p['P'] is not None:
-            if hasattr(model, '_v811_setMObjective'):
-                # New interface for gurobi > v8.1.1
-                model._v811_setMObjective(0.5 * p['P'], p['q'])
-            else:
-                #  Old interface
-                obj = grb.QuadExpr()  # Set quadratic part
-                if p['P'].count_nonzero():  # If there are any nonzero elms in P
-                    for i in range(p['P'].nnz):
-                        obj.add(.5*p['P'].data[i] *
-                                x[p['P'].row[i]]*x[p['P'].col[i]])
-                obj.add(grb.LinExpr(p['q'], x))  # Add linear part
-                model.setObjective(obj)  # Set objective
+        if hasattr(model, 'addMVar'):
+            # Matrix interface for gurobi >= 9
+            self._build_matrix_model(model, p, l, u)
+        else:
+            self._build_model(model, p, l, u)
 
         # Set parameters
         if 'verbose' in self._settings:  # if verbose is null, suppress it
@@ -141,15 +91,18 @@ class GUROBISolver(object):
         model.update()
 
         # Solve problem
+        timer.start('solve')
         try:
             model.optimize()
         except:  # Error in the solution
             if self._settings['verbose']:
                 print("Error in GUROBI solution\n")
             run_time = model.Runtime
-            return Results(s.SOLVER_ERROR, None, None, None, run_time, None)
+            return Results(s.SOLVER_ERROR, None, None, None, run_time, None,
+                           phase_times=timer.stop())
 
         # Get status
+        timer.start('extraction')
         status = self.STATUS_MAP.get(model.Status, s.SOLVER_ERROR)
 
         # Get computation time
@@ -162,13 +115,13 @@ class GUROBISolver(object):
             # Get objective value
             objval = model.objVal
 
-            # Get solution
-            x = np.array([x[i].X for i in range(n)])
+            # Get solution (the first n variables)
+            x = np.array(model.getAttr('X', model.getVars()[:n]))
 
             # Get dual variables  (Gurobi uses swapped signs (-1))
-            constrs = model.getConstrs()
-            y = -np.array([constrs[i].Pi for i in range(m)])
+            y = -np.array(model.getAttr('Pi', model.getConstrs()))
 
+            timer.start('check')
             if not is_qp_solution_optimal(p, x, y,
                                           high_accuracy=self._settings.get('high_accuracy')):
                 status = s.SOLVER_ERROR
@@ -179,7 +132,119 @@ class GUROBISolver(object):
                     status = s.TIME_LIMIT
 
             return Results(status, objval, x, y,
-                           run_time, niter)
+                           run_time, niter, phase_times=timer.stop())
         else:
             return Results(status, None, None, None,
-                           run_time, niter)
+                           run_time, niter, phase_times=timer.stop())
+
+    @staticmethod
+    def _build_matrix_model(model, p, l, u):
+        '''
+        Load the problem with the matrix interface
+
+        The rows of A are classified with masks into equalities, free
+        rows, one-sided inequalities and ranges. Each range row
+        l_i <= a_i'x <= u_i gets a slack variable s_i with l_i <= s_i <= u_i
+        and becomes a_i'x - s_i = 0 so that all the rows are added with a
+        single call keeping their order (and the order of the duals).
+        '''
+        n = p['n']
+        m = p['m']
+
+        # Add variables
+        x = model.addMVar(n, lb=-grb.GRB.INFINITY, ub=grb.GRB.INFINITY)
+
+        if p['A'] is not None and m > 0:
+            l_inf = l == -grb.GRB.INFINITY
+            u_inf = u == grb.GRB.INFINITY
+            eq = np.abs(l - u) < 1e-08
+            free = ~eq & l_inf & u_inf
+            upper = ~eq & l_inf & ~u_inf
+            lower = ~eq & ~l_inf & u_inf
+            ranged = ~eq & ~l_inf & ~u_inf
+
+            sense = np.full(m, grb.GRB.EQUAL)
+            sense[upper | free] = grb.GRB.LESS_EQUAL
+            sense[lower] = grb.GRB.GREATER_EQUAL
+            rhs = np.zeros(m)
+            rhs[eq | upper] = u[eq | upper]
+            rhs[lower] = l[lower]
+
+            # Free rows become the dummy constraint 0 <= 10 that is always
+            # satisfied. Gurobi crashes if both sides of a range are
+            # infinite.
+            A = p['A'].tocsr()
+            if free.any():
+                A = spa.diags((~free).astype(float)) @ A
+                rhs[free] = 10.
+
+            # Add slack variables of the ranges
+            ranged_idx = np.flatnonzero(ranged)
+            if len(ranged_idx):
+                model.addMVar(len(ranged_idx),
+                              lb=l[ranged_idx], ub=u[ranged_idx])
+                S = spa.csr_matrix((-np.ones(len(ranged_idx)),
+                                    (ranged_idx, np.arange(len(ranged_idx)))),
+                                   shape=(m, len(ranged_idx)))
+                A = spa.hstack([A, S], format='csr')
+            model.update()
+
+            # Add all the constraints on all the variables at once
+            model.addMConstr(A, None, sense, rhs)
+
+        # Define objective (only the linear part if there is no P)
+        if p['P'] is not None:
+            model.setMObjective(0.5 * p['P'].tocsr(), p['q'], 0.,
+                                xQ_L=x, xQ_R=x, xc=x,
+                                sense=grb.GRB.MINIMIZE)
+        else:
+            model.setMObjective(None, p['q'], 0., xc=x,
+                                sense=grb.GRB.MINIMIZE)
+
+    @staticmethod
+    def _build_model(model, p, l, u):
+        '''
+        Load the problem row by row for gurobi < 9
+        '''
+        n = p['n']
+        m = p['m']
+
+        # Add variables
+        for i in range(n):
+            model.addVar(ub=grb.GRB.INFINITY, lb=-grb.GRB.INFINITY)
+        model.update()
+        x = model.getVars()
+
+        # Add inequality constraints: iterate over the rows of A
+        # adding each row into the model
+        if p['A'] is not None:
+            for i in range(m):
+                start = p['A'].indptr[i]
+                end = p['A'].indptr[i+1]
+                variables = [x[j] for j in p['A'].indices[start:end]]  # nnz
+                coeff = p['A'].data[start:end]
+                expr = grb.LinExpr(coeff, variables)
+                if (np.abs(l[i] - u[i]) < 1e-08):
+                    model.addConstr(expr, grb.GRB.EQUAL, u[i])
+                elif (l[i] == -grb.GRB.INFINITY) & (u[i] == grb.GRB.INFINITY):
+                    # Dummy constraint that is always satisfied.
+                    # Gurobi crashes if both constraints in addRange function
+                    # are infinite.
+                    model.addConstr(0.*expr, grb.GRB.LESS_EQUAL, 10.)
+                else:
+                    model.addRange(expr, lower=l[i], upper=u[i])
+
+        # Define objective
+        if p['P'] is not None:
+            if hasattr(model, '_v811_setMObjective'):
+                # New interface for gurobi > v8.1.1
+                model._v811_setMObjective(0.5 * p['P'], p['q'])
+            else:
+                #  Old interface
+                obj = grb.QuadExpr()  # Set quadratic part
+                if p['P'].count_nonzero():  # If there are any nonzero elms in P
+                    for i in range(p['P'].nnz):
+                        obj.add(.5*p['P'].data[i] *
+                                x[p['P'].row[i]]*x[p['P'].col[i]])
+                obj.add(grb.LinExpr(p['q'], x))  # Add linear part
+                model.setObjective(obj)  # Set objective
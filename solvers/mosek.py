@@ -3,7 +3,7 @@ import numpy as np
 import scipy.sparse as spa
 from . import statuses as s
 from .results import Results
-from utils.general import is_qp_solution_optimal
+from utils.general import is_qp_solution_optimal, PhaseTimer
 
 
 class MOSEKSolver(object):
@@ -37,6 +37,8 @@ class MOSEKSolver(object):
         Returns:
             Results structure
         '''
+        timer = PhaseTimer()
+        timer.start('conversion')
         p = example.qp_problem
 
         # Get problem dimensions
@@ -46,6 +48,7 @@ class MOSEKSolver(object):
         '''
         Load problem
         '''
+        timer.start('build')
         # Create environment
         env = mosek.Env()
 
@@ -72,35 +75,36 @@ class MOSEKSolver(object):
         # The variables will initially be fixed at zero (x=0).
         task.appendvars(n)
 
-        # Add linear cost by iterating over all variables
-        for j in range(n):
-            task.putcj(j, p['q'][j])
-            task.putvarbound(j, mosek.boundkey.fr, -np.inf, np.inf)
+        # Add linear cost and free variable bounds
+        task.putcslice(0, n, p['q'])
+        task.putvarboundslice(0, n, [mosek.boundkey.fr] * n,
+                              np.full(n, -np.inf), np.full(n, np.inf))
 
         # Add constraints
         if p['A'] is not None:
             row_A, col_A, el_A = spa.find(p['A'])
             task.putaijlist(row_A, col_A, el_A)
 
-            for j in range(m):
-                # Get bounds and keys
-                u_temp = p['u'][j] if p['u'][j] < 1e20 else np.inf
-                l_temp = p['l'][j] if p['l'][j] > -1e20 else -np.inf
-
-                # Divide 5 cases
-                if (np.abs(l_temp - u_temp) < 1e-08):
-                    bound_key = mosek.boundkey.fx
-                elif l_temp == -np.inf and u_temp == np.inf:
-                    bound_key = mosek.boundkey.fr
-                elif l_temp != -np.inf and u_temp == np.inf:
-                    bound_key = mosek.boundkey.lo
-                elif l_temp != -np.inf and u_temp != np.inf:
-                    bound_key = mosek.boundkey.ra
-                elif l_temp == -np.inf and u_temp != np.inf:
-                    bound_key = mosek.boundkey.up
-
-                # Add bound
-                task.putconbound(j, bound_key, l_temp, u_temp)
+            # Get bounds and keys
+            u = np.where(p['u'] < 1e20, p['u'], np.inf)
+            l = np.where(p['l'] > -1e20, p['l'], -np.inf)
+
+            # Divide 5 cases with masks (the first matching case applies)
+            l_inf = l == -np.inf
+            u_inf = u == np.inf
+            case = np.select([np.abs(l - u) < 1e-08,
+                              l_inf & u_inf,
+                              u_inf,
+                              ~l_inf],
+                             [0, 1, 2, 3], default=4)
+            bound_keys = np.array([mosek.boundkey.fx,
+                                   mosek.boundkey.fr,
+                                   mosek.boundkey.lo,
+                                   mosek.boundkey.ra,
+                                   mosek.boundkey.up], dtype=object)[case]
+
+            # Add bounds
+            task.putconboundslice(0, m, bound_keys.tolist(), l, u)
 
         # Add quadratic cost
         if p['P'].count_nonzero():  # If there are any nonzero elms in P
@@ -126,6 +130,7 @@ class MOSEKSolver(object):
         '''
         Solve problem
         '''
+        timer.start('solve')
         try:
             # Optimization and check termination code
             termination_code = task.optimize()
@@ -133,7 +138,7 @@ class MOSEKSolver(object):
             if self._settings['verbose']:
                 print("Error in MOSEK solution\n")
             return Results(s.SOLVER_ERROR, None, None, None,
-                           None, None)
+                           None, None, phase_times=timer.stop())
 
         if 'verbose' in self._settings:  # if verbose is null, suppress it
             if self._settings['verbose']:
@@ -142,6 +147,7 @@ class MOSEKSolver(object):
         '''
         Extract results
         '''
+        timer.start('extraction')
 
         # Get solution type and status
         # soltype, solsta = self.choose_solution(task)
@@ -173,6 +179,7 @@ class MOSEKSolver(object):
             # it appears signs are inverted
             y = -y
 
+            timer.start('check')
             if not is_qp_solution_optimal(p, x, y,
                                           high_accuracy=self._settings.get('high_accuracy')):
                 status = s.SOLVER_ERROR
@@ -183,10 +190,10 @@ class MOSEKSolver(object):
                     status = s.TIME_LIMIT
 
             return Results(status, objval, x, y,
-                           cputime, total_iter)
+                           cputime, total_iter, phase_times=timer.stop())
         else:
             return Results(status, None, None, None,
-                           cputime, None)
+                           cputime, None, phase_times=timer.stop())
 
     # def choose_solution(self, task):
     #     """Chooses between the basic, interior point solution or integer solution
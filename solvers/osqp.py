@@ -1,7 +1,155 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
+import scipy.sparse as spa
 import osqp
 from . import statuses as s
 from .results import Results
-from utils.general import is_qp_solution_optimal
+from utils.general import is_qp_solution_optimal, PhaseTimer
+
+# Settings that can be changed with update_settings without a new setup
+UPDATABLE_SETTINGS = ['max_iter', 'eps_abs', 'eps_rel', 'eps_prim_inf',
+                      'eps_dual_inf', 'rho', 'alpha', 'delta', 'polish',
+                      'polish_refine_iter', 'verbose', 'scaled_termination',
+                      'check_termination', 'warm_start', 'time_limit']
+
+# Number of OSQP workspaces kept by each process within a group of tasks
+POOL_SIZE = 1
+
+# Default rho of OSQP (documented default of the rho setting)
+DEFAULT_RHO = 0.1
+
+
+def _same_matrix(M, N):
+    '''
+    Check if the sparse matrices M and N have the same pattern and values
+    '''
+    if M is N:
+        return True
+    M = spa.csc_matrix(M)
+    N = spa.csc_matrix(N)
+    return M.shape == N.shape and M.nnz == N.nnz and \
+        np.array_equal(M.indptr, N.indptr) and \
+        np.array_equal(M.indices, N.indices) and \
+        np.array_equal(M.data, N.data)
+
+
+class WorkspacePool(object):
+    '''
+    OSQP solvers already set up, keyed by the settings that need a new
+    setup
+
+    The pool is only active inside group() (e.g. the OSQP variants of a
+    problem solved one after the other by the same worker) and it is
+    cleared when the group ends. Outside a group every solve gets a new
+    setup and nothing is kept.
+
+    A solver is reused when the new problem has the same P, A and q. The
+    bounds l, u and the other settings are updated and the iterates are
+    reset to zero so that the solve is the same as after a new setup.
+    Problems with different P, A or q would be solved with the scaling of
+    the first problem and get a new setup instead.
+    '''
+    def __init__(self, size=POOL_SIZE):
+        self.size = size
+        self.active = False
+        self.workspaces = OrderedDict()  # Least recently used first
+
+    @contextmanager
+    def group(self):
+        '''
+        Reuse the workspaces within the block and release them at its end
+        '''
+        self.active = True
+        try:
+            yield self
+        finally:
+            self.active = False
+            self.workspaces.clear()
+
+    def get(self, problem, settings):
+        '''
+        OSQP solver set up for problem with settings
+
+        Returns:
+            (workspace, reused) where workspace is a dictionary with the
+            solver ('solver') and the time of its setup ('setup_time')
+        '''
+        key = None
+        if self.active and self.size > 0:
+            key = repr(sorted((name, value)
+                              for name, value in settings.items()
+                              if name not in UPDATABLE_SETTINGS)) + \
+                repr(sorted(settings))
+            workspace = self.workspaces.pop(key, None)
+            if workspace is not None and \
+                    _same_matrix(workspace['P'], problem['P']) and \
+                    _same_matrix(workspace['A'], problem['A']) and \
+                    np.array_equal(workspace['q'], problem['q']):
+                self._update(workspace, problem, settings)
+                self.workspaces[key] = workspace
+                return workspace, True
+
+        # New setup
+        m = osqp.OSQP()
+        m.setup(spa.triu(problem['P'], format='csc'), problem['q'],
+                spa.csc_matrix(problem['A']), problem['l'], problem['u'],
+                **settings)
+        workspace = {'solver': m,
+                     'setup_time': None}   # Set after the first solve
+        if key is not None:
+            while len(self.workspaces) >= self.size:
+                self.workspaces.popitem(last=False)
+            # The matrices of the problem are kept (not copied) until the
+            # end of the group
+            workspace.update({'P': problem['P'],
+                              'A': problem['A'],
+                              'q': np.array(problem['q']),
+                              'l': np.array(problem['l']),
+                              'u': np.array(problem['u']),
+                              'rho': settings.get('rho', DEFAULT_RHO),
+                              'rho_updated': False,
+                              'n': problem['P'].shape[0],
+                              'm': problem['A'].shape[0]})
+            self.workspaces[key] = workspace
+        return workspace, False
+
+    @staticmethod
+    def _update(workspace, problem, settings):
+        '''
+        Prepare the workspace of a previous solve for a cold solve of
+        problem with settings
+        '''
+        m = workspace['solver']
+        if not np.array_equal(workspace['l'], problem['l']) or \
+                not np.array_equal(workspace['u'], problem['u']):
+            m.update(l=problem['l'], u=problem['u'])
+            workspace['l'] = np.array(problem['l'])
+            workspace['u'] = np.array(problem['u'])
+
+        update = {key: value for key, value in settings.items()
+                  if key in UPDATABLE_SETTINGS}
+        if workspace['rho_updated']:
+            # Restore the initial rho changed by adaptive rho
+            update.setdefault('rho', workspace['rho'])
+            workspace['rho_updated'] = False
+        if update:
+            m.update_settings(**update)
+
+        # Start from zero iterates as after a new setup
+        m.warm_start(x=np.zeros(workspace['n']), y=np.zeros(workspace['m']))
+
+
+# Workspaces of this process
+workspace_pool = WorkspacePool()
+
+
+def workspace_group():
+    '''
+    Context of a group of tasks of the scheduler sharing the OSQP
+    workspaces of this process (see utils.scheduler.run_tasks)
+    '''
+    return workspace_pool.group()
 
 
 class OSQPSolver(object):
@@ -27,27 +175,48 @@ class OSQPSolver(object):
         '''
         Solve problem
 
+        Inside a group of tasks, the OSQP workspace is taken from the
+        workspace pool of the process. If it is reused (e.g. OSQP and
+        OSQP_polish on the same problem) the factorization is not
+        computed again. The run time is still the one of a new setup
+        (setup time of the workspace plus solve time) while the time to
+        update the workspace is in update_time.
+
         Args:
             problem: problem structure with QP matrices
 
         Returns:
             Results structure
         '''
+        timer = PhaseTimer()
+        timer.start('conversion')
         problem = example.qp_problem
         settings = self._settings.copy()
         high_accuracy = settings.pop('high_accuracy', None)
 
-        # Setup OSQP
-        m = osqp.OSQP()
-        m.setup(problem['P'], problem['q'], problem['A'], problem['l'],
-                problem['u'],
-                **settings)
+        # Setup OSQP (or reuse a previous setup)
+        timer.start('build')
+        workspace, reused = workspace_pool.get(problem, settings)
+        m = workspace['solver']
 
         # Solve
+        timer.start('solve')
         results = m.solve()
+
+        timer.start('extraction')
         status = self.STATUS_MAP.get(results.info.status_val, s.SOLVER_ERROR)
 
+        if reused:
+            run_time = workspace['setup_time'] + results.info.solve_time + \
+                results.info.polish_time
+        else:
+            workspace['setup_time'] = results.info.setup_time
+            run_time = results.info.run_time
+        if results.info.rho_updates > 0 and 'rho_updated' in workspace:
+            workspace['rho_updated'] = True
+
         if status in s.SOLUTION_PRESENT:
+            timer.start('check')
             if not is_qp_solution_optimal(problem,
                                           results.x,
                                           results.y,
@@ -56,20 +225,22 @@ class OSQPSolver(object):
 
         # Verify solver time
         if settings.get('time_limit') is not None:
-            if results.info.run_time > settings.get('time_limit'):
+            if run_time > settings.get('time_limit'):
                 status = s.TIME_LIMIT
 
         return_results = Results(status,
                                  results.info.obj_val,
                                  results.x,
                                  results.y,
-                                 results.info.run_time,
-                                 results.info.iter)
+                                 run_time,
+                                 results.info.iter,
+                                 phase_times=timer.stop())
 
         return_results.status_polish = results.info.status_polish
-        return_results.setup_time = results.info.setup_time
+        return_results.setup_time = workspace['setup_time']
         return_results.solve_time = results.info.solve_time
         return_results.update_time = results.info.update_time
         return_results.rho_updates = results.info.rho_updates
+        return_results.workspace_reused = reused
 
         return return_results
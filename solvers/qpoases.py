@@ -2,7 +2,8 @@ import qpoases
 import numpy as np
 from . import statuses as s
 from .results import Results
-from utils.general import is_qp_solution_optimal, stdout_redirected
+from utils.general import is_qp_solution_optimal, stdout_redirected, \
+    PhaseTimer
 
 
 class qpOASESSolver(object):
@@ -38,6 +39,8 @@ class qpOASESSolver(object):
         Returns:
             Results structure
         '''
+        timer = PhaseTimer()
+        timer.start('conversion')
         p = example.qp_problem
         n, m = p['n'], p['m']
 
@@ -52,7 +55,7 @@ class qpOASESSolver(object):
         # Too large for qpOASES crashing the server (it reaches anyway the time-limit way before!)
         if example.name == 'Huber' and N > 250000:
             return Results(s.MAX_ITER_REACHED, None, None, None,
-                           1000.0, 1000)
+                           1000.0, 1000, phase_times=timer.stop())
 
         if p['P'] is not None:
             P = np.ascontiguousarray(p['P'].todense())
@@ -87,6 +90,7 @@ class qpOASESSolver(object):
             ux = np.ascontiguousarray(np.inf * np.ones(n))
 
         # Redirect output if verbose is False
+        timer.start('build')
         if 'verbose' in self._settings:
             if self._settings['verbose'] is False:
                 with stdout_redirected():
@@ -122,9 +126,12 @@ class qpOASESSolver(object):
             qpoases_nWSR = np.array([1000000])
 
         # Solve problem
+        timer.start('solve')
         status = qpoases_m.init(P, q, A, lx, ux, l, u,
                                 qpoases_nWSR, qpoases_cpu_time)
 
+        timer.start('extraction')
+
         # Check status
         status = self.STATUS_MAP.get(status, s.SOLVER_ERROR)
 
@@ -153,12 +160,13 @@ class qpOASESSolver(object):
 
                 y = np.concatenate((y, y_bounds))
 
+            timer.start('check')
             if not is_qp_solution_optimal(p, x, y, self._settings.get('high_accuracy')):
                 status = s.SOLVER_ERROR
 
             return Results(status, obj_val,
                            x, y,
-                           run_time, niter)
+                           run_time, niter, phase_times=timer.stop())
         else:
             return Results(status, None, None, None,
-                           run_time, niter)
+                           run_time, niter, phase_times=timer.stop())
@@ -2,10 +2,23 @@ class Results(object):
     '''
     Results class from QP solution
     '''
-    def __init__(self, status, obj_val, x, y, run_time, niter):
+    # Phases of the solve timed on the wall clock (see PhaseTimer)
+    PHASES = ['conversion', 'build', 'solve', 'extraction', 'check']
+
+    def __init__(self, status, obj_val, x, y, run_time, niter,
+                 phase_times=None):
         self.status = status
         self.obj_val = obj_val
         self.x = x
         self.y = y
         self.run_time = run_time
         self.niter = niter
+        self.phase_times = phase_times if phase_times is not None else {}
+
+    def wall_times(self):
+        '''
+        Dictionary with the wall-clock time of each phase
+        ('{phase}_wall_time' fields, None if the phase did not run)
+        '''
+        return {'%s_wall_time' % phase: self.phase_times.get(phase)
+                for phase in self.PHASES}
@@ -1,11 +1,14 @@
 import os
-from multiprocessing import Pool, cpu_count
-from itertools import repeat
 import pandas as pd
 
 from solvers.solvers import SOLVER_MAP
+from solvers.osqp import workspace_group
 from problem_classes.suitesparse_lasso import SuitesparseLasso
-from utils.general import make_sure_path_exists
+from utils.store import ResultsStore
+from utils.journal import TaskJournal
+from utils.scheduler import run_tasks, physical_memory
+from utils.sparse import hdf5_matrix_header
+from utils.general import MemoryTracker
 
 import numpy as np
 
@@ -19,6 +22,35 @@ EXAMPLES_MAP = {example.name(): example for example in examples}
 
 PROBLEMS_FOLDER = "suitesparse_matrix_collection"
 
+# Peak memory of the solvers in multiples of the memory of the QP data.
+# Rough upper bounds of the fill-in of the factorizations and of the
+# internal copies of the problem (presolve, modeling layer).
+MEMORY_FACTORS = {'OSQP': 10.,
+                  'GUROBI': 40.,
+                  'MOSEK': 30.,
+                  'ECOS': 30.,
+                  'qpOASES': 40.}
+DEFAULT_MEMORY_FACTOR = 40.
+
+# Memory of a worker process before loading the problem (bytes)
+BASE_MEMORY = 300 * 1024 ** 2
+
+# Fraction of the physical memory of the node used by the workers
+MEMORY_BUDGET_FRACTION = 0.8
+
+
+def estimate_memory(example, file_name, solver):
+    '''
+    Estimated peak memory in bytes to solve the problem of class example
+    from the matrix in file_name with solver. Only the header of the
+    matrix is read.
+    '''
+    n, m, N = example.qp_dimensions(*hdf5_matrix_header(file_name))
+    qp_bytes = 12 * N + 8 * (n + 2 * m)   # CSC entries and vectors
+    factor = MEMORY_FACTORS.get(solver.split('_')[0],
+                                DEFAULT_MEMORY_FACTOR)
+    return BASE_MEMORY + factor * qp_bytes
+
 
 class SuitesparseRunner(object):
     '''
@@ -28,11 +60,13 @@ class SuitesparseRunner(object):
                  name,
                  solvers,
                  settings,
-                 output_folder):
+                 output_folder,
+                 trace_memory=False):
         self.name = name
         self.solvers = solvers
         self.settings = settings
         self.output_folder = output_folder
+        self.trace_memory = trace_memory
 
         # Get problems list
         problems_dir = os.path.join(".", "problem_classes", PROBLEMS_FOLDER)
@@ -42,15 +76,25 @@ class SuitesparseRunner(object):
         self.problems = [f[:-4] for f in lst_probs]   # List of problem names
 
 
-    def solve(self, parallel=True, cores=32):
+    def solve(self, parallel=True, cores=None,
+              memory_budget_fraction=MEMORY_BUDGET_FRACTION):
         '''
         Solve problems of type example
 
-        The results are stored as
+        In parallel, the problems are admitted into the pool of workers
+        only while the sum of their estimated peak memory fits in
+        memory_budget_fraction of the physical memory. Many small
+        problems run at the same time while the largest ones run alone.
 
-            ./results/{self.output_folder}/{solver}/{class}/results.csv
+        The results are appended to the results store
 
-        using a pandas table with fields
+            ./results/{self.output_folder}/store/
+
+        as soon as all the problems are solved by a solver. The result of
+        each problem is also recorded in the journal of the completed
+        tasks so that an interrupted run restarts from the missing ones.
+        The results are stored using a pandas table with fields
+            - 'class': problem class
             - 'name': problem name
             - 'solver': solver name
             - 'status': solver status
@@ -60,62 +104,84 @@ class SuitesparseRunner(object):
             - 'obj_opt': optimal objective value
             - 'n': leading dimension
             - 'N': nnz dimension (nnz(P) + nnz(A))
+            - '{phase}_wall_time': wall-clock time of each phase of the
+              solve (conversion, build, solve, extraction, check)
+            - 'peak_rss_delta': peak resident memory of the solve in bytes
+              (above the one before the solve)
+            - 'peak_tracemalloc': peak Python allocations of the solve in
+              bytes (NaN without trace_memory, since tracing biases the
+              timings)
+            - 'fresh_process': the solve is the first one measured in its
+              process (only those peak memories are comparable)
         '''
 
         print("Solving Suitesparse %s problems" % self.name)
         print("----------------------------------")
 
-        if parallel:
-            pool = Pool(processes=min(cores, cpu_count()))
+        store = ResultsStore(self.output_folder)
+        journal = TaskJournal(self.output_folder)
+
+        # Results of each solver indexed by problem
+        results = {}
+
+        def add_result(problem, solver, df):
+            results[solver][problem] = df
+
+            if len(results[solver]) == len(self.problems):
+                # Store results as soon as all the problems are solved
+                store.append(pd.concat([results[solver][p]
+                                        for p in self.problems]))
+                journal.remove([(self.name, solver, p)
+                                for p in self.problems])
 
-        # Iterate over all solvers
+        # Tasks without results in the store or in the journal of the
+        # completed tasks (e.g. from an interrupted run)
+        tasks = []
         for solver in self.solvers:
-            settings = self.settings[solver]
-
-            #  # Initialize solver results
-            #  results_solver = []
-
-            # Solution directory
-            path = os.path.join('.', 'results', self.output_folder,
-                                solver,
-                                self.name)
-
-            # Create directory for the results
-            make_sure_path_exists(path)
-
-            # Get solver file name
-            results_file_name = os.path.join(path, 'full.csv')
-
-            # Check if file name already exists
-            if not os.path.isfile(results_file_name):
-                # Solve  problems
-                if parallel:
-                    results = pool.starmap(self.solve_single_example,
-                                           zip(self.problems,
-                                               repeat(solver),
-                                               repeat(settings)))
+            if store.has_results(solver, self.name):
+                continue
+            results[solver] = {}
+            for problem in self.problems:
+                df = journal.get((self.name, solver, problem))
+                if df is None:
+                    tasks.append((problem, solver, self.settings[solver]))
                 else:
-                    results = []
-                    for problem in self.problems:
-                        results.append(self.solve_single_example(problem,
-                                                                 solver,
-                                                                 settings))
-                # Create dataframe
-                df = pd.concat(results)
-
-                # Store results
-                df.to_csv(results_file_name, index=False)
-
-            #  else:
-            #      # Load from file
-            #      df = pd.read_csv(results_file_name)
-            #
-            #      # Combine list of dataframes
-            #      results_solver.append(df)
-
-        if parallel:
-            pool.close()  # Not accepting any more jobs on this pool
-            pool.join()   # Wait for all processes to finish
+                    add_result(problem, solver, df)
+
+        # Use the file sizes to solve the largest problems first
+        problems_dir = os.path.join(".", "problem_classes", PROBLEMS_FOLDER)
+        costs = [os.path.getsize(os.path.join(problems_dir,
+                                              '%s.mat' % problem))
+                 for (problem, _, _) in tasks]
+
+        # Estimate the peak memory of each task from the matrix header
+        memory = [estimate_memory(EXAMPLES_MAP[self.name],
+                                  os.path.join(problems_dir,
+                                               '%s.mat' % problem),
+                                  solver)
+                  for (problem, solver, _) in tasks]
+        memory_budget = memory_budget_fraction * physical_memory()
+
+        # Solve the OSQP variants of a problem in the same worker to
+        # reuse the OSQP setup until they are all solved
+        groups = [problem if solver[:4] == 'OSQP' else None
+                  for (problem, solver, _) in tasks]
+
+        # Record every result in the journal as soon as it is available
+        for index, df in run_tasks(self.solve_single_example, tasks,
+                                   costs=costs,
+                                   parallel=parallel,
+                                   cores=cores,
+                                   groups=groups,
+                                   group_context=workspace_group,
+                                   memory=memory,
+                                   memory_budget=memory_budget,
+                                   failure=self.failed_example):
+            problem, solver, _ = tasks[index]
+            journal.add((self.name, solver, problem), df)
+            add_result(problem, solver, df)
+
+        journal.close()
 
     def solve_single_example(self,
                              problem,
@@ -139,14 +205,18 @@ class SuitesparseRunner(object):
 
         # Solve problem
         s = SOLVER_MAP[solver](settings)
+        memory = MemoryTracker(trace_python=self.trace_memory)
+        memory.start()
         results = s.solve(instance)
+        peak_memory = memory.stop()
 
         # Create solution as pandas table
         P = instance.qp_problem['P']
         A = instance.qp_problem['A']
         N = P.nnz + A.nnz
 
-        solution_dict = {'name': [problem],
+        solution_dict = {'class': [self.name],
+                         'name': [problem],
                          'type': [self.name],
                          'solver': [solver],
                          'status': [results.status],
@@ -157,6 +227,12 @@ class SuitesparseRunner(object):
                          'm': [instance.qp_problem["m"]],
                          'N': [N]}
 
+        # Add wall-clock time of the solve phases
+        solution_dict.update(results.wall_times())
+
+        # Add peak memory of the solve
+        solution_dict.update(peak_memory)
+
         # Add status polish if OSQP
         if solver[:4] == 'OSQP':
             solution_dict['status_polish'] = results.status_polish
@@ -164,8 +240,36 @@ class SuitesparseRunner(object):
             solution_dict['solve_time'] = results.solve_time
             solution_dict['update_time'] = results.update_time
             solution_dict['rho_updates'] = results.rho_updates
+            solution_dict['workspace_reused'] = results.workspace_reused
 
         print(" - Solved %s with solver %s" % (problem, solver))
 
         # Return solution
         return pd.DataFrame(solution_dict)
+
+    def failed_example(self, problem, solver, settings, status):
+        '''
+        Results of Suitesparse 'problem' when the worker solving it with
+        'solver' died (e.g. killed when the node ran out of memory)
+
+        Args:
+            problem: problem name
+            solver: solver name
+            settings: settings dictionary for the solver
+            status: failure status
+        '''
+        print(" - Failed %s with solver %s (%s)" % (problem, solver, status))
+
+        solution_dict = {'class': [self.name],
+                         'name': [problem],
+                         'type': [self.name],
+                         'solver': [solver],
+                         'status': [status],
+                         'run_time': [None],
+                         'iter': [None],
+                         'obj_val': [None],
+                         'n': [None],
+                         'm': [None],
+                         'N': [None]}
+
+        return pd.DataFrame(solution_dict)
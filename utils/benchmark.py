@@ -3,6 +3,7 @@ import pandas as pd
 import numpy as np
 import solvers.statuses as statuses
 from solvers.solvers import time_limit
+from utils.store import ResultsStore
 
 # Plotting
 import matplotlib
@@ -11,9 +12,20 @@ import matplotlib.pylab as plt
 
 MAX_TIMING = time_limit
 
-def plot_performance_profiles(problems, solvers):
+# Memory below this value (bytes) counts as this value in the memory
+# performance profiles so that tiny problems do not give huge ratios
+MIN_MEMORY = 1e06
+
+def plot_performance_profiles(problems, solvers,
+                              profiles='performance_profiles'):
     """
     Plot performance profiles in matplotlib for specified problems and solvers
+
+    Args:
+        problems: benchmark results folder
+        solvers: list of solvers
+        profiles: name of the csv file with the profiles
+                  (performance_profiles or memory_performance_profiles)
     """
     # Remove OSQP polish solver
     solvers = solvers.copy()
@@ -21,8 +33,8 @@ def plot_performance_profiles(problems, solvers):
         if "polish" in s:
             solvers.remove(s)
 
-    df = pd.read_csv('./results/%s/performance_profiles.csv' % problems)
-    plt.figure(0)
+    df = pd.read_csv('./results/%s/%s.csv' % (problems, profiles))
+    plt.figure(profiles)
     for solver in solvers:
         plt.plot(df["tau"], df[solver], label=solver)
     plt.xlim(1., 10000.)
@@ -33,86 +45,72 @@ def plot_performance_profiles(problems, solvers):
     plt.legend()
     plt.grid()
     plt.show(block=False)
-    results_file = './results/%s/%s.png' % (problems, problems)
+    if profiles == 'performance_profiles':
+        results_file = './results/%s/%s.png' % (problems, problems)
+    else:
+        results_file = './results/%s/%s.png' % (problems, profiles)
     print("Saving plots to %s" % results_file)
     plt.savefig(results_file)
 
 
-def get_cumulative_data(solvers, problems, output_folder):
-    for solver in solvers:
+def performance_profiles(t, tau_vec):
+    """
+    Compute performance profiles
 
-        # Path where solver results are stored
-        path = os.path.join('.', 'results', output_folder, solver)
+    Args:
+        t: (n_problems x n_solvers) matrix of run times
+        tau_vec: performance ratios where the profiles are evaluated
 
-        # Initialize cumulative results
-        results = []
-        for problem in problems:
-            file_name = os.path.join(path, problem, 'full.csv')
-            results.append(pd.read_csv(file_name))
+    Returns:
+        (n_tau x n_solvers) matrix with the fraction of problems solved
+        by each solver within each performance ratio tau
+    """
+    n_problems = t.shape[0]
 
-        # Create cumulative dataframe
-        df = pd.concat(results)
+    # Relative times with respect to the best solver on each problem
+    r = t / np.min(t, axis=1, keepdims=True)
 
-        # Store dataframe into results
-        solver_file_name = os.path.join(path, 'results.csv')
-        df.to_csv(solver_file_name, index=False)
+    # Count problems with r[p, s] <= tau via sorting and binary search
+    r = np.sort(r, axis=0)
+    rho = np.empty((len(tau_vec), t.shape[1]))
+    for s in range(t.shape[1]):
+        rho[:, s] = np.searchsorted(r[:, s], tau_vec, side='right')
+    return rho / n_problems
 
 
-def compute_performance_profiles(solvers, problems_type):
-    t = {}
-    status = {}
+def compute_performance_profiles(solvers, problems_type,
+                                 tau_vec=None, problems_idx=None,
+                                 problems=None):
+    """
+    Compute performance profiles of the solvers and store them in
+    performance_profiles.csv
+
+    Args:
+        solvers: list of solvers
+        problems_type: benchmark results folder
+        tau_vec: performance ratios (default 1000 points between 1 and 1e4)
+        problems_idx: indices or boolean mask of the problems to consider
+                      (default all the problems)
+        problems: list of problem classes to consider (default all)
+    """
+    t = []
+    store = ResultsStore(problems_type)
 
     # Get time and status
     for solver in solvers:
-        path = os.path.join('.', 'results', problems_type,
-                            solver, 'results.csv')
-        df = pd.read_csv(path)
-
-        # Get total number of problems
-        n_problems = len(df)
-
-        t[solver] = df['run_time'].values
-        status[solver] = df['status'].values
+        df = store.read(solver, columns=['status', 'run_time'],
+                        classes=problems)
 
         # Set maximum time for solvers that did not succeed
-        for idx in range(n_problems):
-            if status[solver][idx] not in statuses.SOLUTION_PRESENT:
-                t[solver][idx] = MAX_TIMING
-
-    r = {}  # Dictionary of relative times for each solver/problem
-    for s in solvers:
-        r[s] = np.zeros(n_problems)
-
-    # Iterate over all problems to find best timing between solvers
-    for p in range(n_problems):
+        solved = df['status'].isin(statuses.SOLUTION_PRESENT).values
+        t.append(np.where(solved, df['run_time'].values, MAX_TIMING))
 
-        # Get minimum time
-        min_time = np.min([t[s][p] for s in solvers])
+    t = np.column_stack(t).astype(float)
+    if problems_idx is not None:
+        t = t[problems_idx]
 
-        # Normalize t for minimum time
-        for s in solvers:
-            r[s][p] = t[s][p]/min_time
-
-    # Compute curve for all solvers
-    n_tau = 1000
-    tau_vec = np.logspace(0, 4, n_tau)
-    rho = {'tau': tau_vec}  # Dictionary of all the curves
-
-    for s in solvers:
-        rho[s] = np.zeros(n_tau)
-        for tau_idx in range(n_tau):
-            count_problems = 0  # Count number of problems with t[p, s] <= tau
-            for p in range(n_problems):
-                if r[s][p] <= tau_vec[tau_idx]:
-                    count_problems += 1
-            rho[s][tau_idx] = count_problems / n_problems
-
-    # Store final pandas dataframe
-    df_performance_profiles = pd.DataFrame(rho)
-    performance_profiles_file = os.path.join('.', 'results',
-                                             problems_type,
-                                             'performance_profiles.csv')
-    df_performance_profiles.to_csv(performance_profiles_file, index=False)
+    _save_performance_profiles(solvers, problems_type, t, tau_vec,
+                               'performance_profiles.csv')
 
     # Plot performance profiles
     # import matplotlib.pylab as plt
@@ -125,6 +123,97 @@ def compute_performance_profiles(solvers, problems_type):
     # plt.xscale('log')
     # plt.show(block=False)
 
+
+def _save_performance_profiles(solvers, problems_type, t, tau_vec,
+                               file_name):
+    """
+    Compute the performance profiles of the (n_problems x n_solvers)
+    matrix of costs t and store them in file_name
+    """
+    # Compute curve for all solvers
+    if tau_vec is None:
+        n_tau = 1000
+        tau_vec = np.logspace(0, 4, n_tau)
+    rho_matrix = performance_profiles(t, tau_vec)
+
+    rho = {'tau': tau_vec}  # Dictionary of all the curves
+    for idx, s in enumerate(solvers):
+        rho[s] = rho_matrix[:, idx]
+
+    # Store final pandas dataframe
+    df_performance_profiles = pd.DataFrame(rho)
+    performance_profiles_file = os.path.join('.', 'results',
+                                             problems_type, file_name)
+    df_performance_profiles.to_csv(performance_profiles_file, index=False)
+
+
+def compute_memory_performance_profiles(solvers, problems_type,
+                                        tau_vec=None, problems=None,
+                                        field='peak_rss_delta'):
+    """
+    Compute performance profiles of the peak memory of the solvers and
+    store them in memory_performance_profiles.csv
+
+    A problem that a solver does not solve has infinite memory for that
+    solver and the problems that no solver solves are left out. Memory
+    below MIN_MEMORY counts as MIN_MEMORY.
+
+    Only the solves measured in a fresh process (fresh_process, e.g. in
+    sandbox mode) are comparable: the heap kept from the previous solves
+    of a worker and the OSQP workspaces reused from the pool of the
+    process (workspace_reused) lower the peak memory of the next solves.
+    The problems where a solver solved the problem in a process that was
+    not fresh are left out. peak_tracemalloc is only recorded by the runs
+    with trace_memory.
+
+    Args:
+        solvers: list of solvers
+        problems_type: benchmark results folder
+        tau_vec: performance ratios (default 1000 points between 1 and 1e4)
+        problems: list of problem classes to consider (default all)
+        field: memory field of the results (peak_rss_delta or
+               peak_tracemalloc)
+
+    Returns:
+        True if the profiles were computed (False if the results have no
+        memory field, e.g. they were stored before it was recorded)
+    """
+    memory = []
+    comparable = []
+    store = ResultsStore(problems_type)
+    for solver in solvers:
+        try:
+            df = store.read(solver, columns=['status', field,
+                                             'fresh_process'],
+                            classes=problems)
+        except (KeyError, ValueError):
+            print("No %s in the results of %s" % (field, solver))
+            return False
+        if len(df) and df[field].isna().all():
+            print("No %s in the results of %s" % (field, solver))
+            return False
+        solved = df['status'].isin(statuses.SOLUTION_PRESENT).values & \
+            df[field].notna().values
+        memory.append(np.where(solved,
+                               np.maximum(df[field].values.astype(float),
+                                          MIN_MEMORY),
+                               np.inf))
+        comparable.append(~solved | (df['fresh_process'] == True).values)
+    memory = np.column_stack(memory)
+
+    # Problems measured in processes that were not fresh are left out and
+    # the problems that no solver solved do not change the profiles
+    comparable = np.column_stack(comparable).all(axis=1)
+    memory = memory[comparable & np.isfinite(memory).any(axis=1)]
+    if not len(memory):
+        print("No %s measured in fresh processes" % field)
+        return False
+
+    _save_performance_profiles(solvers, problems_type, memory, tau_vec,
+                               'memory_performance_profiles.csv')
+    return True
+
+
 def geom_mean(t, shift=10.):
     """Compute the shifted geometric mean using formula from
     http://plato.asu.edu/ftp/shgeom.html
@@ -134,7 +223,7 @@ def geom_mean(t, shift=10.):
     return np.exp(np.sum(np.log(np.maximum(1, t + shift))/len(t))) - shift
 
 
-def compute_shifted_geometric_means(solvers, problems_type):
+def compute_shifted_geometric_means(solvers, problems_type, problems=None):
     t = {}
     status = {}
     g_mean = {}
@@ -146,16 +235,16 @@ def compute_shifted_geometric_means(solvers, problems_type):
             solvers.remove(s)
 
     # Get time and status
+    store = ResultsStore(problems_type)
     for solver in solvers:
-        path = os.path.join('.', 'results', problems_type,
-                            solver, 'results.csv')
-        df = pd.read_csv(path)
+        df = store.read(solver, columns=['status', 'run_time'],
+                        classes=problems)
 
         # Get total number of problems
         n_problems = len(df)
 
         # NB. Normalize to avoid overflow. They get normalized back anyway.
-        t[solver] = df['run_time'].values
+        t[solver] = df['run_time'].values.copy()
         status[solver] = df['status'].values
 
         # Set maximum time for solvers that did not succeed
@@ -214,7 +303,7 @@ def compute_shifted_geometric_means(solvers, problems_type):
     # df_performance_profiles.to_csv(performance_profiles_file, index=False)
 
 
-def compute_failure_rates(solvers, problems_type):
+def compute_failure_rates(solvers, problems_type, problems=None):
     """
     Compute and show failure rates
     """
@@ -228,10 +317,9 @@ def compute_failure_rates(solvers, problems_type):
 
     # Check if results file already exists
     failure_rates_file = os.path.join(".", "results", problems_type, "failure_rates.csv")
+    store = ResultsStore(problems_type)
     for solver in solvers:
-        results_file = os.path.join('.', 'results', problems_type,
-                                    solver, 'results.csv')
-        df = pd.read_csv(results_file)
+        df = store.read(solver, columns=['status'], classes=problems)
 
         n_problems = len(df)
 
@@ -245,21 +333,22 @@ def compute_failure_rates(solvers, problems_type):
     df_failure_rates.to_frame().transpose().to_csv(failure_rates_file, index=False)
 
 
-def compute_polish_statistics(problems_type, high_accuracy=False):
+def compute_polish_statistics(problems_type, high_accuracy=False,
+                              problems=None):
     name_high = "_high" if high_accuracy else ""
 
     # Check if results file already exists
     polish_file = os.path.join(".", "results", problems_type,
             "polish_statistics.csv")
-    # Path where solver results are stored
-    path_osqp = os.path.join('.', 'results', problems_type,
-                             "OSQP" + name_high, 'results.csv')
-    path_osqp_polish = os.path.join('.', 'results', problems_type,
-                                    'OSQP_polish' + name_high, 'results.csv')
 
     # Load data frames
-    df_osqp = pd.read_csv(path_osqp)
-    df_osqp_polish = pd.read_csv(path_osqp_polish)
+    store = ResultsStore(problems_type)
+    df_osqp = store.read("OSQP" + name_high,
+                         columns=['status', 'run_time'],
+                         classes=problems)
+    df_osqp_polish = store.read("OSQP_polish" + name_high,
+                                columns=['run_time', 'status_polish'],
+                                classes=problems)
 
     # Take only problems where osqp has success
     successful_problems = df_osqp['status'] == statuses.OPTIMAL
@@ -286,17 +375,18 @@ def compute_polish_statistics(problems_type, high_accuracy=False):
     df_polish.to_frame().transpose().to_csv(polish_file, index=False)
 
 
-def compute_ratio_setup_solve(problems_type, high_accuracy=False):
+def compute_ratio_setup_solve(problems_type, high_accuracy=False,
+                              problems=None):
     name_high = "_high" if high_accuracy else ""
 
     # Check if results file already exists
     ratio_file = os.path.join(".", "results", problems_type,
             "ratio_setup_solve.csv")
-    # Path where solver results are stored
-    path_osqp = os.path.join('.', 'results', problems_type,
-                             "OSQP" + name_high, 'results.csv')
+
     # Load data frames
-    df_osqp = pd.read_csv(path_osqp)
+    df_osqp = ResultsStore(problems_type).read(
+        "OSQP" + name_high, columns=['status', 'setup_time', 'solve_time'],
+        classes=problems)
 
     # Take only problems where osqp has success
     successful_problems = df_osqp['status'] == statuses.OPTIMAL
@@ -319,17 +409,18 @@ def compute_ratio_setup_solve(problems_type, high_accuracy=False):
     df_ratio.to_frame().transpose().to_csv(ratio_file, index=False)
 
 
-def compute_rho_updates(problems_type, high_accuracy=False):
+def compute_rho_updates(problems_type, high_accuracy=False,
+                        problems=None):
     name_high = "_high" if high_accuracy else ""
 
     # Check if results file already exists
     rho_updates_file = os.path.join(".", "results", problems_type,
             "rho_updates.csv")
-    # Path where solver results are stored
-    path_osqp = os.path.join('.', 'results', problems_type,
-                             "OSQP" + name_high, 'results.csv')
+
     # Load data frames
-    df_osqp = pd.read_csv(path_osqp)
+    df_osqp = ResultsStore(problems_type).read(
+        "OSQP" + name_high, columns=['status', 'rho_updates'],
+        classes=problems)
 
     # Take only problems where osqp has success
     successful_problems = df_osqp['status'] == statuses.OPTIMAL
@@ -353,26 +444,35 @@ def compute_stats_info(solvers, benchmark_type,
                        high_accuracy=False,
                        performance_profiles=True):
 
-    if problems is not None:
-        # Collect cumulative data for each solver
-        # If there are multiple problems defined
-        get_cumulative_data(solvers, problems, benchmark_type)
+    # NB. The statistics read from the results store only the columns and
+    # the problem classes they need
 
     # Compute failure rates
-    compute_failure_rates(solvers, benchmark_type)
+    compute_failure_rates(solvers, benchmark_type, problems=problems)
 
     # Compute performance profiles
-    compute_performance_profiles(solvers, benchmark_type)
+    compute_performance_profiles(solvers, benchmark_type, problems=problems)
 
     # Compute performance profiles
-    compute_shifted_geometric_means(solvers, benchmark_type)
+    compute_shifted_geometric_means(solvers, benchmark_type,
+                                    problems=problems)
 
     # Compute polish statistics
     if any(s.startswith('OSQP') for s in solvers):
-        compute_polish_statistics(benchmark_type, high_accuracy=high_accuracy)
-        compute_ratio_setup_solve(benchmark_type, high_accuracy=high_accuracy)
-        compute_rho_updates(benchmark_type, high_accuracy=high_accuracy)
+        compute_polish_statistics(benchmark_type, high_accuracy=high_accuracy,
+                                  problems=problems)
+        compute_ratio_setup_solve(benchmark_type, high_accuracy=high_accuracy,
+                                  problems=problems)
+        compute_rho_updates(benchmark_type, high_accuracy=high_accuracy,
+                            problems=problems)
+
+    # Compute memory performance profiles
+    memory_profiles = compute_memory_performance_profiles(
+        solvers, benchmark_type, problems=problems)
 
     # Plot performance profiles
     if performance_profiles:
         plot_performance_profiles(benchmark_type, solvers)
+        if memory_profiles:
+            plot_performance_profiles(benchmark_type, solvers,
+                                      profiles='memory_performance_profiles')
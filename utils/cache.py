@@ -0,0 +1,157 @@
+'''
+On-disk cache of the generated problem instances
+'''
+import os
+import sys
+import hashlib
+import inspect
+import numpy as np
+import scipy.sparse as spa
+from utils.general import make_sure_path_exists
+
+CACHE_FOLDER = os.path.join('.', 'cache', 'problem_instances')
+
+
+# Root folder of the repository
+ROOT_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _local_modules(module):
+    '''
+    Modules of the repository used by module (module included): the
+    modules of its namespace and the modules defining its functions and
+    classes, recursively
+    '''
+    modules = {}
+    stack = [module]
+    while stack:
+        module = stack.pop()
+        if module.__name__ in modules:
+            continue
+        modules[module.__name__] = module
+        for value in vars(module).values():
+            if inspect.isclass(value) or inspect.isfunction(value):
+                value = sys.modules.get(value.__module__)
+            elif not inspect.ismodule(value):
+                continue
+            file_name = getattr(value, '__file__', None)
+            if file_name is not None and os.path.abspath(file_name) \
+                    .startswith(ROOT_FOLDER + os.sep):
+                stack.append(value)
+    return [modules[name] for name in sorted(modules)]
+
+
+def generator_version(example_class):
+    '''
+    Hash of the source code of the module generating the example and of
+    the modules of the repository it uses (e.g. utils.sparse).
+    Any change to the generator invalidates the cached instances.
+    '''
+    h = hashlib.sha1()
+    for module in _local_modules(sys.modules[example_class.__module__]):
+        h.update(module.__name__.encode())
+        h.update(inspect.getsource(module).encode())
+    return h.hexdigest()
+
+
+def cache_file_name(example_class, dimension, seed):
+    '''
+    Name of the file storing the instance (content addressed by class name,
+    dimension, seed and generator version)
+    '''
+    key = repr((example_class.name(), int(dimension), int(seed),
+                generator_version(example_class)))
+    return os.path.join(CACHE_FOLDER,
+                        hashlib.sha1(key.encode()).hexdigest() + '.npz')
+
+
+def save_qp_problem(file_name, qp_problem):
+    '''
+    Store QP problem dictionary as compressed npz file.
+    Sparse matrices are stored as CSC arrays.
+    '''
+    arrays = {}
+    for key, value in qp_problem.items():
+        if spa.issparse(value):
+            value = value.tocsc()
+            arrays[key + '.data'] = value.data
+            arrays[key + '.indices'] = value.indices
+            arrays[key + '.indptr'] = value.indptr
+            arrays[key + '.shape'] = np.array(value.shape)
+        else:
+            arrays[key] = np.asarray(value)
+
+    # Write to a temporary file first so that the processes reading the
+    # cache never see partially written files
+    make_sure_path_exists(os.path.dirname(file_name))
+    tmp_file_name = '%s.%i.tmp.npz' % (file_name[:-4], os.getpid())
+    np.savez_compressed(tmp_file_name, **arrays)
+    os.replace(tmp_file_name, file_name)
+
+
+def load_qp_problem(file_name):
+    '''
+    Load QP problem dictionary stored with save_qp_problem
+    '''
+    qp_problem = {}
+    with np.load(file_name) as f:
+        for key in f.files:
+            if key.endswith('.shape'):
+                name = key[:-6]
+                qp_problem[name] = spa.csc_matrix((f[name + '.data'],
+                                                   f[name + '.indices'],
+                                                   f[name + '.indptr']),
+                                                  shape=tuple(f[key]))
+            elif '.' not in key:
+                value = f[key]
+                qp_problem[key] = value if value.ndim > 0 else value.item()
+    return qp_problem
+
+
+class CachedExample(object):
+    '''
+    Problem instance loaded from the cache
+
+    It contains only the QP problem. Any other attribute (e.g. the CVXPY
+    problem used by ECOS) is taken from the example generated on first
+    access.
+    '''
+    def __init__(self, example_class, dimension, seed, qp_problem):
+        self._example_class = example_class
+        self._dimension = dimension
+        self._seed = seed
+        self._example = None
+        self.name = example_class.name
+        self.qp_problem = qp_problem
+
+    def __getattr__(self, attr):
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        if self._example is None:
+            self._example = self._example_class(self._dimension, self._seed)
+        return getattr(self._example, attr)
+
+
+def generate_example(example_class, dimension, seed):
+    '''
+    Generate the example and store it in the cache if it is not there yet
+    '''
+    file_name = cache_file_name(example_class, dimension, seed)
+    if not os.path.isfile(file_name):
+        example = example_class(dimension, seed)
+        save_qp_problem(file_name, example.qp_problem)
+
+
+def load_example(example_class, dimension, seed):
+    '''
+    Load example from the cache. If it is not there, generate it and store
+    it for the next calls.
+    '''
+    file_name = cache_file_name(example_class, dimension, seed)
+    if os.path.isfile(file_name):
+        return CachedExample(example_class, dimension, seed,
+                             load_qp_problem(file_name))
+
+    example = example_class(dimension, seed)
+    save_qp_problem(file_name, example.qp_problem)
+    return example
@@ -1,11 +1,21 @@
 import numpy as np
 import numpy.linalg as la
+import scipy.sparse as spa
 import solvers.solvers as s
 import errno
+import gc
 import os
+import time
+import tracemalloc
 
 import sys
 from contextlib import contextmanager
+try:
+    from scipy.sparse._sparsetools import csr_matvec, csr_matvecs, \
+        csc_matvec, csc_matvecs
+except ImportError:  # scipy < 1.8
+    from scipy.sparse.sparsetools import csr_matvec, csr_matvecs, \
+        csc_matvec, csc_matvecs
 
 
 
@@ -41,6 +51,41 @@ def stdout_redirected(to=os.devnull):
             _redirect_stdout(to=old_stdout)
 
 
+@contextmanager
+def realtime_process(core=None, disable_gc=True):
+    '''
+    Run a latency benchmark pinned to a single core and without garbage
+    collection pauses
+
+    with realtime_process(core=3):
+        run_control_loop()
+
+    Args:
+        core: core to pin the process to (default the last core the
+              process can run on). Ignored if the platform does not
+              support CPU affinity.
+        disable_gc: disable the garbage collector inside the block
+    '''
+    affinity = None
+    if hasattr(os, 'sched_setaffinity'):
+        affinity = os.sched_getaffinity(0)
+        if core is None:
+            core = max(affinity)
+        os.sched_setaffinity(0, {core})
+
+    gc_enabled = gc.isenabled()
+    if disable_gc:
+        gc.collect()
+        gc.disable()
+    try:
+        yield
+    finally:
+        if gc_enabled:
+            gc.enable()
+        if affinity is not None:
+            os.sched_setaffinity(0, affinity)
+
+
 # Function to create directories
 def make_sure_path_exists(path):
     try:
@@ -51,6 +96,155 @@ def make_sure_path_exists(path):
             raise
 
 
+class PhaseTimer(object):
+    '''
+    Wall-clock timer of the consecutive phases of a solve
+
+        timer = PhaseTimer()
+        timer.start('build')
+        ...
+        timer.start('solve')  # Stops 'build'
+        ...
+        times = timer.stop()
+    '''
+    def __init__(self):
+        self.times = {}
+        self._phase = None
+        self._start = None
+
+    def start(self, phase):
+        '''
+        Stop the current phase and start timing phase
+        '''
+        self.stop()
+        self._phase = phase
+        self._start = time.perf_counter()
+
+    def stop(self):
+        '''
+        Stop the current phase and return the dictionary of times
+        '''
+        if self._phase is not None:
+            self.times[self._phase] = self.times.get(self._phase, 0.) + \
+                time.perf_counter() - self._start
+            self._phase = None
+        return self.times
+
+
+def _proc_status_bytes(field):
+    '''
+    Value of field (e.g. VmRSS) of /proc/self/status in bytes (None if
+    not available)
+    '''
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def _max_rss_bytes():
+    '''
+    Maximum resident set size of the process over its lifetime in bytes
+    '''
+    import resource
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == 'darwin' else 1024 * max_rss
+
+
+class MemoryTracker(object):
+    '''
+    Peak memory of the process during a block of code
+
+        tracker = MemoryTracker()
+        tracker.start()
+        ...
+        memory = tracker.stop()
+
+    The peak RSS delta is the high-water mark of the resident set size
+    minus the resident set size at start. It includes the memory of the
+    solver libraries. On Linux the high-water mark is reset at start;
+    elsewhere it is the increase of the lifetime maximum of the process
+    (0 if the block does not exceed it). Reading it costs two reads of
+    /proc/self at start and stop and does not affect the timings.
+
+    Memory already held by the process at start is not counted: a solve
+    that reuses an OSQP workspace of the pool (see solvers.osqp) does not
+    allocate the factorization again and has a smaller delta than a new
+    setup. The peak_rss_delta of the OSQP solvers is then not comparable
+    with the one of the other solvers (see the workspace_reused field).
+    In the same way, the heap kept by the allocator after the previous
+    blocks of the same process lowers the delta of the next ones, which
+    then depends on the order of the tasks in the worker. The
+    fresh_process field is True only for the first block tracked in the
+    process (e.g. every task in sandbox mode or the first task of a
+    worker): only those measurements are comparable across solvers.
+
+    The peak tracemalloc is the peak of the Python allocations (numpy
+    arrays included) above the ones at start. Tracing slows down every
+    Python allocation in the block and biases the timings of the solve,
+    so it is only measured with trace_python (NaN otherwise).
+    '''
+    FIELDS = ['peak_rss_delta', 'peak_tracemalloc', 'fresh_process']
+
+    # A block was already tracked in this process
+    _tracked = False
+
+    def __init__(self, trace_python=False):
+        self.trace_python = trace_python
+        self._fresh = None
+        self._rss = None
+        self._tracing = None
+        self._traced = None
+
+    def start(self):
+        '''
+        Start tracking the memory
+        '''
+        self._fresh = not MemoryTracker._tracked
+        MemoryTracker._tracked = True
+
+        # Reset the high-water mark of the resident set size
+        try:
+            with open('/proc/self/clear_refs', 'w') as f:
+                f.write('5')
+            self._rss = _proc_status_bytes('VmRSS')
+        except OSError:
+            self._rss = None
+        if self._rss is None:
+            self._rss = _max_rss_bytes()
+
+        # Start tracing the Python allocations (if not already tracing)
+        if self.trace_python:
+            self._tracing = tracemalloc.is_tracing()
+            if not self._tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            self._traced = tracemalloc.get_traced_memory()[0]
+
+    def stop(self):
+        '''
+        Stop tracking the memory and return the dictionary of the peaks
+        in bytes
+        '''
+        peak_traced = np.nan
+        if self.trace_python:
+            peak_traced = tracemalloc.get_traced_memory()[1] - self._traced
+            if not self._tracing:
+                tracemalloc.stop()
+
+        peak_rss = _proc_status_bytes('VmHWM')
+        if peak_rss is None:
+            peak_rss = _max_rss_bytes()
+
+        return {'peak_rss_delta': max(peak_rss - self._rss, 0),
+                'peak_tracemalloc': peak_traced,
+                'fresh_process': self._fresh}
+
+
 def gen_int_log_space(min_val, limit, n):
     result = [1]
     if n > 1:  # just a check to avoid ZeroDivisionError
@@ -72,68 +266,267 @@ def gen_int_log_space(min_val, limit, n):
                     dtype=int)
 
 
-def is_qp_solution_optimal(qp_problem, x, y, high_accuracy=False):
+def _csc_matvec(M, x, out=None, transpose=False):
     '''
-    Check optimality condition of the QP given the
-    primal-dual solution (x, y) and the tolerance eps
+    Compute out = M x (or M' x) with M in CSC format
+
+    M' x uses the arrays of M as the CSR arrays of M' (no transpose is
+    formed).
     '''
-    if high_accuracy:
-        eps_abs = s.eps_high
-        eps_rel = s.eps_high
+    m, n = M.shape
+    if transpose:
+        m, n = n, m
+    if out is None:
+        out = np.zeros(m)
     else:
-        eps_abs=s.eps_low
-        eps_rel=s.eps_low
+        out.fill(0.)
+    matvec = csr_matvec if transpose else csc_matvec
+    matvec(m, n, M.indptr, M.indices, M.data, x, out)
+    return out
 
-    # Get problem matrices
-    P = qp_problem['P']
-    q = qp_problem['q']
-    A = qp_problem['A']
-    l = qp_problem['l']
-    u = qp_problem['u']
 
-    # Check primal feasibility
-    Ax = A.dot(x)
-    eps_pri = eps_abs + eps_rel * la.norm(Ax, np.inf)
-    pri_res = np.minimum(Ax - l, 0) + np.maximum(Ax - u, 0)
+def _csc_matmat(M, X, transpose=False):
+    '''
+    Compute M X (or M' X) with M in CSC format and X dense (columns are
+    vectors)
+    '''
+    m, n = M.shape
+    if transpose:
+        m, n = n, m
+    k = X.shape[1]
+    out = np.zeros((m, k))
+    matvecs = csr_matvecs if transpose else csc_matvecs
+    matvecs(m, n, k, M.indptr, M.indices, M.data, X.ravel(), out.ravel())
+    return out
+
 
-    if la.norm(pri_res, np.inf) > eps_pri:
-        print("Error in primal residual: %.4e > %.4e" %
-              (la.norm(pri_res, np.inf), eps_pri))
+def _as_csc(M):
+    '''
+    M as a CSC matrix of floats (no copy if it already is one)
+    '''
+    return spa.csc_matrix(M, dtype=float)
+
+
+def _check_optimality(P, A, q, l, u, x, y, high_accuracy,
+                      q_norm=None, buffers=(None, None, None)):
+    '''
+    Check the primal and dual residuals of (x, y) with P and A in CSC
+    format. The dual residual is not computed if the primal check fails.
+    '''
+    eps_abs, eps_rel = _tolerances(high_accuracy)
+    x = np.ascontiguousarray(x, dtype=float)
+    Ax_out, Px_out, Aty_out = buffers
+
+    # Check primal feasibility
+    Ax = _csc_matvec(A, x, Ax_out)
+    eps_pri = eps_abs + eps_rel * _inf_norm(Ax)
+    pri_res = max(_inf_norm(np.minimum(Ax - l, 0.)),
+                  _inf_norm(np.maximum(Ax - u, 0.)))
+    if pri_res > eps_pri:
+        print("Error in primal residual: %.4e > %.4e" % (pri_res, eps_pri))
         return False
 
     # Check dual feasibility
-    Px = P.dot(x)
-    Aty = A.T.dot(y)
-    eps_dua = eps_abs + eps_rel * np.max([la.norm(Px, np.inf),
-                                          la.norm(q, np.inf),
-                                          la.norm(Aty, np.inf)])
-    dua_res = Px + q + Aty
-
-    if la.norm(dua_res, np.inf) > eps_dua:
-        print("Error in dual residual: %.4e > %.4e" %
-              (la.norm(dua_res, np.inf), eps_dua))
+    y = np.ascontiguousarray(y, dtype=float)
+    Px = _csc_matvec(P, x, Px_out)
+    Aty = _csc_matvec(A, y, Aty_out, transpose=True)
+    if q_norm is None:
+        q_norm = _inf_norm(q)
+    eps_dua = eps_abs + eps_rel * max(_inf_norm(Px), q_norm, _inf_norm(Aty))
+    dua_res = Px + q
+    dua_res += Aty
+    dua_res = _inf_norm(dua_res)
+    if dua_res > eps_dua:
+        print("Error in dual residual: %.4e > %.4e" % (dua_res, eps_dua))
         return False
 
-    # Check complementary slackness (REMOVED, not compatible with IP methods)
-    #  y_plus = np.maximum(y, 0)
-    #  y_minus = np.minimum(y, 0)
-    #
-    #  eps_comp = eps_abs + eps_rel * np.max([la.norm(Ax, np.inf)])
-    #
-    #  comp_res_u = np.minimum(y_plus, np.abs(u - Ax))
-    #  comp_res_l = np.minimum(-y_minus, np.abs(Ax - l))
-    #
-    #  if la.norm(comp_res_l, np.inf) > eps_comp:
-    #      print("Error in complementary slackness residual l: %.4e > %.4e" %
-    #            (la.norm(comp_res_l, np.inf), eps_comp))
-    #      return False
-    #
-    #  if la.norm(comp_res_u, np.inf) > eps_comp:
-    #      print("Error in complementary slackness residual u: %.4e > %.4e" %
-    #            (la.norm(comp_res_u, np.inf), eps_comp))
-    #      return False
-
     # If we arrived until here, the solution is optimal
     return True
 
 
+def is_qp_solution_optimal(qp_problem, x, y, high_accuracy=False):
+    '''
+    Check optimality condition of the QP given the
+    primal-dual solution (x, y) and the tolerance eps
+    '''
+    return _check_optimality(_as_csc(qp_problem['P']),
+                             _as_csc(qp_problem['A']),
+                             np.asarray(qp_problem['q'], dtype=float),
+                             qp_problem['l'], qp_problem['u'],
+                             x, y, high_accuracy)
+
+
+def _inf_norm(v):
+    '''
+    Infinity norm of v without allocating temporary arrays
+    '''
+    return max(v.max(initial=0.), -v.min(initial=0.))
+
+
+def _tolerances(high_accuracy):
+    if high_accuracy:
+        return s.eps_high, s.eps_high
+    return s.eps_low, s.eps_low
+
+
+class KKTChecker(object):
+    '''
+    Optimality conditions checker bound to the matrices P and A of a QP
+
+    P and A are kept in CSC format (no copy if they already are) and A'
+    is applied through the arrays of A. The output buffers of the
+    products are created once and reused by every check, so that checking
+    many solutions of problems sharing P and A (e.g. parametric problems)
+    does not allocate new matrices. The vectors q, l and u given to the
+    constructor can be replaced in every check.
+
+    A single check of a solution does not need a checker: use
+    is_qp_solution_optimal.
+
+    NB. The complementary slackness is not checked since it is not
+    compatible with interior point methods. The duality gap is only
+    reported by residuals and batch_residuals.
+    '''
+    def __init__(self, P, A, q, l, u):
+        self.P = _as_csc(P)
+        self.A = _as_csc(A)
+        self.n = self.P.shape[0]
+        self.m = self.A.shape[0]
+        self.q = np.asarray(q, dtype=float)
+        self.l = np.asarray(l, dtype=float)
+        self.u = np.asarray(u, dtype=float)
+        self.q_norm = _inf_norm(self.q)
+
+        # Output buffers
+        self._Ax = np.empty(self.m)
+        self._Px = np.empty(self.n)
+        self._Aty = np.empty(self.n)
+        self._pri_res = np.empty(self.m)
+        self._dua_res = np.empty(self.n)
+
+    @classmethod
+    def from_problem(cls, qp_problem):
+        return cls(qp_problem['P'], qp_problem['A'],
+                   qp_problem['q'], qp_problem['l'], qp_problem['u'])
+
+    def residuals(self, x, y, q=None, l=None, u=None):
+        '''
+        Residuals of the optimality conditions of the primal-dual
+        solution (x, y)
+
+        Args:
+            x: primal solution
+            y: dual solution
+            q, l, u: vectors of the problem (default the ones of the
+                     constructor)
+
+        Returns:
+            dictionary with
+                - 'pri_res': primal residual (infinity norm)
+                - 'dua_res': dual residual (infinity norm)
+                - 'eps_pri': primal tolerance scaling (||Ax||)
+                - 'eps_dua': dual tolerance scaling
+                             (max(||Px||, ||q||, ||A'y||))
+                - 'obj_val': primal objective value
+                - 'gap': duality gap
+        '''
+        q_norm = self.q_norm if q is None else _inf_norm(q)
+        q = self.q if q is None else q
+        l = self.l if l is None else l
+        u = self.u if u is None else u
+        x = np.ascontiguousarray(x, dtype=float)
+        y = np.ascontiguousarray(y, dtype=float)
+
+        Ax = _csc_matvec(self.A, x, self._Ax)
+        Px = _csc_matvec(self.P, x, self._Px)
+        Aty = _csc_matvec(self.A, y, self._Aty, transpose=True)
+
+        # Primal residual Ax - proj_[l, u](Ax)
+        pri_res = np.clip(Ax, l, u, out=self._pri_res)
+        np.subtract(Ax, pri_res, out=pri_res)
+
+        # Dual residual Px + q + A'y
+        dua_res = np.add(Px, q, out=self._dua_res)
+        dua_res += Aty
+
+        # Duality gap
+        xPx = x.dot(Px)
+        qx = q.dot(x)
+        y_plus = y > 0
+        y_minus = y < 0
+        support = u[y_plus].dot(y[y_plus]) + l[y_minus].dot(y[y_minus])
+
+        return {'pri_res': _inf_norm(pri_res),
+                'dua_res': _inf_norm(dua_res),
+                'eps_pri': _inf_norm(Ax),
+                'eps_dua': max(_inf_norm(Px), q_norm, _inf_norm(Aty)),
+                'obj_val': .5 * xPx + qx,
+                'gap': np.abs(xPx + qx + support)}
+
+    def is_optimal(self, x, y, high_accuracy=False, q=None, l=None, u=None):
+        '''
+        Check optimality condition of the QP given the
+        primal-dual solution (x, y) and the tolerance eps
+        '''
+        return _check_optimality(
+            self.P, self.A,
+            self.q if q is None else q,
+            self.l if l is None else l,
+            self.u if u is None else u,
+            x, y, high_accuracy,
+            q_norm=self.q_norm if q is None else None,
+            buffers=(self._Ax, self._Px, self._Aty))
+
+    def batch_residuals(self, X, Y, Q=None, L=None, U=None,
+                        high_accuracy=False):
+        '''
+        Residuals of the optimality conditions of k primal-dual solutions
+        at once with sparse-dense matrix products
+
+        Args:
+            X: (n x k) matrix of primal solutions
+            Y: (m x k) matrix of dual solutions
+            Q, L, U: (n x k) and (m x k) matrices or vectors of the
+                     problems (default the vectors of the constructor)
+            high_accuracy: tolerances used for the 'optimal' field
+
+        Returns:
+            dictionary with the fields of residuals as arrays of length k
+            and 'optimal' boolean array
+        '''
+        def as_matrix(V, default):
+            V = default if V is None else np.asarray(V, dtype=float)
+            return V[:, None] if V.ndim == 1 else V
+
+        Q = as_matrix(Q, self.q)
+        L = as_matrix(L, self.l)
+        U = as_matrix(U, self.u)
+        X = np.ascontiguousarray(X, dtype=float)
+        Y = np.ascontiguousarray(Y, dtype=float)
+
+        AX = _csc_matmat(self.A, X)
+        PX = _csc_matmat(self.P, X)
+        AtY = _csc_matmat(self.A, Y, transpose=True)
+
+        # Objective values and duality gaps
+        xPx = np.einsum('ij,ij->j', X, PX)
+        qx = np.einsum('ij,ij->j', np.broadcast_to(Q, X.shape), X)
+        support = (np.where(Y > 0, U, 0.) * Y).sum(axis=0) + \
+            (np.where(Y < 0, L, 0.) * Y).sum(axis=0)
+
+        res = {'pri_res': np.abs(AX - np.clip(AX, L, U)).max(axis=0,
+                                                             initial=0.),
+               'dua_res': np.abs(PX + Q + AtY).max(axis=0, initial=0.),
+               'eps_pri': np.abs(AX).max(axis=0, initial=0.),
+               'eps_dua': np.maximum(np.maximum(
+                   np.abs(PX).max(axis=0, initial=0.),
+                   np.abs(Q).max(axis=0, initial=0.)),
+                   np.abs(AtY).max(axis=0, initial=0.)),
+               'obj_val': .5 * xPx + qx,
+               'gap': np.abs(xPx + qx + support)}
+
+        eps_abs, eps_rel = _tolerances(high_accuracy)
+        res['optimal'] = \
+            (res['pri_res'] <= eps_abs + eps_rel * res['eps_pri']) & \
+            (res['dua_res'] <= eps_abs + eps_rel * res['eps_dua'])
+        return res
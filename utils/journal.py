@@ -0,0 +1,62 @@
+'''
+Journal of the completed benchmark tasks
+'''
+import os
+import pickle
+import sqlite3
+from utils.general import make_sure_path_exists
+
+JOURNAL_FILE = 'journal.sqlite'
+
+
+class TaskJournal(object):
+    '''
+    Append-only journal of the results of the single tasks of a benchmark
+
+        ./results/{benchmark}/journal.sqlite
+
+    Every result is committed as soon as its task returns. A run
+    interrupted by a crash can then be restarted solving only the tasks
+    missing from the journal. The results are removed from the journal
+    once they are in the results store.
+    '''
+    def __init__(self, benchmark):
+        path = os.path.join('.', 'results', benchmark)
+        make_sure_path_exists(path)
+        self.file_name = os.path.join(path, JOURNAL_FILE)
+        self.conn = sqlite3.connect(self.file_name)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS results '
+                          '(key TEXT PRIMARY KEY, result BLOB)')
+        self.conn.commit()
+
+    def get(self, key):
+        '''
+        Result of the task identified by key (None if not in the journal)
+
+        Args:
+            key: tuple of strings and integers identifying the task
+        '''
+        row = self.conn.execute('SELECT result FROM results WHERE key = ?',
+                                (repr(key),)).fetchone()
+        if row is None:
+            return None
+        return pickle.loads(row[0])
+
+    def add(self, key, result):
+        '''
+        Record the result of the task identified by key
+        '''
+        self.conn.execute('INSERT OR REPLACE INTO results VALUES (?, ?)',
+                          (repr(key), pickle.dumps(result)))
+        self.conn.commit()
+
+    def remove(self, keys):
+        '''
+        Remove the results of the tasks identified by keys
+        '''
+        self.conn.executemany('DELETE FROM results WHERE key = ?',
+                              [(repr(key),) for key in keys])
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,168 @@
+'''
+Packed binary store of problem collections
+
+All the problems of a collection are stored in three contiguous arrays
+
+    data.npy      float values (nonzeros of the matrices and vectors)
+    indices.npy   row indices of the CSC matrices
+    indptr.npy    column pointers of the CSC matrices
+
+plus an index.json file with the offsets of the arrays of each problem.
+The arrays are memory mapped so that opening a problem does not copy its
+matrices.
+'''
+import os
+import json
+import numpy as np
+import scipy.sparse as spa
+from utils.general import make_sure_path_exists
+
+INDEX_FILE = 'index.json'
+ARRAYS = {'data': np.float64,
+          'indices': np.int32,
+          'indptr': np.int32}
+
+# Stores opened by this process
+_stores = {}
+
+
+def _source_stamp(file_name):
+    '''
+    Size and modification time of the source file of a problem
+    '''
+    stat = os.stat(file_name)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _read_index(folder):
+    index_file = os.path.join(folder, INDEX_FILE)
+    if not os.path.isfile(index_file):
+        return None
+    with open(index_file, 'r') as f:
+        return json.load(f)
+
+
+def pack_problems(folder, file_names, load_problem):
+    '''
+    Pack the problems into the store in folder. Nothing is done if the
+    store already contains all the problems and their source files did not
+    change.
+
+    Args:
+        folder: store folder
+        file_names: dictionary mapping problem names to their source files
+        load_problem: function returning the problem dictionary stored in a
+                      source file (sparse matrices, vectors and scalars)
+    '''
+    index = _read_index(folder)
+    if index is not None and \
+            all(name in index and
+                index[name]['source'] == _source_stamp(file_name)
+                for name, file_name in file_names.items()):
+        return
+
+    print("Packing %i problems into %s" % (len(file_names), folder))
+
+    arrays = {array: [] for array in ARRAYS}
+    sizes = {array: 0 for array in ARRAYS}
+
+    def append(array, values):
+        '''
+        Append values to array and return their [offset, length]
+        '''
+        values = np.asarray(values, dtype=ARRAYS[array]).ravel()
+        arrays[array].append(values)
+        sizes[array] += len(values)
+        return [sizes[array] - len(values), len(values)]
+
+    index = {}
+    for name, file_name in sorted(file_names.items()):
+        problem = load_problem(file_name)
+        entry = {'source': _source_stamp(file_name)}
+        for key, value in problem.items():
+            if spa.issparse(value):
+                value = value.tocsc()
+                entry[key] = {'shape': list(value.shape),
+                              'data': append('data', value.data),
+                              'indices': append('indices', value.indices),
+                              'indptr': append('indptr', value.indptr)}
+            elif np.ndim(value) > 0:
+                entry[key] = {'data': append('data', value)}
+            else:
+                entry[key] = value.item() if hasattr(value, 'item') \
+                    else value
+        index[name] = entry
+
+    # Write to temporary files first. The index is written last so that a
+    # store interrupted while packing gets packed again.
+    make_sure_path_exists(folder)
+    index_file = os.path.join(folder, INDEX_FILE)
+    if os.path.isfile(index_file):
+        os.remove(index_file)
+    for array, dtype in ARRAYS.items():
+        file_name = os.path.join(folder, array + '.npy')
+        values = np.concatenate(arrays[array]) if arrays[array] \
+            else np.empty(0, dtype=dtype)
+        np.save(file_name + '.tmp.npy', values)
+        os.replace(file_name + '.tmp.npy', file_name)
+    with open(index_file + '.tmp', 'w') as f:
+        json.dump(index, f)
+    os.replace(index_file + '.tmp', index_file)
+
+    _stores.pop(folder, None)
+
+
+def open_packed(folder):
+    '''
+    Open the store in folder once per process (None if it does not exist)
+    '''
+    if folder not in _stores:
+        index = _read_index(folder)
+        if index is None:
+            return None
+        _stores[folder] = PackedProblems(folder, index)
+    return _stores[folder]
+
+
+class PackedProblems(object):
+    '''
+    Problems packed with pack_problems
+    '''
+    def __init__(self, folder, index):
+        self.folder = folder
+        self.index = index
+        self.arrays = {array: np.load(os.path.join(folder, array + '.npy'),
+                                      mmap_mode='r')
+                       for array in ARRAYS}
+
+    def is_current(self, name, file_name):
+        '''
+        Check if the problem is packed and its source file did not change
+        '''
+        return name in self.index and \
+            self.index[name]['source'] == _source_stamp(file_name)
+
+    def _slice(self, array, location):
+        offset, length = location
+        return self.arrays[array][offset:offset + length]
+
+    def load(self, name):
+        '''
+        Load the problem dictionary. The sparse matrices are views of the
+        memory mapped arrays (read-only) while the vectors are copied.
+        '''
+        problem = {}
+        for key, entry in self.index[name].items():
+            if key == 'source':
+                continue
+            if not isinstance(entry, dict):
+                problem[key] = entry
+            elif 'shape' in entry:
+                problem[key] = spa.csc_matrix(
+                    (self._slice('data', entry['data']),
+                     self._slice('indices', entry['indices']),
+                     self._slice('indptr', entry['indptr'])),
+                    shape=tuple(entry['shape']))
+            else:
+                problem[key] = np.array(self._slice('data', entry['data']))
+        return problem
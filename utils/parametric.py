@@ -1,5 +1,280 @@
 import os
+import numpy as np
 import pandas as pd
+from utils.general import KKTChecker
+
+# Fields of the KKT check added to the results of a sweep
+SWEEP_FIELDS = ['obj_val', 'pri_res', 'dua_res', 'gap', 'optimal']
+
+
+def parametric_results_file(problem, dimension, warm_start):
+    '''
+    File with the results of a parametric problem solved with or without
+    warm start
+
+        ./results/parametric_problems/OSQP [no ]warmstart/{problem}/n{dim}.csv
+    '''
+    return os.path.join('.', 'results', 'parametric_problems',
+                        'OSQP warmstart' if warm_start
+                        else 'OSQP no warmstart',
+                        problem,
+                        'n%i.csv' % dimension)
+
+
+def latency_results_file(problem, dimension):
+    '''
+    File with the step latencies of a parametric problem in latency mode
+
+        ./results/parametric_problems/latency/{problem}/n{dim}.csv
+    '''
+    return os.path.join('.', 'results', 'parametric_problems', 'latency',
+                        problem, 'n%i.csv' % dimension)
+
+
+# Percentiles of the latency statistics
+LATENCY_PERCENTILES = [50, 90, 95, 99, 99.9, 99.99]
+
+# Resolution of the latency histograms (buckets per decade). The width of
+# every bucket is about 1% of its values as in HDR histograms.
+HISTOGRAM_BUCKETS_PER_DECADE = 200
+
+
+def latency_statistics(latency):
+    '''
+    Statistics of the latencies of a control loop
+
+    Returns:
+        dictionary with mean, jitter (standard deviation), min, max and
+        the LATENCY_PERCENTILES ('p50', 'p99.9', ...)
+    '''
+    latency = np.asarray(latency, dtype=float)
+    stats = {'samples': len(latency),
+             'mean': latency.mean(),
+             'jitter': latency.std(),
+             'min': latency.min(),
+             'max': latency.max()}
+    for p, value in zip(LATENCY_PERCENTILES,
+                        np.percentile(latency, LATENCY_PERCENTILES)):
+        stats['p%g' % p] = value
+    return stats
+
+
+def latency_histogram(latency,
+                      buckets_per_decade=HISTOGRAM_BUCKETS_PER_DECADE):
+    '''
+    Histogram of the latencies with logarithmically spaced buckets
+
+    Returns:
+        dataframe with the nonempty buckets and fields
+            - 'lower', 'upper': bucket limits
+            - 'count': number of samples in the bucket
+            - 'cumulative': fraction of samples up to the bucket
+    '''
+    latency = np.asarray(latency, dtype=float)
+    latency = latency[latency > 0]
+    log_latency = np.log10(latency) * buckets_per_decade
+    first = int(np.floor(log_latency.min()))
+    buckets = np.floor(log_latency).astype(np.int64) - first
+    counts = np.bincount(buckets)
+    nonempty = np.flatnonzero(counts)
+    return pd.DataFrame({
+        'lower': 10. ** ((first + nonempty) / buckets_per_decade),
+        'upper': 10. ** ((first + nonempty + 1) / buckets_per_decade),
+        'count': counts[nonempty],
+        'cumulative': np.cumsum(counts)[nonempty] / len(latency)})
+
+
+def compute_latency_parametric(problem, dimensions):
+    '''
+    Compute the latency statistics and histograms of the parametric
+    problem in latency mode for every dimension
+
+        ./results/parametric_problems/latency_{problem}.csv
+        ./results/parametric_problems/latency_{problem}_histogram.csv
+
+    The statistics are computed for the wall-clock latency of the whole
+    control step ('latency') and for the OSQP run time ('run_time').
+    '''
+    row_list = []
+    histogram_list = []
+    for d in dimensions:
+        df = pd.read_csv(latency_results_file(problem, d))
+        for field in ['latency', 'run_time']:
+            stats = {'problem': problem, 'dimension': d, 'field': field}
+            stats.update(latency_statistics(df[field]))
+            row_list.append(stats)
+        histogram = latency_histogram(df['latency'])
+        histogram.insert(0, 'dimension', d)
+        histogram_list.append(histogram)
+
+    path = os.path.join('.', 'results', 'parametric_problems')
+    statistics_file = os.path.join(path, 'latency_%s.csv' % problem.lower())
+    print("Saving latency statistics to file %s" % statistics_file)
+    pd.DataFrame(row_list).to_csv(statistics_file, index=False)
+    pd.concat(histogram_list).to_csv(
+        os.path.join(path, 'latency_%s_histogram.csv' % problem.lower()),
+        index=False)
+
+
+class SolveRecorder(object):
+    '''
+    Metrics of the OSQP solves of a parametric sweep
+
+    The metrics are written into a structured array preallocated for all
+    the steps instead of creating a dataframe per solve. The status is
+    recorded as its integer code and converted back to its name only when
+    the results are saved.
+    '''
+    # Fields of the OSQP info recorded at every solve
+    FIELDS = [('status_val', np.int64),
+              ('run_time', np.float64),
+              ('iter', np.int64),
+              ('obj_val', np.float64),
+              ('setup_time', np.float64),
+              ('solve_time', np.float64),
+              ('update_time', np.float64)]
+
+    def __init__(self, n_steps):
+        self.data = np.zeros(n_steps, dtype=self.FIELDS)
+        self.k = 0
+        self.statuses = {}   # status code -> status name
+
+        # Views of the columns created once
+        self._columns = [(name, self.data[name]) for name, _ in self.FIELDS]
+
+    def add(self, info):
+        '''
+        Record the info of the next solve
+        '''
+        k = self.k
+        for name, column in self._columns:
+            column[k] = getattr(info, name)
+        if info.status_val not in self.statuses:
+            self.statuses[info.status_val] = info.status
+        self.k += 1
+
+    def frame(self):
+        '''
+        Dataframe of the recorded solves with fields
+            - 'status': solver status
+            - 'run_time', 'iter', 'obj_val', 'setup_time', 'solve_time',
+              'update_time': OSQP info
+        '''
+        data = self.data[:self.k]
+        df = pd.DataFrame({name: data[name] for name, _ in self.FIELDS[1:]})
+        df.insert(0, 'status', [self.statuses[v] for v in
+                                data['status_val']])
+        return df
+
+    def save(self, file_name, sweep=None):
+        '''
+        Write the recorded solves to the results file adding the KKT check
+        of the sweep (if any)
+        '''
+        df = self.frame()
+        if sweep is not None:
+            df = sweep.add_residuals(df)
+        df.to_csv(file_name, index=False)
+
+
+class ParametricSweep(object):
+    '''
+    Solutions of a sweep of parametric QPs stacked column by column
+
+    The primal and dual solutions and the vectors q, l, u of every step
+    are stored in preallocated (n x k) and (m x k) matrices. Once the sweep
+    is over, the objective values and the KKT residuals of all the steps
+    are computed at once with sparse-dense matrix products instead of one
+    check per solve.
+
+    The matrices P and A are shared by consecutive steps. Steps solved
+    after set_matrices use the new matrices (e.g. risk model updates of
+    the portfolio problem).
+    '''
+    def __init__(self, n, m, n_steps):
+        '''
+        Args:
+            n: number of variables
+            m: number of constraints
+            n_steps: number of QPs in the sweep
+        '''
+        self.X = np.empty((n, n_steps))
+        self.Y = np.empty((m, n_steps))
+        self.Q = np.empty((n, n_steps))
+        self.L = np.empty((m, n_steps))
+        self.U = np.empty((m, n_steps))
+        self.k = 0
+        self._segments = []   # (first step, P, A)
+
+    @classmethod
+    def from_problem(cls, qp_problem, n_steps):
+        '''
+        Sweep starting with the matrices of qp_problem
+        '''
+        sweep = cls(qp_problem['n'], qp_problem['m'], n_steps)
+        sweep.set_matrices(qp_problem['P'], qp_problem['A'])
+        return sweep
+
+    def set_matrices(self, P, A):
+        '''
+        Set the matrices of the next steps. They are copied since the
+        problem classes may update their data in place.
+        '''
+        if self._segments and self._segments[-1][0] == self.k:
+            self._segments.pop()
+        self._segments.append((self.k, P.copy(), A.copy()))
+
+    def add(self, x, y, q, l, u):
+        '''
+        Record the solution (x, y) of the next step with vectors q, l, u.
+        Missing solutions (None) are stored as NaN.
+        '''
+        k = self.k
+        self.X[:, k] = np.asarray(x, dtype=float)
+        self.Y[:, k] = np.asarray(y, dtype=float)
+        self.Q[:, k] = q
+        self.L[:, k] = l
+        self.U[:, k] = u
+        self.k += 1
+
+    def residuals(self, high_accuracy=False):
+        '''
+        Objective values and KKT residuals of all the steps recorded
+
+        Returns:
+            dictionary of arrays of length k with the fields of
+            KKTChecker.batch_residuals
+        '''
+        ends = [start for (start, _, _) in self._segments[1:]] + [self.k]
+        results = []
+        for (start, P, A), end in zip(self._segments, ends):
+            if start == end:
+                continue
+            checker = KKTChecker(P, A, self.Q[:, start], self.L[:, start],
+                                 self.U[:, start])
+            results.append(checker.batch_residuals(
+                self.X[:, start:end], self.Y[:, start:end],
+                Q=self.Q[:, start:end],
+                L=self.L[:, start:end],
+                U=self.U[:, start:end],
+                high_accuracy=high_accuracy))
+        if not results:
+            return {}
+        return {key: np.concatenate([r[key] for r in results])
+                for key in results[0]}
+
+    def add_residuals(self, df, high_accuracy=False):
+        '''
+        Add the SWEEP_FIELDS of every step to the results dataframe df
+        (one row per step). Columns already in df are kept.
+        '''
+        df = df.reset_index(drop=True)
+        res = self.residuals(high_accuracy)
+        for key in SWEEP_FIELDS:
+            if key not in df.columns:
+                df[key] = res[key]
+        return df
+
 
 
 def print_results_parametric(problem, dimension):
@@ -7,16 +282,8 @@ def print_results_parametric(problem, dimension):
     Print parametric problem results
     """
     print('[%s]' % problem)
-    ws_file = os.path.join('.', 'results', 'parametric_problems',
-                           'OSQP warmstart',
-                           problem,
-                           'n%i.csv' % dimension
-                           )
-    no_ws_file = os.path.join('.', 'results', 'parametric_problems',
-                              'OSQP no warmstart',
-                              problem,
-                              'n%i.csv' % dimension
-                              )
+    ws_file = parametric_results_file(problem, dimension, True)
+    no_ws_file = parametric_results_file(problem, dimension, False)
 
     no_ws_df = pd.read_csv(no_ws_file)
     ws_df = pd.read_csv(ws_file)
@@ -58,16 +325,8 @@ def compute_results_parametric(problems, dimensions):
                                             "statistics_%s.csv" % p.lower())
         row_list_prob = []
         for d in dimensions[p]:
-            ws_file = os.path.join('.', 'results', 'parametric_problems',
-                                   'OSQP warmstart',
-                                   p,
-                                   'n%i.csv' % d
-                                   )
-            no_ws_file = os.path.join('.', 'results', 'parametric_problems',
-                                      'OSQP no warmstart',
-                                      p,
-                                      'n%i.csv' % d
-                                      )
+            ws_file = parametric_results_file(p, d, True)
+            no_ws_file = parametric_results_file(p, d, False)
             no_ws_df = pd.read_csv(no_ws_file)
             ws_df = pd.read_csv(ws_file)
             dict_stats = {
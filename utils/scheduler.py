@@ -0,0 +1,354 @@
+import os
+import time
+import traceback
+from multiprocessing import Pool, Pipe, Process, cpu_count
+from multiprocessing.connection import wait
+import solvers.statuses as statuses
+
+
+def _group_results(args):
+    '''
+    Run a group of tasks one after the other and yield their results
+    with their indices as soon as each task finishes
+    '''
+    function, indices, group_tasks, context = args
+    if context is None:
+        for index, task in zip(indices, group_tasks):
+            yield index, function(*task)
+        return
+    with context():
+        for index, task in zip(indices, group_tasks):
+            yield index, function(*task)
+
+
+def _run_group(args):
+    '''
+    Run a group of tasks one after the other inside the same worker and
+    return their results with their indices
+    '''
+    return list(_group_results(args))
+
+
+def _run_group_child(conn, args):
+    '''
+    Run a group of tasks inside a child process and send the result of
+    every task back to the parent through conn as soon as it finishes
+    '''
+    try:
+        for _, result in _group_results(args):
+            conn.send((True, result))
+    except BaseException:
+        conn.send((False, traceback.format_exc()))
+    conn.close()
+
+
+# Interval in seconds between the checks of the resident memory of the
+# sandboxed tasks
+MEMORY_POLL_INTERVAL = 0.1
+
+
+def _run_sandboxed_task(conn, function, task, data_limit):
+    '''
+    Run a single task inside a child process and send the result back to
+    the parent through conn. With data_limit, the data segment of the
+    process is limited (used only where the parent cannot read its
+    resident memory).
+    '''
+    if data_limit is not None:
+        import resource
+        resource.setrlimit(resource.RLIMIT_DATA,
+                           (int(data_limit), int(data_limit)))
+    try:
+        conn.send((True, function(*task)))
+    except BaseException:
+        # MemoryError ends up here when the limit is exceeded
+        conn.send((False, traceback.format_exc()))
+    conn.close()
+
+
+def resident_memory(pid):
+    '''
+    Resident set size of the process pid in bytes (None if it cannot be
+    read, e.g. without /proc or after the process exits)
+    '''
+    try:
+        with open('/proc/%i/status' % pid) as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def physical_memory():
+    '''
+    Total physical memory of the node in bytes
+    '''
+    return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+
+
+def run_tasks(function, tasks, costs=None, parallel=True, cores=None,
+              sandbox=False, memory_limit=None, time_limit=None,
+              failure=None, groups=None, group_context=None, memory=None,
+              memory_budget=None):
+    '''
+    Run function(*task) for every task in tasks
+
+    The tasks are placed in a single queue sorted by decreasing estimated
+    cost and handed out one at a time to the workers. In this way the
+    most expensive tasks start first and every worker keeps pulling new
+    tasks until the queue is empty (longest processing time first).
+
+    Tasks with the same group run one after the other in the same worker
+    (e.g. to reuse the solver setup of a problem). The group is placed in
+    the queue with the sum of the costs of its tasks. The tasks of a group
+    run inside group_context() so that the state they share (e.g. the
+    solver setup) is released when the group ends.
+
+    With the estimated peak memory of the tasks, a group starts only if
+    the memory of the groups already running plus its own fits in the
+    memory budget (one group at a time when not parallel). The groups are admitted in queue order: when the next
+    group does not fit, no smaller group overtakes it and it starts as
+    soon as enough memory is released. A group larger than the budget
+    runs alone. Every group runs in a new child process so that its
+    memory is returned to the node when the group finishes. If the child
+    dies (e.g. killed by the OOM killer or by a solver crash), the task
+    it was running gets failure(*task, SOLVER_ERROR) and the other tasks
+    of the group go back to the front of the queue.
+
+    In sandbox mode every task runs in its own child process with a
+    watchdog on its resident memory and wall-clock time. The resident set
+    size of the child (VmRSS in /proc) is read every MEMORY_POLL_INTERVAL
+    seconds and the child is killed when it exceeds memory_limit, so the
+    limit applies to the physical memory used and not to the virtual
+    address space reserved by the solver libraries. Where /proc is not
+    available, the data segment of the child is limited with RLIMIT_DATA
+    instead. A task that crashes, runs out of memory or exceeds the time
+    limit does not take down the other tasks: its result is
+    failure(*task, status) with status SOLVER_ERROR or TIME_LIMIT.
+
+    Args:
+        function: picklable function to be called on each task
+        tasks: list of tuples of arguments for function
+        costs: list of estimated costs of the tasks (same order as tasks)
+        parallel: run the tasks in a pool of worker processes
+        cores: number of worker processes (default all the cores)
+        sandbox: run each task in an isolated child process
+        memory_limit: maximum resident memory of each task in bytes
+                      (sandbox mode only)
+        time_limit: maximum wall-clock time of each task in seconds
+                    (sandbox mode only)
+        failure: function returning the result of a failed task
+                 (sandbox mode or with memory)
+        groups: list of hashable group keys of the tasks (same order as
+                tasks). Tasks with group None run alone. Ignored in
+                sandbox mode.
+        group_context: picklable function returning the context manager
+                       of every group of tasks (not of the tasks with
+                       group None)
+        memory: list of estimated peak memory of the tasks in bytes
+                (same order as tasks). Ignored in sandbox mode.
+        memory_budget: memory available to the running tasks in bytes
+                       (default the physical memory of the node)
+
+    Yields:
+        (index, result) pairs as soon as each task finishes, where index
+        is the position of the task in tasks
+    '''
+    if costs is None:
+        costs = [0.] * len(tasks)
+    if cores is None:
+        cores = cpu_count()
+
+    # Most expensive tasks first
+    order = sorted(range(len(tasks)), key=lambda i: -costs[i])
+
+    if sandbox:
+        queue = [(function, i, tasks[i]) for i in order]
+        for index, result in _run_sandboxed(queue,
+                                            cores if parallel else 1,
+                                            memory_limit, time_limit,
+                                            failure):
+            yield index, result
+        return
+
+    # Groups of tasks sorted by total cost
+    group_indices = {}
+    for i in order:
+        key = i if groups is None or groups[i] is None else (groups[i],)
+        group_indices.setdefault(key, []).append(i)
+    queue = sorted(([function, indices, [tasks[i] for i in indices],
+                     group_context if isinstance(key, tuple) else None]
+                    for (key, indices) in group_indices.items()),
+                   key=lambda g: -sum(costs[i] for i in g[1]))
+
+    if memory is not None and queue:
+        if memory_budget is None:
+            memory_budget = physical_memory()
+        # The peak memory of a group is the one of its largest task
+        group_memory = [max(memory[i] for i in g[1]) for g in queue]
+        for index, result in _run_admitted(queue, group_memory,
+                                           min(cores if parallel else 1,
+                                               len(queue)),
+                                           memory_budget, failure):
+            yield index, result
+    elif parallel and len(queue) > 1:
+        with Pool(processes=min(cores, len(queue))) as pool:
+            # chunksize=1 makes every idle worker get the next group
+            for results in pool.imap_unordered(_run_group, queue,
+                                               chunksize=1):
+                for index, result in results:
+                    yield index, result
+    else:
+        for args in queue:
+            for index, result in _run_group(args):
+                yield index, result
+
+
+def _run_admitted(queue, group_memory, cores, memory_budget, failure):
+    '''
+    Run the queue of groups with at most cores groups at a time and the
+    sum of their memory within memory_budget. Every group runs in its own
+    child process.
+    '''
+    waiting = list(zip(queue, group_memory))[::-1]   # Pop from the end
+    running = {}  # conn -> [process, group, memory, results received]
+
+    try:
+        while waiting or running:
+
+            # Admit the next groups while they fit in the budget
+            while waiting and len(running) < cores:
+                group, required = waiting[-1]
+                used = sum(memory for (_, _, memory, _) in running.values())
+                if running and used + required > memory_budget:
+                    break
+                waiting.pop()
+                conn_parent, conn_child = Pipe(duplex=False)
+                p = Process(target=_run_group_child, args=(conn_child, group))
+                p.start()
+                conn_child.close()
+                running[conn_parent] = [p, group, required, 0]
+
+            # Wait for a result or for a child to finish or die
+            wait(list(running.keys()) +
+                 [p.sentinel for (p, _, _, _) in running.values()])
+
+            for conn in list(running.keys()):
+                p, group, required, received = running[conn]
+                function, indices, group_tasks, context = group
+                alive = p.is_alive()   # Check before polling to avoid races
+                closed = False
+                while conn.poll():
+                    try:
+                        success, result = conn.recv()
+                    except EOFError:
+                        closed = True
+                        break
+                    if not success:
+                        raise RuntimeError("Error in group of tasks: %s" %
+                                           result)
+                    yield indices[received], result
+                    received += 1
+                running[conn][3] = received
+
+                if received < len(indices) and alive and not closed:
+                    continue
+
+                conn.close()
+                p.join()
+                del running[conn]
+                if received == len(indices):
+                    continue
+
+                # The child died while solving the task received
+                print("Error in group of tasks: exit code %s" % p.exitcode)
+                if failure is None:
+                    raise RuntimeError("Worker process died with exit "
+                                       "code %s" % p.exitcode)
+                yield indices[received], failure(*group_tasks[received],
+                                                 statuses.SOLVER_ERROR)
+                if received + 1 < len(indices):
+                    waiting.append(([function, indices[received + 1:],
+                                     group_tasks[received + 1:], context],
+                                    required))
+    finally:
+        # Stop the children still running (e.g. after an error)
+        for (p, _, _, _) in running.values():
+            p.kill()
+            p.join()
+
+
+def _run_sandboxed(queue, cores, memory_limit, time_limit, failure):
+    '''
+    Run the queue of tasks with at most cores child processes at a time
+    '''
+    queue = list(reversed(queue))   # Pop from the end
+    running = {}  # conn -> (process, index, task, start time)
+
+    # Watch the resident memory of the children if it can be read and
+    # limit their data segment otherwise
+    watch_memory = memory_limit is not None and \
+        resident_memory(os.getpid()) is not None
+    data_limit = None if watch_memory else memory_limit
+
+    while queue or running:
+
+        # Start new processes on the free cores
+        while queue and len(running) < cores:
+            function, index, task = queue.pop()
+            conn_parent, conn_child = Pipe(duplex=False)
+            p = Process(target=_run_sandboxed_task,
+                        args=(conn_child, function, task, data_limit))
+            p.start()
+            conn_child.close()
+            running[conn_parent] = (p, index, task, time.time())
+
+        # Wait for a result, a crash, the next deadline or the next check
+        # of the memory
+        timeout = None
+        if time_limit is not None:
+            timeout = max(0., min(start + time_limit
+                                  for (_, _, _, start) in running.values())
+                          - time.time())
+        if watch_memory:
+            timeout = MEMORY_POLL_INTERVAL if timeout is None else \
+                min(timeout, MEMORY_POLL_INTERVAL)
+        wait(list(running.keys()) +
+             [p.sentinel for (p, _, _, _) in running.values()],
+             timeout=timeout)
+
+        for conn in list(running.keys()):
+            p, index, task, start = running[conn]
+            alive = p.is_alive()   # Check before polling to avoid races
+            if conn.poll():
+                try:
+                    success, result = conn.recv()
+                except EOFError:
+                    p.join()
+                    success, result = False, "exit code %s" % p.exitcode
+            elif not alive:
+                # Process died (e.g. segmentation fault)
+                p.join()
+                success, result = False, "exit code %s" % p.exitcode
+            elif time_limit is not None and \
+                    time.time() - start > time_limit:
+                p.kill()
+                success, result = True, failure(*task, statuses.TIME_LIMIT)
+            elif watch_memory and \
+                    (resident_memory(p.pid) or 0) > memory_limit:
+                p.kill()
+                success, result = False, \
+                    "resident memory above %i bytes" % memory_limit
+            else:
+                continue
+
+            if not success:
+                print("Error in sandboxed task: %s" % result)
+                result = failure(*task, statuses.SOLVER_ERROR)
+
+            conn.close()
+            p.join()
+            del running[conn]
+            yield index, result
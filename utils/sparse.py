@@ -0,0 +1,278 @@
+'''
+Sparse matrices stored in HDF5 files (MATLAB v7.3 .mat format)
+'''
+import numpy as np
+import scipy.sparse as spa
+
+
+def hdf5_matrix_header(file_name):
+    '''
+    Dimensions of the matrix A and of the vector b stored in the .mat
+    file file_name, read from the shape of the datasets without loading
+    their data
+
+    Returns:
+        (m, n, nnz) where A is m x n with nnz nonzero elements
+    '''
+    import tables
+    with tables.open_file(file_name) as f:
+        m = int(np.prod(f.root['b'].shape))
+        n = int(np.prod(f.root['A']['jc'].shape)) - 1
+        nnz = int(np.prod(f.root['A']['ir'].shape))
+    return m, n, nnz
+
+
+# Number of entries of the matrix read from the file at a time
+CHUNK_SIZE = 2 ** 22
+
+
+def _index_dtype(*sizes):
+    '''
+    Smallest index type of scipy.sparse for arrays of the given sizes
+    '''
+    return np.int32 if max(sizes) < np.iinfo(np.int32).max else np.int64
+
+
+def augmented_csc_from_hdf5(node, m, n_rows, below=(), columns=(),
+                            chunk_size=CHUNK_SIZE):
+    '''
+    Read the m x n sparse matrix A stored in the HDF5 group node (datasets
+    ir, jc and data) directly into the CSC arrays of the augmented matrix
+
+        M = [A  C_1 ... C_k]
+            [B             ]
+
+    The nonzeros of A are read chunk_size at a time and written to their
+    final position in M so that the peak memory is about the one of M.
+
+    Args:
+        node: HDF5 group with the CSC arrays of A (pytables node)
+        m: number of rows of A
+        n_rows: number of rows of M
+        below: list of (row, value). Every column j of A has value at
+               row + j of M (rows below A)
+        columns: list of column blocks C_i after A as (n_columns, entries)
+                 where entries is a list of (row, value). The k-th column
+                 of the block has value at row + k of M
+
+    Returns:
+        M as a CSC matrix with sorted indices
+    '''
+    below = sorted(below)
+    columns = [(n_cols, sorted(entries)) for (n_cols, entries) in columns]
+
+    jc = node['jc'][:].ravel().astype(np.int64)
+    n = len(jc) - 1
+    nnz = int(jc[-1])
+    n_cols_out = n + sum(n_cols for (n_cols, _) in columns)
+    nnz_out = nnz + n * len(below) + \
+        sum(n_cols * len(entries) for (n_cols, entries) in columns)
+    index_dtype = _index_dtype(nnz_out, n_rows, n_cols_out)
+
+    # Column pointers of M
+    indptr = np.empty(n_cols_out + 1, dtype=index_dtype)
+    indptr[:n + 1] = jc + len(below) * np.arange(n + 1)
+    col = n
+    for (n_cols, entries) in columns:
+        indptr[col + 1:col + n_cols + 1] = indptr[col] + \
+            len(entries) * np.arange(1, n_cols + 1)
+        col += n_cols
+    indices = np.empty(nnz_out, dtype=index_dtype)
+    data = np.empty(nnz_out)
+
+    # Entries of A (shifted by the entries below the previous columns)
+    for start in range(0, nnz, chunk_size):
+        stop = min(start + chunk_size, nnz)
+        if below:
+            k = np.arange(start, stop)
+            pos = k + len(below) * (np.searchsorted(jc, k, side='right') - 1)
+        else:
+            pos = slice(start, stop)
+        indices[pos] = node['ir'][start:stop].ravel()
+        data[pos] = node['data'][start:stop].ravel()
+
+    # Entries below A at the end of its columns
+    for t, (row, value) in enumerate(below):
+        pos = indptr[1:n + 1] - len(below) + t
+        indices[pos] = row + np.arange(n)
+        data[pos] = value
+
+    # Column blocks
+    col = n
+    for (n_cols, entries) in columns:
+        for t, (row, value) in enumerate(entries):
+            pos = indptr[col:col + n_cols] + t
+            indices[pos] = row + np.arange(n_cols)
+            data[pos] = value
+        col += n_cols
+
+    return spa.csc_matrix((data, indices, indptr), shape=(n_rows, n_cols_out))
+
+
+def block_csc(blocks):
+    '''
+    Assemble the block matrix blocks directly in CSC format
+
+    Same as scipy.sparse.bmat(blocks, format='csc') without the COO
+    intermediates: the column pointers are computed from the number of
+    nonzeros of the blocks in each column and the indices and data of
+    every block are written once to their final position.
+
+    Args:
+        blocks: list of rows of blocks (sparse or dense matrices). None
+                is a zero block. Every block row and block column must
+                have at least one block that is not None.
+
+    Returns:
+        CSC matrix with sorted indices (if the blocks have sorted indices)
+    '''
+    blocks = [[None if B is None else spa.csc_matrix(B) for B in row]
+              for row in blocks]
+    n_block_rows, n_block_cols = len(blocks), len(blocks[0])
+
+    # Dimensions of the block rows and columns
+    row_sizes = [None] * n_block_rows
+    col_sizes = [None] * n_block_cols
+    for r in range(n_block_rows):
+        for c in range(n_block_cols):
+            B = blocks[r][c]
+            if B is None:
+                continue
+            if not B.has_sorted_indices:
+                B = blocks[r][c] = B.sorted_indices()
+            for sizes, i, size in ((row_sizes, r, B.shape[0]),
+                                   (col_sizes, c, B.shape[1])):
+                if sizes[i] is None:
+                    sizes[i] = size
+                elif sizes[i] != size:
+                    raise ValueError("Block (%i, %i) has incompatible "
+                                     "dimensions" % (r, c))
+    if None in row_sizes or None in col_sizes:
+        raise ValueError("Blocks are missing for some rows or columns")
+    row_offsets = np.cumsum([0] + row_sizes)
+    col_offsets = np.cumsum([0] + col_sizes)
+    shape = (int(row_offsets[-1]), int(col_offsets[-1]))
+
+    # Column pointers
+    counts = np.zeros(shape[1], dtype=np.int64)
+    for r in range(n_block_rows):
+        for c in range(n_block_cols):
+            if blocks[r][c] is not None:
+                counts[col_offsets[c]:col_offsets[c + 1]] += \
+                    np.diff(blocks[r][c].indptr)
+    nnz = int(counts.sum())
+    index_dtype = _index_dtype(nnz, *shape)
+    indptr = np.zeros(shape[1] + 1, dtype=index_dtype)
+    np.cumsum(counts, out=indptr[1:])
+    indices = np.empty(nnz, dtype=index_dtype)
+    data = np.empty(nnz, dtype=np.result_type(
+        *[B.dtype for row in blocks for B in row if B is not None]))
+
+    # Blocks of every block column from top to bottom
+    for c in range(n_block_cols):
+        column = [(r, B) for (r, B) in enumerate(row[c] for row in blocks)
+                  if B is not None]
+        if len(column) == 1:
+            # Single block: copy its arrays to a contiguous range
+            r, B = column[0]
+            pos = slice(indptr[col_offsets[c]], indptr[col_offsets[c + 1]])
+            np.add(B.indices, row_offsets[r], out=indices[pos],
+                   casting='unsafe')
+            data[pos] = B.data
+            continue
+        start = indptr[col_offsets[c]:col_offsets[c + 1]].astype(np.int64)
+        for (r, B) in column:
+            nnz_col = np.diff(B.indptr)
+            pos = np.repeat(start - B.indptr[:-1], nnz_col) + \
+                np.arange(B.nnz)
+            indices[pos] = B.indices + row_offsets[r]
+            data[pos] = B.data
+            start += nnz_col
+
+    return spa.csc_matrix((data, indices, indptr), shape=shape)
+
+
+def block_diag_csc(blocks):
+    '''
+    Block diagonal matrix of blocks in CSC format (see block_csc)
+    '''
+    return block_csc([[B if i == j else None for j in range(len(blocks))]
+                      for i, B in enumerate(blocks)])
+
+
+# Average number of nonzeros per row of the random matrices of the
+# large-scale problem generators
+LARGE_SCALE_ROW_NNZ = 30
+
+
+def large_scale_density(n_cols, density):
+    '''
+    Density of a random matrix with n_cols columns in the large-scale
+    generators: the density of the original generator capped so that
+    every row has on average at most LARGE_SCALE_ROW_NNZ nonzeros
+    '''
+    return min(density, LARGE_SCALE_ROW_NNZ / n_cols)
+
+
+def random_csc(m, n, density, data_rvs=np.random.randn,
+               chunk_size=CHUNK_SIZE):
+    '''
+    Random m x n sparse matrix in CSC format where every element is
+    nonzero with probability density and the nonzeros are drawn from
+    data_rvs (like scipy.sparse.random with the global random state)
+
+    The positions of the nonzeros in column-major order are sampled as a
+    stream: the gaps between consecutive nonzeros are geometric random
+    variables drawn chunk_size at a time. Time and memory are
+    proportional to the number of nonzeros instead of m * n.
+    '''
+    size = m * n
+    if size == 0 or density <= 0:
+        return spa.csc_matrix((m, n))
+
+    # Positions of the nonzeros (sorted)
+    chunk_size = min(chunk_size, int(1.1 * density * size) + 100)
+    chunks = []
+    last = -1
+    while last < size:
+        pos = last + np.cumsum(np.random.geometric(density, chunk_size))
+        last = pos[-1]
+        chunks.append(pos[pos < size] if last >= size else pos)
+    pos = np.concatenate(chunks)
+
+    index_dtype = _index_dtype(len(pos), m, n)
+    indices = (pos % m).astype(index_dtype)
+    indptr = np.searchsorted(pos, m * np.arange(n + 1)).astype(index_dtype)
+    return spa.csc_matrix((data_rvs(len(pos)), indices, indptr),
+                          shape=(m, n))
+
+
+def random_matrix(m, n, density, format='coo'):
+    '''
+    Random m x n sparse data matrix of the problem generators with
+    normal nonzeros (scipy.sparse.random with the global random state)
+    '''
+    return spa.random(m, n, density=density, data_rvs=np.random.randn,
+                      format=format)
+
+
+def large_scale_random_matrix(m, n, density, format='coo'):
+    '''
+    Random m x n sparse data matrix of the large-scale generators sampled
+    with random_csc at the density large_scale_density(n, density)
+    '''
+    return random_csc(m, n, large_scale_density(n, density)).asformat(format)
+
+
+class LargeScaleMixin(object):
+    '''
+    Large-scale variant of a problem generator
+
+    The random data matrices of the generator (its _random_matrix) are
+    sampled in CSC format as a stream with at most LARGE_SCALE_ROW_NNZ
+    nonzeros per row on average. Put it before the generator class:
+
+        class LassoLargeExample(LargeScaleMixin, LassoExample):
+            ...
+    '''
+    _random_matrix = staticmethod(large_scale_random_matrix)
@@ -0,0 +1,127 @@
+'''
+Columnar store of the benchmark results
+'''
+import os
+import uuid
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from utils.general import make_sure_path_exists
+
+STORE_FOLDER = 'store'
+
+# Columns identifying a problem. The rows are sorted by them so that the
+# results of different solvers are aligned problem by problem.
+PROBLEM_KEY = ['class', 'name', 'n', 'instance']
+
+# Partitioning of the results folders
+PARTITIONING = ds.partitioning(pa.schema([('solver', pa.string()),
+                                          ('class', pa.string())]),
+                               flavor='hive')
+
+
+class ResultsStore(object):
+    '''
+    Results of a benchmark stored as Parquet files partitioned by solver
+    and problem class
+
+        ./results/{benchmark}/store/solver={solver}/class={class}/*.parquet
+
+    Every append writes a new file so that appending never rewrites the
+    results already stored.
+    '''
+    def __init__(self, benchmark):
+        self.benchmark = benchmark
+        self.path = os.path.join('.', 'results', benchmark, STORE_FOLDER)
+
+    def _partition_path(self, solver, name):
+        return os.path.join(self.path, 'solver=%s' % solver,
+                            'class=%s' % name)
+
+    def has_results(self, solver, name):
+        '''
+        Check if there are results of solver on problem class name
+        '''
+        return os.path.isdir(self._partition_path(solver, name))
+
+    def append(self, df):
+        '''
+        Append results to the store
+
+        Args:
+            df: pandas dataframe with results including 'solver' and 'class'
+                columns
+        '''
+        df = _normalize_types(df)
+        for (solver, name), df_part in df.groupby(['solver', 'class']):
+            path = self._partition_path(solver, name)
+            make_sure_path_exists(path)
+
+            # Write to a temporary file first so that readers never see
+            # partially written files
+            file_name = os.path.join(path, uuid.uuid4().hex)
+            df_part.drop(columns=['solver', 'class']).to_parquet(
+                file_name + '.tmp', index=False)
+            os.replace(file_name + '.tmp', file_name + '.parquet')
+
+    def read(self, solver=None, columns=None, classes=None):
+        '''
+        Read results from the store
+
+        Only the files of the selected solver and classes are opened and
+        only the selected columns are read from them.
+
+        Args:
+            solver: solver name (default all the solvers)
+            columns: list of columns to read (default all the columns)
+            classes: list of problem classes to read (default all)
+
+        Returns:
+            pandas dataframe sorted by PROBLEM_KEY
+        '''
+        if not os.path.isdir(self.path):
+            return pd.DataFrame(columns=columns)
+
+        expression = None
+        if solver is not None:
+            expression = ds.field('solver') == solver
+        if classes is not None:
+            class_expression = ds.field('class').isin(list(classes))
+            expression = class_expression if expression is None \
+                else expression & class_expression
+
+        # Select files with partition pruning
+        dataset = ds.dataset(self.path, format='parquet',
+                             partitioning=PARTITIONING)
+        fragments = list(dataset.get_fragments(filter=expression))
+        if not fragments:
+            return pd.DataFrame(columns=columns)
+
+        # Files may have different columns (e.g. OSQP specific ones)
+        schema = pa.unify_schemas([f.physical_schema for f in fragments] +
+                                  [PARTITIONING.schema])
+        dataset = ds.dataset([f.path for f in fragments], schema=schema,
+                             format='parquet', partitioning=PARTITIONING,
+                             partition_base_dir=self.path)
+
+        key = [c for c in PROBLEM_KEY if c in schema.names]
+        if columns is not None:
+            columns = list(dict.fromkeys(key + list(columns)))
+        df = dataset.to_table(columns=columns).to_pandas()
+
+        return df.sort_values(key, kind='stable').reset_index(drop=True)
+
+
+def _normalize_types(df):
+    '''
+    Store numeric columns as floats so that files with missing values
+    (e.g. failed solutions) have the same schema as the other ones
+    '''
+    df = df.copy()
+    for col in df.columns:
+        if pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = df[col].astype(float)
+        elif df[col].map(lambda v: v is None or
+                         isinstance(v, (int, float))).all():
+            df[col] = pd.to_numeric(df[col]).astype(float)
+    return df